@@ -0,0 +1,194 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+
+import metrics
+
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", "64"))
+# Seconds a request may take from arrival to reply, queueing included
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "60"))
+BATCH_REQUEST_DEADLINE = float(os.getenv("BATCH_REQUEST_DEADLINE", "180"))
+
+# Lower runs first: people waiting in a chat, then single orders, then batches
+PRIORITY_CHAT, PRIORITY_ORDER, PRIORITY_BATCH = 0, 1, 2
+
+# Deadline (time.monotonic) of the request the current task works for
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class Rejected(Exception):
+    """The request was turned away before or instead of running to completion."""
+
+
+class QueueFull(Rejected):
+    """Every slot is busy and the wait queue is at AGENT_MAX_QUEUE."""
+
+
+class DeadlineExceeded(Rejected):
+    """The request cannot finish before its deadline."""
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None outside of a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def detached_context() -> contextvars.Context:
+    """A copy of the current context outside of any request, for tasks several requests share."""
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+class TokenBucket:
+    """
+    Rate limiter of an upstream: `rate` calls per second with bursts of up to `burst`.
+
+    A caller takes its token right away, letting the count go negative, and sleeps off
+    the deficit; no lock is needed since the bucket is only touched between awaits.
+    A caller whose wait would run past its request deadline is rejected instead.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, name: str = ""):
+        if self.rate <= 0:
+            return
+        now = self.clock()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return
+        wait = -self.tokens / self.rate
+        deadline = current_deadline()
+        if deadline is not None and now + wait > deadline:
+            self.tokens += 1
+            metrics.upstream_throttled.inc(1, name, "rejected")
+            raise DeadlineExceeded(f"{name or 'upstream'} rate limit would delay the call past the deadline")
+        metrics.upstream_throttled.inc(1, name, "delayed")
+        await asyncio.sleep(wait)
+
+
+class AdmissionQueue:
+    """
+    Bounds the requests an agent works on at once. Up to `max_concurrency` run; the rest
+    wait in a priority queue ordered by (priority, deadline) and are dropped when their
+    deadline passes while waiting. A request whose estimated queueing plus service time
+    already overshoots its deadline is rejected on arrival, as is any request once
+    `max_queue` are waiting.
+    """
+
+    def __init__(self, max_concurrency: int = AGENT_MAX_CONCURRENCY, max_queue: int = AGENT_MAX_QUEUE, clock: Callable[[], float] = time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.clock = clock
+        self.active = 0
+        self.service_time = None  # moving average of how long a slot is held, in seconds
+        self._waiters = []  # heap of (priority, deadline, seq, future)
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def estimated_wait(self, priority: int) -> float:
+        """Queueing time of a new request: the waiters it would not overtake, served max_concurrency at a time."""
+        if self.active < self.max_concurrency and not self._waiters:
+            return 0.0
+        ahead = sum(1 for waiter in self._waiters if waiter[0] <= priority and not waiter[3].done())
+        return (ahead // self.max_concurrency + 1) * (self.service_time or 0.0)
+
+    def _release(self):
+        while self._waiters:
+            _, deadline, _, future = heapq.heappop(self._waiters)
+            if future.done():  # gave up waiting
+                continue
+            if self.clock() >= deadline:
+                future.set_exception(DeadlineExceeded("deadline passed while queued"))
+                continue
+            future.set_result(None)  # the slot passes straight to the waiter
+            return
+        self.active -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int, deadline: float):
+        now = self.clock()
+        if self.service_time is not None and now + self.estimated_wait(priority) + self.service_time > deadline:
+            raise DeadlineExceeded(f"cannot finish within {deadline - now:.1f}s, about {self.estimated_wait(priority) + self.service_time:.1f}s needed")
+
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                raise QueueFull(f"queue full: {self.active} requests running, {len(self._waiters)} waiting")
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, deadline, next(self._seq), future))
+            try:
+                await asyncio.wait_for(future, max(deadline - now, 0.0))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("deadline passed while queued") from None
+            except asyncio.CancelledError:
+                # Cancelled right after being handed the slot: pass it on
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    self._release()
+                raise
+
+        token = _deadline.set(deadline)
+        started = self.clock()
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+            held = self.clock() - started
+            self.service_time = held if self.service_time is None else 0.8 * self.service_time + 0.2 * held
+            self._release()
+
+
+def admitted(queue: AdmissionQueue, handler: str, priority: int, budget: float, on_reject: Callable[..., Awaitable]):
+    """
+    Decorates a uAgents handler (ctx, sender, msg) to run inside an admission slot and
+    be cut off at its deadline. Rejected or timed out requests get `on_reject(ctx, sender,
+    msg, reason)` so the sender hears back right away.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(ctx, sender, msg):
+            deadline = time.monotonic() + budget
+            try:
+                async with queue.slot(priority, deadline):
+                    metrics.admission_results.inc(1, handler, "admitted")
+                    timeout = asyncio.timeout(max(deadline - time.monotonic(), 0.0))
+                    try:
+                        async with timeout:
+                            return await function(ctx, sender, msg)
+                    except TimeoutError:
+                        if not timeout.expired():
+                            raise
+                        raise DeadlineExceeded(f"not done within {budget:g}s") from None
+            except Rejected as e:
+                metrics.admission_results.inc(1, handler, "queue_full" if isinstance(e, QueueFull) else "deadline")
+                ctx.logger.warning(f"Rejected {handler} request from {sender}: {e}")
+                await on_reject(ctx, sender, msg, str(e))
+        return wrapper
+    return decorate
@@ -0,0 +1,274 @@
+"""
+Offline backtest of the signal pipeline over recorded swap histories.
+
+Each decision point replays the swaps of the lookback window through `reduce_swaps`,
+the indicator/prompt building and a pluggable decision function, then checks whether
+the resulting limit order would have filled before its expiry. (history, window)
+jobs are sharded across a process pool.
+
+    python backtest.py abc.json histories/ --step-minutes 60 --workers 4
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import swapEngine
+from indicators import indicator_summary
+from promptBudget import count_tokens
+
+DEFAULT_DECISION = "backtest:indicator_rule"
+
+INDICATOR_PROMPT_TEMPLATE = """
+User wants to swap {makerToken} for {takerToken}.
+- Maximum maker tokens available with the user: {makerMaxAmount}
+- Maximum expiry in hours for the limit order: {maxExpiry}
+
+Here are technical indicators of recent pool swap data:
+{indicators}
+"""
+
+
+def load_history(path: str) -> list:
+    """
+    Raw token-api swaps of a recorded response, oldest first. Accepts JSON and the
+    Python literal dumps some recordings are stored as (e.g. abc.json).
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        raw = json.loads(text)
+    except ValueError:
+        raw = ast.literal_eval(text)
+    swaps = raw.get("data", []) if isinstance(raw, dict) else raw
+    return sorted(swaps, key=lambda swap: swap["timestamp"])
+
+
+def history_paths(paths: list) -> list:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith((".json", ".txt"))
+            )
+        else:
+            found.append(path)
+    return found
+
+
+def indicator_rule(intent: dict, records: list) -> dict:
+    """
+    Deterministic stand-in for the model: buy the taker below VWAP unless the RSI says it
+    is overbought. Prices are price0, so the rule flips when the taker is token1.
+    """
+    summary = indicator_summary(records)
+    return _rule(intent, summary)
+
+
+def _rule(intent: dict, summary: dict) -> dict:
+    order = {"maker": intent["makerToken"], "taker": intent["takerToken"], "maker_amount": 0.0, "expiry": 0}
+    price, vwap, rsi = summary.get("last_price"), summary.get("vwap"), summary.get("rsi_14")
+    if price is None or vwap is None or rsi is None:
+        return order
+    if intent["takerIsToken0"]:
+        cheap = price < vwap and rsi < 70
+    else:
+        cheap = price > vwap and rsi > 30
+    if cheap:
+        order["maker_amount"] = float(intent["makerMaxAmount"])
+        order["expiry"] = int(intent["maxExpiry"])
+    return order
+
+
+def mock_llm(intent: dict, records: list) -> dict:
+    """
+    Full prompt round trip with a deterministic model: builds the indicator prompt the
+    agents send, has the mock answer it from the prompt text alone, and parses the JSON.
+    """
+    prompt = INDICATOR_PROMPT_TEMPLATE.format(
+        makerToken=intent["makerToken"],
+        takerToken=intent["takerToken"],
+        makerMaxAmount=intent["makerMaxAmount"],
+        maxExpiry=intent["maxExpiry"],
+        indicators=json.dumps(indicator_summary(records), indent=2),
+    )
+    summary = json.loads(prompt[prompt.index("{"):])
+    answer = json.dumps(_rule(intent, summary))
+    order = json.loads(answer)
+    order["prompt_tokens"] = count_tokens(prompt)
+    return order
+
+
+def resolve_decision(spec: str):
+    """Imports a decision function given as "module:function"."""
+    module, name = spec.split(":", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def decision_times(timestamps: np.ndarray, lookback_seconds: int, step_seconds: int) -> np.ndarray:
+    if timestamps.size == 0:
+        return np.empty(0, dtype=np.int64)
+    first = int(timestamps[0]) + lookback_seconds
+    return np.arange(first, int(timestamps[-1]) + 1, step_seconds, dtype=np.int64)
+
+
+def simulate_order(order: dict, at: int, timestamps: np.ndarray, taker_prices: np.ndarray, edge: float) -> dict:
+    """
+    The order rests at `edge` below the taker price at decision time (in maker tokens) and
+    fills at the first swap within its expiry that trades at or below it. Filled orders are
+    marked to the last price before expiry; PnL is in maker tokens.
+    """
+    start = np.searchsorted(timestamps, at, side="right")
+    if order["maker_amount"] <= 0 or order["expiry"] <= 0 or start == 0:
+        return {"placed": False, "filled": False, "pnl": 0.0}
+
+    limit = taker_prices[start - 1] * (1.0 - edge)
+    end = np.searchsorted(timestamps, at + order["expiry"] * 3600, side="right")
+    window = taker_prices[start:end]
+    hits = np.flatnonzero(window <= limit)
+    if hits.size == 0:
+        return {"placed": True, "filled": False, "pnl": 0.0}
+    mark = window[-1]
+    pnl = order["maker_amount"] * (mark / limit - 1.0)
+    return {"placed": True, "filled": True, "pnl": float(pnl), "fill_seconds": int(timestamps[start + hits[0]] - at)}
+
+
+_histories = {}  # path -> (swaps, timestamps, price0), per worker process
+
+
+def _history(path: str):
+    if path not in _histories:
+        swaps = load_history(path)
+        timestamps = np.fromiter((s["timestamp"] for s in swaps), dtype=np.int64, count=len(swaps))
+        prices = np.fromiter((float(s["price0"]) for s in swaps), dtype=np.float64, count=len(swaps))
+        _histories[path] = (swaps, timestamps, prices)
+    return _histories[path]
+
+
+def run_job(job: dict) -> dict:
+    """Runs the decisions of one (history, window) shard; executed in a worker process."""
+    swaps, timestamps, prices = _history(job["path"])
+    decide = resolve_decision(job["decision"])
+    taker_is_token0 = job["taker"] == "token0"
+    taker_prices = prices if taker_is_token0 else 1.0 / prices
+    lookback = job["lookback_hours"] * 3600
+
+    results = []
+    started = time.perf_counter()
+    for at in job["times"]:
+        lo = np.searchsorted(timestamps, at - lookback, side="left")
+        hi = np.searchsorted(timestamps, at, side="right")
+        if hi - lo < 2:
+            continue
+        records = swapEngine.reduce_swaps({"data": swaps[lo:hi]}, job["interval_minutes"])
+        latest = records[-1]
+        intent = {
+            "makerToken": latest["token1" if taker_is_token0 else "token0"]["symbol"],
+            "takerToken": latest["token0" if taker_is_token0 else "token1"]["symbol"],
+            "makerMaxAmount": job["maker_amount"],
+            "maxExpiry": job["max_expiry"],
+            "takerIsToken0": taker_is_token0,
+        }
+        order = decide(intent, records)
+        order["expiry"] = min(int(order["expiry"]), int(job["max_expiry"]))
+        order["maker_amount"] = min(float(order["maker_amount"]), float(job["maker_amount"]))
+        outcome = simulate_order(order, int(at), timestamps, taker_prices, job["edge"])
+        outcome["at"] = int(at)
+        outcome["prompt_tokens"] = order.get("prompt_tokens", 0)
+        results.append(outcome)
+    return {"path": job["path"], "results": results, "seconds": time.perf_counter() - started}
+
+
+def make_jobs(paths: list, args) -> list:
+    """One job per shard of `shard_size` decision times of each history."""
+    jobs = []
+    for path in paths:
+        _, timestamps, _ = _history(path)
+        times = decision_times(timestamps, int(args.lookback_hours * 3600), int(args.step_minutes * 60))
+        for start in range(0, times.size, args.shard_size):
+            jobs.append({
+                "path": path,
+                "times": times[start:start + args.shard_size].tolist(),
+                "decision": args.decision,
+                "taker": args.taker,
+                "lookback_hours": args.lookback_hours,
+                "interval_minutes": args.interval_minutes,
+                "maker_amount": args.maker_amount,
+                "max_expiry": args.max_expiry,
+                "edge": args.edge,
+            })
+    return jobs
+
+
+def summarize(outcomes: list, wall_seconds: float, jobs: int) -> dict:
+    pnl = np.array([o["pnl"] for o in outcomes if o["filled"]], dtype=np.float64)
+    placed = sum(o["placed"] for o in outcomes)
+    equity = np.cumsum([o["pnl"] for o in outcomes]) if outcomes else np.zeros(1)
+    peaks = np.maximum.accumulate(np.concatenate(([0.0], equity)))
+    return {
+        "decisions": len(outcomes),
+        "orders_placed": int(placed),
+        "orders_filled": int(pnl.size),
+        "fill_rate": pnl.size / placed if placed else 0.0,
+        "total_pnl": float(pnl.sum()),
+        "mean_pnl_per_fill": float(pnl.mean()) if pnl.size else 0.0,
+        "win_rate": float(np.mean(pnl > 0)) if pnl.size else 0.0,
+        "pnl_sharpe_per_fill": float(pnl.mean() / pnl.std()) if pnl.size > 1 and pnl.std() > 0 else 0.0,
+        "max_drawdown": float(np.max(peaks - np.concatenate(([0.0], equity)))),
+        "mean_prompt_tokens": float(np.mean([o["prompt_tokens"] for o in outcomes])) if outcomes else 0.0,
+        "jobs": jobs,
+        "wall_seconds": wall_seconds,
+        "runs_per_second": len(outcomes) / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def run(args) -> dict:
+    paths = history_paths(args.histories)
+    jobs = make_jobs(paths, args)
+    started = time.perf_counter()
+    if args.workers == 1:
+        done = [run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            done = list(pool.map(run_job, jobs))
+    wall = time.perf_counter() - started
+    outcomes = [outcome for shard in done for outcome in shard["results"]]
+    report = summarize(outcomes, wall, len(jobs))
+    report["per_history"] = {
+        path: summarize([o for shard in done if shard["path"] == path for o in shard["results"]], wall, sum(job["path"] == path for job in jobs))
+        for path in paths
+    }
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("histories", nargs="+", help="recorded token-api swap responses, or directories of them")
+    parser.add_argument("--decision", default=DEFAULT_DECISION, help='decision function as "module:function"')
+    parser.add_argument("--taker", choices=("token0", "token1"), default="token0", help="pool token the orders buy")
+    parser.add_argument("--maker-amount", type=float, default=100.0, help="maximum maker tokens per order")
+    parser.add_argument("--max-expiry", type=float, default=24.0, help="maximum order expiry in hours")
+    parser.add_argument("--edge", type=float, default=0.001, help="limit price below the taker price at decision time")
+    parser.add_argument("--lookback-hours", type=float, default=24.0)
+    parser.add_argument("--interval-minutes", type=int, default=5)
+    parser.add_argument("--step-minutes", type=float, default=60.0, help="time between decisions")
+    parser.add_argument("--shard-size", type=int, default=64, help="decisions per process pool job")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,379 @@
+"""
+Micro and macro benchmarks of the agent hot paths.
+
+Swap fixtures are synthesized from the abc.json record schema at each size. The
+handler benchmark runs `signalAgent.generate_limit_order` end to end against a local
+stand-in HTTP server (aiohttp) for the token-api and ASI:One, so no network is used.
+
+    python benchmarks.py --output results.json --compare previous.json
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from bisect import bisect_left, bisect_right
+
+# The agents read these when imported. The cold store runs wipe SWAP_STORE_DIR, so the
+# benchmark always gets a store of its own, removed on exit
+os.environ["SWAP_STORE_DIR"] = tempfile.mkdtemp(prefix="bench-swapstore-")
+atexit.register(shutil.rmtree, os.environ["SWAP_STORE_DIR"], ignore_errors=True)
+os.environ.setdefault("ASI_ONE_API_KEY", "benchmark")
+# The stand-in has no rate limits to respect
+os.environ.setdefault("THEGRAPH_RATE", "0")
+os.environ.setdefault("ASI_ONE_RATE", "0")
+
+import numpy as np
+from aiohttp import web
+
+import backtest
+import candles
+import llmClient
+import priceImpact
+import promptBudget
+import responseCache
+import swapCache
+import swapEngine
+import swapFetcher
+from indicators import indicator_summary
+from jsonStream import IncrementalObjectParser
+from promptBudget import PromptBudget, count_tokens
+from promptCodec import encode_compact, measure_reduction
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (100, 10_000, 1_000_000)
+HANDLER_SIZES = (100, 10_000)
+PROMPT_MAX_RECORDS = 10_000
+POOL = "0x4ccd010148379ea531d6c587cfdd60180196f9b1"
+ORDER_JSON = '{"maker": "USDT", "taker": "WETH", "maker_amount": 10.5, "expiry": 12}'
+
+
+def synthetic_swaps(n: int, seed: int = 0, end: int = None, span: int = 24 * 3600) -> list:
+    """
+    n raw swaps shaped like the records of abc.json, ascending over the `span` seconds
+    before `end`. Fields the agents never read are shared with the template.
+    """
+    template = backtest.load_history(os.path.join(_HERE, "abc.json"))[0]
+    end = int(time.time()) if end is None else end
+    rng = random.Random(seed)
+    timestamps = sorted(end - rng.randrange(span) for _ in range(n))
+    price = float(template["price0"])
+    swaps = []
+    for timestamp in timestamps:
+        amount0 = rng.randrange(10**12, 10**18) * rng.choice((1, -1))
+        price *= 1.0 - 1e-3 * (amount0 / 1e18) ** 0.5 if amount0 > 0 else 1.0 + 1e-3 * (-amount0 / 1e18) ** 0.5
+        swap = dict(template)
+        swap["timestamp"] = timestamp
+        swap["block_num"] = template["block_num"] + timestamp - template["timestamp"]
+        swap["datetime"] = None
+        swap["amount0"] = str(amount0)
+        swap["amount1"] = str(int(-amount0 * price / 10**12))
+        swap["price0"] = price
+        swap["price1"] = 1.0 / price
+        swaps.append(swap)
+    return swaps
+
+
+def _stats(name: str, size: int, samples: list, number: int) -> dict:
+    per_call = [sample / number for sample in samples]
+    median = statistics.median(per_call)
+    return {
+        "name": name,
+        "size": size,
+        "repeat": len(samples),
+        "number": number,
+        "min_s": min(per_call),
+        "median_s": median,
+        "mean_s": statistics.fmean(per_call),
+        "max_s": max(per_call),
+        "ops_per_s": 1.0 / median if median else None,
+    }
+
+
+def measure(name: str, fn, size: int, repeat: int = 5, min_time: float = 0.1) -> dict:
+    """Times fn(); calls are batched so one sample lasts at least min_time."""
+    started = time.perf_counter()
+    fn()
+    once = time.perf_counter() - started
+    number = max(1, int(min_time / once)) if once > 0 else 1000
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append(time.perf_counter() - started)
+    return _stats(name, size, samples, number)
+
+
+async def measure_async(name: str, fn, size: int, repeat: int = 5, setup=None) -> dict:
+    """Times one awaited fn() per sample, after an untimed warm-up; setup() runs untimed before each."""
+    samples = []
+    for index in range(repeat + 1):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        await fn()
+        if index:
+            samples.append(time.perf_counter() - started)
+    return _stats(name, size, samples, 1)
+
+
+class StandIn:
+    """Local HTTP stand-in for the token-api swaps/pools endpoints and ASI:One chat completions."""
+
+    def __init__(self, swaps: list, answer: str = ORDER_JSON, chunk: int = 8):
+        self.timestamps = [swap["timestamp"] for swap in swaps]
+        self.rows = [json.dumps(swap) for swap in swaps]
+        self.answer = answer
+        self.chunk = chunk
+        self.requests = 0
+        app = web.Application()
+        app.router.add_get("/swaps/evm", self.swaps)
+        app.router.add_get("/pools/evm", self.pools)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        self.runner = web.AppRunner(app, access_log=None)
+        self.url = None
+
+    async def start(self):
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def swaps(self, request):
+        self.requests += 1
+        query = request.query
+        lo = bisect_left(self.timestamps, int(query.get("startTime", 0)))
+        hi = bisect_right(self.timestamps, int(query.get("endTime", 9999999999)))
+        limit = int(query.get("limit", 100))
+        offset = (int(query.get("page", 1)) - 1) * limit
+        if query.get("orderDirection", "desc") == "desc":
+            rows = self.rows[max(lo, hi - offset - limit):max(lo, hi - offset)][::-1]
+        else:
+            rows = self.rows[lo + offset:min(hi, lo + offset + limit)]
+        return web.Response(text='{"data":[' + ",".join(rows) + "]}", content_type="application/json")
+
+    async def pools(self, request):
+        self.requests += 1
+        return web.json_response({"data": []})
+
+    async def chat(self, request):
+        self.requests += 1
+        body = await request.json()
+        model = body.get("model", "")
+        if not body.get("stream"):
+            return web.json_response({
+                "id": "bench", "object": "chat.completion", "created": 0, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": self.answer}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for start in range(0, len(self.answer), self.chunk):
+            event = {
+                "id": "bench", "object": "chat.completion.chunk", "created": 0, "model": model,
+                "choices": [{"index": 0, "delta": {"content": self.answer[start:start + self.chunk]}, "finish_reason": None}],
+            }
+            try:
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            except ConnectionResetError:  # the client stopped reading once the JSON was complete
+                return response
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+
+class _Context:
+    """The slice of uagents' Context the handlers use."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("benchmark")
+        self.sent = []
+
+    async def send(self, destination, message):
+        self.sent.append(message)
+
+
+def bench_micro(swaps_by_size: dict, repeat: int) -> list:
+    """Reduction, token counting, prompt serialization and response validation."""
+    import signalAgent
+
+    results = []
+    for size, swaps in swaps_by_size.items():
+        raw = {"data": swaps}
+        results.append(measure("reduce_swaps", lambda: swapEngine.reduce_swaps(raw, 5), size, repeat))
+        columns = swapEngine.swap_columns(swaps)
+        results.append(measure("build_candles", lambda: candles.build_candles(columns), size, repeat))
+        results.append(measure("fit_impact", lambda: priceImpact.fit_impact(columns), size, repeat))
+
+        if size > PROMPT_MAX_RECORDS:
+            continue
+        records = swapEngine.clean_swaps(swaps)
+        as_json = json.dumps(records, indent=2)
+        results.append(measure("prompt.json_dumps", lambda: json.dumps(records, indent=2), size, repeat))
+        results.append(measure("prompt.compact", lambda: encode_compact(records), size, repeat))
+        results.append(measure("prompt.indicators", lambda: json.dumps(indicator_summary(records), indent=2), size, repeat))
+        results.append(measure("prompt.budget_fit", lambda: PromptBudget(signalAgent.MAX_TOKENS).fit("", records), size, repeat))
+        results.append(measure("count_tokens", lambda: count_tokens(as_json), size, repeat))
+        prompt = as_json[:signalAgent.MAX_TOKENS * 3]
+        results.append(measure("safe_prompt", lambda: signalAgent.pipeline.safe_prompt(prompt), size, repeat))
+
+    results.append(measure("AIResponse.model_validate_json", lambda: signalAgent.AIResponse.model_validate_json(ORDER_JSON), 1, repeat))
+
+    def incremental():
+        parser = IncrementalObjectParser(signalAgent.AIResponse)
+        for start in range(0, len(ORDER_JSON), 8):
+            if parser.feed(ORDER_JSON[start:start + 8]):
+                break
+        return parser.result()
+
+    results.append(measure("AIResponse.incremental_8_char_chunks", incremental, 1, repeat))
+    return results
+
+
+async def bench_handler(sizes: list, repeat: int) -> list:
+    """
+    generate_limit_order against the stand-in, with a cold store, a warm store, a warm cache,
+    a warm watchlist and a cached model answer. Only the last case keeps earlier answers.
+    """
+    import signalAgent
+
+    logging.getLogger("benchmark").setLevel(logging.WARNING)
+    store_dir = os.environ["SWAP_STORE_DIR"]
+    results = []
+    for size in sizes:
+        server = await StandIn(synthetic_swaps(size, seed=size)).start()
+        swapFetcher.THEGRAPH_SWAPS_URL = f"{server.url}/swaps/evm"
+        swapFetcher.THEGRAPH_POOLS_URL = f"{server.url}/pools/evm"
+        llmClient.ASI_ONE_BASE_URL = f"{server.url}/v1"
+        await llmClient.close_client()
+        await swapFetcher.close_client()
+
+        ctx = _Context()
+        tradeInput = signalAgent.UserInput(makerToken="USDT", takerToken="WETH", poolAddress=POOL, makerMaxAmount=100, maxExpiry=24)
+
+        def handler():
+            return signalAgent.generate_limit_order(ctx, "bench", tradeInput)
+
+        # a failed fetch still answers (with an empty order), so check the full path ran
+        await handler()
+        if not ctx.sent or ctx.sent[-1].maker_amount <= 0:
+            raise RuntimeError(f"handler did not produce an order against the stand-in: {ctx.sent[-1:]}")
+
+        def no_answers():
+            signalAgent.pipeline.response_cache = responseCache.ResponseCache("bench", signalAgent.AIResponse, directory="")
+
+        def cold():
+            no_answers()
+            swapCache.swap_cache = swapCache.TTLCache()
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+        def warm_store():
+            no_answers()
+            swapCache.swap_cache = swapCache.TTLCache()
+
+        results.append(await measure_async("generate_limit_order.cold_store", handler, size, repeat, cold))
+        results.append(await measure_async("generate_limit_order.warm_store", handler, size, repeat, warm_store))
+        results.append(await measure_async("generate_limit_order.cached", handler, size, repeat, no_answers))
+        await signalAgent.pipeline.watchlist.refresh("matic", POOL)
+        results.append(await measure_async("generate_limit_order.watchlist", handler, size, repeat, no_answers))
+        results.append(await measure_async("generate_limit_order.response_cache", handler, size, repeat))
+        signalAgent.pipeline.watchlist._warm.clear()
+        await server.stop()
+
+    await llmClient.close_client()
+    await swapFetcher.close_client()
+    return results
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_HERE, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Benchmarks whose median got slower than the baseline by more than threshold (a fraction)."""
+    before = {(result["name"], result["size"]): result["median_s"] for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        previous = before.get((result["name"], result["size"]))
+        if previous and result["median_s"] > previous * (1.0 + threshold):
+            regressions.append({
+                "name": result["name"],
+                "size": result["size"],
+                "baseline_median_s": previous,
+                "median_s": result["median_s"],
+                "slowdown": result["median_s"] / previous,
+            })
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="fixture rows for the micro benchmarks")
+    parser.add_argument("--handler-sizes", default=",".join(map(str, HANDLER_SIZES)), help="fixture rows served to the handler benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-handler", action="store_true")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    swaps_by_size = {size: synthetic_swaps(size, seed=size) for size in sizes}
+
+    results = bench_micro(swaps_by_size, args.repeat)
+    swaps_by_size.clear()
+    if not args.skip_handler:
+        results += asyncio.run(bench_handler([int(size) for size in args.handler_sizes.split(",") if size], args.repeat))
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            # count_tokens numbers are only comparable between runs with the same tokenizer
+            "tokenizer": promptBudget.PROMPT_TOKENIZER if promptBudget.get_encoding() is not None else "len/4 estimate",
+        },
+        "results": results,
+        # Token cost of a day of reduced swaps in the "swaps" and "compact" prompt modes
+        "prompt_tokens": measure_reduction(swapEngine.reduce_swaps({"data": synthetic_swaps(10_000)}, 5)),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(results, json.load(f), args.threshold)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for result in results:
+        print(f"{result['name']:<40} {result['size']:>9} {result['median_s'] * 1e3:>12.4f} ms")
+    tokens = report["prompt_tokens"]
+    print(f"prompt tokens per 100 records: json {tokens['json_tokens_per_100']}, compact {tokens['compact_tokens_per_100']} ({tokens['reduction_pct']}% fewer)")
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['name']} [{regression['size']}]: {regression['slowdown']:.2f}x slower")
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import numpy as np
+
+RESOLUTIONS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400}
+
+FIELDS = ("timestamp", "open", "high", "low", "close", "volume0", "volume1", "trades")
+
+
+def parse_resolutions(spec: str) -> tuple:
+    """The resolutions of a comma separated spec such as CANDLE_RESOLUTIONS, stripped and checked against RESOLUTIONS."""
+    resolutions = tuple(resolution.strip() for resolution in spec.split(",") if resolution.strip())
+    unknown = [resolution for resolution in resolutions if resolution not in RESOLUTIONS]
+    if unknown or not resolutions:
+        raise ValueError(f"unknown candle resolutions {unknown or [spec]}, expected a comma separated list of {', '.join(RESOLUTIONS)}")
+    return resolutions
+
+
+def _group_starts(keys: np.ndarray) -> np.ndarray:
+    """Start offsets of the runs of equal keys in a sorted array."""
+    if keys.size == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+
+
+def _aggregate(bars: dict, seconds: int) -> dict:
+    """Rolls finer bars up into `seconds` wide bars; the resolutions must nest."""
+    buckets = bars["timestamp"] // seconds * seconds
+    starts = _group_starts(buckets)
+    if starts.size == 0:
+        return {name: column[:0].copy() for name, column in bars.items()}
+    ends = np.append(starts[1:], buckets.size) - 1
+    return {
+        "timestamp": buckets[starts],
+        "open": bars["open"][starts],
+        "high": np.maximum.reduceat(bars["high"], starts),
+        "low": np.minimum.reduceat(bars["low"], starts),
+        "close": bars["close"][ends],
+        "volume0": np.add.reduceat(bars["volume0"], starts),
+        "volume1": np.add.reduceat(bars["volume1"], starts),
+        "trades": np.add.reduceat(bars["trades"], starts),
+    }
+
+
+def build_candles(columns: dict, resolutions=("1m", "5m", "1h", "1d")) -> dict:
+    """
+    Builds OHLCV bars for several resolutions from swap columns (`swapEngine.swap_columns`
+    or a `swapStore` window). Prices are price0 (token1 per token0); volumes are the
+    absolute decimal scaled amounts of each token.
+
+    The swaps are sorted and bucketed once, at the finest resolution; every coarser
+    resolution that nests in a finer one is rolled up from those bars instead of the swaps.
+    Returns {resolution: {field: array}}.
+    """
+    unknown = [resolution for resolution in resolutions if resolution not in RESOLUTIONS]
+    if unknown:
+        raise ValueError(f"unknown candle resolutions {unknown}, expected some of {', '.join(RESOLUTIONS)}")
+    seconds = {resolution: RESOLUTIONS[resolution] for resolution in resolutions}
+    ordered = sorted(resolutions, key=seconds.get)
+
+    timestamps = np.asarray(columns["timestamp"], dtype=np.int64)
+    order = np.argsort(timestamps, kind="stable")
+    trades = {
+        "timestamp": timestamps[order],
+        "open": np.asarray(columns["price0"], dtype=np.float64)[order],
+        "volume0": np.abs(np.asarray(columns["amount0"], dtype=np.float64))[order],
+        "volume1": np.abs(np.asarray(columns["amount1"], dtype=np.float64))[order],
+    }
+    trades["high"] = trades["low"] = trades["close"] = trades["open"]
+    trades["trades"] = np.ones(timestamps.size, dtype=np.int64)
+
+    candles = {}
+    finer, finer_seconds = trades, 1
+    for resolution in ordered:
+        width = seconds[resolution]
+        source = finer if width % finer_seconds == 0 else trades
+        candles[resolution] = _aggregate(source, width)
+        finer, finer_seconds = candles[resolution], width
+    return {resolution: candles[resolution] for resolution in resolutions}
+
+
+def to_table(bars: dict, digits: int = 6) -> dict:
+    """Compact JSON friendly form of one resolution: field names once, then rows."""
+    rounded = [
+        bars[name].tolist() if bars[name].dtype.kind == "i" else np.round(bars[name], digits).tolist()
+        for name in FIELDS
+    ]
+    return {"columns": list(FIELDS), "rows": [list(row) for row in zip(*rounded)]}
+
+
+def serialize(loaded: dict, digits: int = 6) -> dict:
+    """Prompt ready form of `swapStore.load_candles` output: token symbols once, one table per resolution."""
+    return {
+        "token0": loaded["token0"]["symbol"] if loaded["token0"] else None,
+        "token1": loaded["token1"]["symbol"] if loaded["token1"] else None,
+        "price_quote": "token1 per token0",
+        "candles": {resolution: to_table(bars, digits) for resolution, bars in loaded["candles"].items()},
+    }
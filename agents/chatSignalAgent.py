@@ -1,10 +1,8 @@
-from datetime import datetime, timezone
+from datetime import datetime
 from uuid import uuid4
+import asyncio
 import os
-import requests
-import json
 
-from openai import OpenAI
 from uagents import Context, Protocol, Agent
 from uagents_core.contrib.protocols.chat import (
     ChatAcknowledgement,
@@ -15,19 +13,25 @@ from uagents_core.contrib.protocols.chat import (
 )
 from pydantic import BaseModel, Field
 
-ASI_ONE_BASE_URL = "https://api.asi1.ai/v1"
-ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY","")
+import admission
+import metrics
+import modelRouter
+import resilience
+import responseCache
+import tokenIndex
+import intentParser
+from promptBudget import PromptTooLarge
+from signalPipeline import AIResponse, SignalPipeline
+
 MAX_TOKENS = 32000
+# Each agent on a host needs its own port; 0 turns /metrics off
+METRICS_PORT = int(os.getenv("CHAT_METRICS_PORT", "9465"))
 ASI_ONE_MODEL = "asi1-mini"
-THEGRAPH_JWT_TOKEN = os.getenv("THEGRAPH_JWT_TOKEN","")
-
+NETWORK = os.getenv("SIGNAL_NETWORK", "matic")
 
-client = OpenAI(
-    base_url=ASI_ONE_BASE_URL,
-    api_key=ASI_ONE_API_KEY,
-)
 
 agent = Agent()
+admission_queue = admission.AdmissionQueue()
 
 # We create a new protocol which is compatible with the chat protocol spec. This ensures
 # compatibility between agents
@@ -50,20 +54,6 @@ class UserInput(BaseModel):
         description="Maximum amount of time in hours the user can keep the limit order live"
     )
 
-class AIResponse(BaseModel):
-    maker: str = Field(
-        description="The token the user is providing in the swap (e.g., USDT)"
-    )
-    taker: str = Field(
-        description="The token the user wants to receive (e.g., wETH)"
-    )
-    maker_amount: float = Field(
-        description="The amount of maker token to be swapped"
-    )
-    expiry: int = Field(
-        description="The expiry time in hours the order should stay live"
-    )
-
 
 SYSTEM_PROMPT_1 = """
 Rephrase the user message in the following format.
@@ -71,7 +61,7 @@ Rephrase the user message in the following format.
 IMPORTANT: Your response MUST be valid JSON ONLY and match this schema:
 
 {
-    "makerToken": "USDTO",
+    "makerToken": "USDT",
     "takerToken": "WETH",
     "makerMaxAmount": "float (e.g., 1.2)",
     "maxExpiry": "integer (hours, e.g., 45)"
@@ -79,7 +69,7 @@ IMPORTANT: Your response MUST be valid JSON ONLY and match this schema:
 
 If you are uncertain, respond with the following anyway:
 {
-    "makerToken": "USDTO",
+    "makerToken": "USDT",
     "takerToken": "WETH",
     "makerMaxAmount": 20,
     "maxExpiry": 15
@@ -153,93 +143,166 @@ Here is recent pool swap data:
 {swap_data}
 """
 
-def reduce_swaps(ctx: Context, raw_data: dict, interval_minutes: int = 5):
+SYSTEM_PROMPT_COMPACT = """
+You are a DeFi Signal Agent. 
 
-    ctx.logger.info("reducing swaps count")
-    swaps = raw_data.get("data", [])
-    if not swaps:
-        ctx.logger.info("returning empty")
-        return []
+steps:
+1. Decide upon appropriate trade indicators
+2. Implement indicators upon provided swap data
+3. Provide a limit order that should be placed within the constraints of the user
 
-    # Sort by timestamp ascending
-    swaps.sort(key=lambda x: x["timestamp"])
-    reduced = []
-    interval_map = {}  # interval_start -> (trade, distance)
-    try:
-        for swap in swaps:
-            ts = swap["timestamp"]
-            dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-
-            # Round down to nearest interval mark
-            interval_start = dt.replace(
-                minute=(dt.minute // interval_minutes) * interval_minutes,
-                second=0,
-                microsecond=0
-            )
-
-            # Distance from interval start
-            distance = abs((dt - interval_start).total_seconds())
-
-            if interval_start not in interval_map or distance < interval_map[interval_start][1]:
-                interval_map[interval_start] = (swap, distance)
-        ctx.logger.info(f"Done with interval map")
-        # Keep only the nearest trade per interval
-        for swap, _ in sorted(interval_map.values(), key=lambda x: x[0]["timestamp"]):
-            cleaned = {
-                "timestamp": swap["timestamp"],
-                "datetime": swap.get("datetime") or datetime.fromtimestamp(swap["timestamp"], tz=timezone.utc).isoformat(),
-                "token0": {
-                    "symbol": swap["token0"]["symbol"],
-                    "address": swap["token0"]["address"],
-                    "decimals": swap["token0"]["decimals"],
-                },
-                "token1": {
-                    "symbol": swap["token1"]["symbol"],
-                    "address": swap["token1"]["address"],
-                    "decimals": swap["token1"]["decimals"],
-                },
-                "amount0": float(swap["amount0"]) / 10 ** int(swap["token0"]["decimals"]),
-                "amount1": float(swap["amount1"]) / 10 ** int(swap["token1"]["decimals"]),
-                "price0": swap["price0"],
-                "price1": swap["price1"],
-            }
-            reduced.append(cleaned)
+The swap data is a compact table:
+token0: <symbol> <address> decimals=<decimals>
+token1: <symbol> <address> decimals=<decimals>
+base_timestamp: <unix seconds> (<ISO datetime>)
+columns: dt,amount0,amount1,price0
+<dt>,<amount0>,<amount1>,<price0>
 
-    except Exception as e:
-        ctx.logger.info(f"ran into some error when reducing ")
-        ctx.logger.error(e)
-    return reduced
+dt is the number of seconds since the previous row (the first row counts from base_timestamp).
+amount0 and amount1 are in whole tokens, price0 is token0 priced in token1.
 
-def approx_token_count(text: str) -> int:
-    """Approximate token count from text length."""
-    return len(text) // 4
+Rules:
+- The token with the negative amount is the taker.
+- If the trade looks bad, set maker_amount = 0 and expiry = 0.
+- You MUST return ONLY valid JSON that conforms exactly to the schema as follows:
+{
+    "maker": string,
+    "taker": string,
+    "maker_amount": float,
+    "expiry": int
+}
+- Do NOT include code fences, markdown, or explanations.
 
-def safe_prompt(prompt: str) -> str:
-    tokens = approx_token_count(prompt)
-    if tokens > MAX_TOKENS:
-        excess = tokens - MAX_TOKENS
-        chars_to_trim = excess * 4
-        prompt = prompt[chars_to_trim:]
-    return prompt
+"""
 
-def fetch_swaps(ctx: Context,poolAddress: str, network: str = "matic", startTime: int = 1735689600, endTime: int = 9999999999, swaps_interval_minutes: int = 5, limit: int = 100):
-    url = f"https://token-api.thegraph.com/swaps/evm?network_id={network}&pool={poolAddress}&startTime={startTime}&endTime={endTime}&orderBy=timestamp&orderDirection=desc&limit={limit}"
-    headers = {"Authorization": f"Bearer {THEGRAPH_JWT_TOKEN}"}
-    response = requests.get(url, headers=headers)
-    ctx.logger.info("response got from The Graph")
-    # ctx.logger.info(str(response.json()))
+SYSTEM_PROMPT_INDICATORS = """
+You are a DeFi Signal Agent. 
+
+steps:
+1. Read the technical indicators computed over recent pool swaps
+2. Provide a limit order that should be placed within the constraints of the user
+
+The indicators are computed over one swap per interval; prices are token1 per token0.
+A positive net flow means traders took more of that token out of the pool than they put in.
+
+Rules:
+- If the trade looks bad, set maker_amount = 0 and expiry = 0.
+- You MUST return ONLY valid JSON that conforms exactly to the schema as follows:
+{
+    "maker": string,
+    "taker": string,
+    "maker_amount": float,
+    "expiry": int
+}
+- Do NOT include code fences, markdown, or explanations.
 
-    response.raise_for_status()
+"""
 
-    graph_response = response.json()
-    
+INDICATOR_PROMPT_TEMPLATE = """
+User wants to swap {makerToken} for {takerToken}.
+- Maximum maker tokens available with the user: {makerMaxAmount}
+- Maximum expiry in hours for the limit order: {maxExpiry}
 
-    return reduce_swaps(ctx,graph_response, swaps_interval_minutes)
+Here are technical indicators of recent pool swap data:
+{indicators}
+"""
+
+SYSTEM_PROMPT_CANDLES = """
+You are a DeFi Signal Agent. 
+
+steps:
+1. Decide upon appropriate trade indicators
+2. Implement indicators upon the provided OHLCV candles
+3. Provide a limit order that should be placed within the constraints of the user
+
+The candles are built from every swap in the pool; prices are token1 per token0 and
+volume0/volume1 are the traded amounts of token0/token1 in whole tokens.
+
+Rules:
+- If the trade looks bad, set maker_amount = 0 and expiry = 0.
+- You MUST return ONLY valid JSON that conforms exactly to the schema as follows:
+{
+    "maker": string,
+    "taker": string,
+    "maker_amount": float,
+    "expiry": int
+}
+- Do NOT include code fences, markdown, or explanations.
+
+"""
+
+CANDLE_PROMPT_TEMPLATE = """
+User wants to swap {makerToken} for {takerToken}.
+- Maximum maker tokens available with the user: {makerMaxAmount}
+- Maximum expiry in hours for the limit order: {maxExpiry}
+
+Here are OHLCV candles of recent pool swap data:
+{candles}
+"""
+
+pipeline = SignalPipeline(
+    "chat",
+    MAX_TOKENS,
+    system_prompts={
+        "swaps": SYSTEM_PROMPT_2,
+        "compact": SYSTEM_PROMPT_COMPACT,
+        "indicators": SYSTEM_PROMPT_INDICATORS,
+        "candles": SYSTEM_PROMPT_CANDLES,
+    },
+    templates={
+        "swaps": USER_PROMPT_TEMPLATE,
+        "indicators": INDICATOR_PROMPT_TEMPLATE,
+        "candles": CANDLE_PROMPT_TEMPLATE,
+    },
+    metrics_port=METRICS_PORT,
+    network=NETWORK,
+)
+pipeline.add_handlers(agent)
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # A prefetch the handler never awaits must not warn about an unretrieved exception;
+    # when the handler does await it, the error surfaces there as usual
+    if not task.cancelled():
+        task.exception()
+
+
+async def send_text(ctx: Context, sender: str, text: str):
+    """Answers with a single text and ends the session."""
+    await ctx.send(sender, ChatMessage(
+        timestamp=datetime.utcnow(),
+        msg_id=uuid4(),
+        content=[
+            TextContent(type="text", text=text),
+            EndSessionContent(type="end-session"),
+        ]
+    ))
+
+
+def error_text(e: Exception) -> str:
+    """What the user is told when building their order failed."""
+    if isinstance(e, LookupError):  # TokenNotFound, AmbiguousToken, PoolNotFound
+        return f"I could not find a pool for that trade: {e}"
+    if isinstance(e, resilience.UpstreamError):
+        source = "The trading model" if e.upstream == "asi_one" else "The swap data service"
+        return f"{source} is not responding right now ({e.attempts} attempts), please try again shortly."
+    if isinstance(e, PromptTooLarge):
+        return "The pool has too much recent activity to analyse in one request, please try again later."
+    if isinstance(e, ValueError):
+        return "I could not understand the model's answer, please rephrase your request and try again."
+    return f"Something went wrong while building your limit order ({type(e).__name__}), please try again."
+
+
+async def reject_message(ctx: Context, sender: str, msg: ChatMessage, reason: str):
+    await send_text(ctx, sender, f"The agent is too busy to answer in time ({reason}), please try again shortly.")
 
 
 # We define the handler for the chat messages that are sent to your agent
 @protocol.on_message(ChatMessage)
+@metrics.timed("handle_message")
+@admission.admitted(admission_queue, "handle_message", admission.PRIORITY_CHAT, admission.REQUEST_DEADLINE, reject_message)
 async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
+    timings = {}
     # send the acknowledgement for receiving the message
     await ctx.send(
         sender,
@@ -252,79 +315,104 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
         if isinstance(item, TextContent):
             text += item.text
 
+    # When the text names exactly two tokens their pool is known before the model parses
+    # the intent, so its swaps load meanwhile. The prefetch is never cancelled: other
+    # requests may be coalesced onto the same fetch.
+    prefetch = None
+    # Common phrasings are parsed locally; only the rest cost a model round-trip
+    with metrics.span("handle_message", "parse_local", timings):
+        fields = intentParser.fast_parse(text, NETWORK)
+    mentioned = tokenIndex.tokens_in_text(text, NETWORK) if fields is None else []
+    if len(mentioned) == 2:
+        prefetch_pool = tokenIndex.cached_pool(mentioned[0], mentioned[1], NETWORK)
+        if prefetch_pool:
+            prefetch = asyncio.create_task(pipeline.load_pool_data(prefetch_pool))
+            prefetch.add_done_callback(_retrieve_exception)
+
     # query the model based on the user question
     response = ""
     try:
-        r = client.chat.completions.create(
-            model=ASI_ONE_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT_1},
-                {"role": "user", "content": text},
-            ],
-        )
-
-        response = r.choices[0].message.content
-        ctx.logger.info(f"Raw LLM response: {response}")
-
-        try:
-            # Parse the JSON string into your Pydantic model
-            tradeInput = UserInput.model_validate_json(response)
-        except Exception as e:
-            ctx.logger.error(f"Failed to parse LLM response into UserInput: {e}")
-            return
-
-        ctx.logger.info(f"Parsed trade input: {tradeInput}")
+        if fields is not None:
+            tradeInput = UserInput(**fields)
+        else:
+            try:
+                # The answer is parsed into the Pydantic model while it streams
+                with metrics.span("handle_message", "llm_parse", timings):
+                    tradeInput = await modelRouter.complete_json(
+                        "intent",
+                        UserInput,
+                        ASI_ONE_MODEL,
+                        messages=[
+                            {"role": "system", "content": SYSTEM_PROMPT_1},
+                            {"role": "user", "content": text},
+                        ],
+                    )
+            except ValueError as e:
+                ctx.logger.error(f"Failed to parse LLM response into UserInput: {e}")
+                await send_text(ctx, sender, error_text(e))
+                return
+
+        ctx.logger.info(f"Parsed trade input: {tradeInput}, intent parser: {intentParser.stats.stats()}")
 
         if tradeInput.makerMaxAmount > 0:
             ctx.logger.info(f"Received trade input")
-            swap_data = fetch_swaps(ctx,"0x4ccd010148379ea531d6c587cfdd60180196f9b1");
+            with metrics.span("handle_message", "resolve_pool", timings):
+                poolAddress = await tokenIndex.resolve_pool(tradeInput.makerToken, tradeInput.takerToken, NETWORK)
+            ctx.logger.info(f"Resolved pool {poolAddress} for {tradeInput.makerToken}/{tradeInput.takerToken}")
+            with metrics.span("handle_message", "fetch", timings):
+                if prefetch is not None and poolAddress == prefetch_pool:
+                    swap_data, features = await prefetch
+                else:
+                    swap_data, features = await pipeline.load_pool_data(poolAddress)
             ctx.logger.info(f"Fetched data from TheGraph")
-           
-            prompt = USER_PROMPT_TEMPLATE.format(
-                makerToken=tradeInput.makerToken,
-                takerToken=tradeInput.takerToken,
-                makerMaxAmount=tradeInput.makerMaxAmount,
-                maxExpiry=tradeInput.maxExpiry,
-                swap_data=json.dumps(swap_data, indent=2)
-            )
-            prompt = safe_prompt(prompt)
-            # ctx.logger.info(f"prompt: {str(prompt)}")
-            chat_completion = client.chat.completions.create(
-                model=ASI_ONE_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT_2},
-                    {"role": "user", "content": prompt},
-                ],
-                response_format={"type": "json_schema", "json_schema": AIResponse.model_json_schema()},
-                max_completion_tokens= 64000
-            )
-            ctx.logger.info(f"JSON LLM response: {chat_completion.choices[0]}")
-            json_response_str = chat_completion.choices[0].message.content
-            
+            if isinstance(swap_data, list):
+                metrics.swaps_kept.inc(len(swap_data), "handle_message")
+
+            with metrics.span("handle_message", "cache", timings):
+                state = responseCache.market_state(swap_data, features)
+                cache_key = pipeline.response_cache.key(poolAddress, tradeInput, state)
+                cached = pipeline.response_cache.lookup(cache_key, state, tradeInput.makerMaxAmount)
+            if cached is not None:
+                ctx.logger.info(f"Cached LLM response: {cached}, stage timings: {metrics.format_timings(timings)}")
+                await send_text(ctx, sender, str(cached))
+                return
 
+            with metrics.span("handle_message", "prompt", timings):
+                system_prompt, prompt = pipeline.build_prompt(tradeInput, swap_data, features)
+                prompt = pipeline.safe_prompt(prompt)
+            # ctx.logger.info(f"prompt: {str(prompt)}")
             try:
-                ai_response = AIResponse.model_validate_json(json_response_str)
-            except Exception as e:
+                with metrics.span("handle_message", "llm", timings):
+                    ai_response = await modelRouter.complete_json(
+                        "order",
+                        AIResponse,
+                        ASI_ONE_MODEL,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": prompt},
+                        ],
+                        response_format={"type": "json_schema", "json_schema": AIResponse.model_json_schema()},
+                        max_completion_tokens= 64000
+                    )
+            except ValueError as e:
                 ctx.logger.error(f"Failed to parse LLM response into AIResponse: {e}")
+                await send_text(ctx, sender, error_text(e))
                 return
+            ctx.logger.info(f"JSON LLM response: {ai_response}")
 
             if ai_response.expiry > tradeInput.maxExpiry:
                 ai_response.expiry = int(tradeInput.maxExpiry)
+            with metrics.span("handle_message", "cap", timings):
+                ai_response = await pipeline.cap_to_liquidity(ctx, poolAddress, ai_response)
+            pipeline.response_cache.store(cache_key, ai_response, state)
+            ctx.logger.info(f"Stage timings: {metrics.format_timings(timings)}")
 
             response = ai_response
+    except admission.Rejected:
+        raise
     except Exception as e:
-        ctx.logger.error(f"Swap fetch failed: {e}")
-        await ctx.send(sender, ChatMessage(
-        timestamp=datetime.utcnow(),
-        msg_id=uuid4(),
-        content=[
-            # we send the contents back in the chat message
-            TextContent(type="text", text="Error"),
-            # we also signal that the session is over, this also informs the user that we are not recording any of the
-            # previous history of messages.
-            EndSessionContent(type="end-session"),
-        ]
-        ))
+        ctx.logger.error(f"Building the limit order failed: {type(e).__name__}: {e}")
+        await send_text(ctx, sender, error_text(e))
         return
 
 
@@ -0,0 +1,167 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def series_from_records(records: list) -> dict:
+    """Column arrays of the cleaned records `reduce_swaps` produces."""
+    n = len(records)
+    return {
+        "timestamp": np.fromiter((r["timestamp"] for r in records), dtype=np.int64, count=n),
+        "amount0": np.fromiter((r["amount0"] for r in records), dtype=np.float64, count=n),
+        "amount1": np.fromiter((r["amount1"] for r in records), dtype=np.float64, count=n),
+        "price0": np.fromiter((float(r["price0"]) for r in records), dtype=np.float64, count=n),
+        "price1": np.fromiter((float(r["price1"]) for r in records), dtype=np.float64, count=n),
+    }
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average, NaN until the window fills."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.size >= window:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def ema(values: np.ndarray, span: int = None, alpha: float = None) -> np.ndarray:
+    """
+    Exponential moving average seeded with the first value (pandas adjust=False).
+    The recursion is solved in closed form per block; blocks keep decay**-k finite.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values.copy()
+    if alpha is None:
+        alpha = 2.0 / (span + 1)
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return values.copy()
+
+    out = np.empty_like(values)
+    block = max(1, int(50 / -np.log(decay)))
+    prev = values[0]
+    for start in range(0, values.size, block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, chunk.size + 1)
+        out[start:start + block] = powers * (prev + alpha * np.cumsum(chunk / powers))
+        prev = out[start + chunk.size - 1]
+    return out
+
+
+def rsi(prices: np.ndarray, period: int = 14) -> np.ndarray:
+    """Relative strength index with Wilder smoothing, NaN for the first price."""
+    prices = np.asarray(prices, dtype=np.float64)
+    out = np.full(prices.shape, np.nan)
+    if prices.size < 2:
+        return out
+    change = np.diff(prices)
+    gain = ema(np.clip(change, 0.0, None), alpha=1.0 / period)
+    loss = ema(np.clip(-change, 0.0, None), alpha=1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = np.where(loss == 0.0, np.where(gain == 0.0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + gain / loss))
+    return out
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """Population standard deviation over a sliding window, NaN until it fills."""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.size >= window:
+        out[window - 1:] = sliding_window_view(values, window).std(axis=1)
+    return out
+
+
+def bollinger(prices: np.ndarray, window: int = 20, k: float = 2.0) -> tuple:
+    """Returns (middle, upper, lower) Bollinger bands."""
+    middle = sma(prices, window)
+    width = k * rolling_std(prices, window)
+    return middle, middle + width, middle - width
+
+
+def vwap(prices: np.ndarray, volumes: np.ndarray) -> float:
+    """Volume weighted average price; volumes are taken in absolute value."""
+    volumes = np.abs(np.asarray(volumes, dtype=np.float64))
+    total = volumes.sum()
+    if total == 0.0:
+        return float("nan")
+    return float(np.dot(np.asarray(prices, dtype=np.float64), volumes) / total)
+
+
+def atr(prices: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    ATR-style volatility. The reduced series has one price per interval,
+    so the true range is the absolute change between consecutive prices.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    out = np.full(prices.shape, np.nan)
+    if prices.size >= 2:
+        out[1:] = ema(np.abs(np.diff(prices)), alpha=1.0 / period)
+    return out
+
+
+def net_flow(amount: np.ndarray) -> dict:
+    """
+    Buy/sell flow of one pool token from its signed amounts. A negative amount
+    left the pool, so the trader bought that token.
+    """
+    amount = np.asarray(amount, dtype=np.float64)
+    bought = -amount[amount < 0].sum()
+    sold = amount[amount > 0].sum()
+    return {"bought": float(bought), "sold": float(sold), "net": float(bought - sold), "trades_bought": int((amount < 0).sum()), "trades_sold": int((amount > 0).sum())}
+
+
+def _rounded(value: float, digits: int = 6):
+    """Rounds for the prompt; NaN and infinity become None so the summary stays valid JSON."""
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), digits)
+
+
+def _last(values: np.ndarray, digits: int = 6):
+    if values.size == 0:
+        return None
+    return _rounded(values[-1], digits)
+
+
+def indicator_summary(records: list, fast: int = 12, slow: int = 26, period: int = 14, band_window: int = 20) -> dict:
+    """
+    The handful of numbers the signal prompts send instead of the raw swaps,
+    computed over the reduced series. Prices are price0, i.e. token0 in token1.
+    Records without a positive price are left out; a zero price would turn the
+    change and the log returns into infinities.
+    """
+    if not records:
+        return {}
+
+    series = series_from_records(records)
+    valid = np.isfinite(series["price0"]) & (series["price0"] > 0)
+    if not valid.all():
+        if not valid.any():
+            return {}
+        series = {name: column[valid] for name, column in series.items()}
+    prices = series["price0"]
+    middle, upper, lower = bollinger(prices, band_window)
+    log_returns = np.diff(np.log(prices)) if prices.size > 1 else np.empty(0)
+
+    return {
+        "token0": records[-1]["token0"]["symbol"],
+        "token1": records[-1]["token1"]["symbol"],
+        "price_quote": "token1 per token0",
+        "intervals": int(prices.size),
+        "from_timestamp": int(series["timestamp"][0]),
+        "to_timestamp": int(series["timestamp"][-1]),
+        "last_price": _last(prices),
+        "change_pct": round(float((prices[-1] / prices[0] - 1.0) * 100.0), 4),
+        f"sma_{band_window}": _last(middle),
+        f"ema_{fast}": _last(ema(prices, fast)),
+        f"ema_{slow}": _last(ema(prices, slow)),
+        f"rsi_{period}": _last(rsi(prices, period), 2),
+        "vwap": _rounded(vwap(prices, series["amount0"])),
+        "bollinger_upper": _last(upper),
+        "bollinger_lower": _last(lower),
+        f"atr_{period}": _last(atr(prices, period)),
+        "volatility_per_interval": _rounded(log_returns.std()) if log_returns.size else None,
+        "flow_token0": net_flow(series["amount0"]),
+        "flow_token1": net_flow(series["amount1"]),
+    }
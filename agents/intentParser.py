@@ -0,0 +1,135 @@
+import os
+import re
+import time
+from typing import Optional
+
+import tokenIndex
+
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.9"))
+
+_AMOUNT = r"(?P<amount>\d[\d,]*(?:\.\d+)?|\.\d+)\s*(?P<scale>[kKmM](?![A-Za-z]))?"
+_TOKEN = r"(?P<{}>0x[0-9a-fA-F]{{40}}|\$?[A-Za-z][\w.+$]*)"
+_TO = r"(?:for|to|into|->|→|=>)"
+
+# "swap 20 USDT for WETH", "sell up to 1.5k USDC to WETH", "20 USDT -> WETH"
+_SELL = re.compile(
+    r"(?:(?:swap|sell|trade|exchange|convert|change|spend|use)\s+)?(?:(?:up to|at most|max(?:imum)?)\s+)?"
+    + _AMOUNT + r"\s*" + _TOKEN.format("maker") + r"\s+" + _TO + r"\s+" + _TOKEN.format("taker"),
+    re.IGNORECASE,
+)
+# "buy WETH with 20 USDT", "get WETH for 20 USDT"
+_BUY = re.compile(
+    r"(?:buy|get|receive|acquire)\s+" + _TOKEN.format("taker")
+    + r"\s+(?:with|using|for|from)\s+(?:(?:up to|at most|max(?:imum)?)\s+)?" + _AMOUNT + r"\s*" + _TOKEN.format("maker"),
+    re.IGNORECASE,
+)
+_EXPIRY = re.compile(
+    r"(?P<n>\d+(?:\.\d+)?)\s*(?P<unit>hours?|hrs?|h|days?|d|minutes?|mins?|weeks?|wk?s?)\b",
+    re.IGNORECASE,
+)
+_NEGATION = re.compile(r"\b(?:not|don'?t|never|no|cancel|without)\b", re.IGNORECASE)
+
+_UNIT_HOURS = {"h": 1.0, "d": 24.0, "m": 1.0 / 60.0, "w": 168.0}
+_SCALE = {"k": 1e3, "m": 1e6}
+
+
+class ParserStats:
+    """How many intents took the fast path and how many fell back to the model."""
+
+    def __init__(self):
+        self.fast = 0
+        self.fallback = 0
+        self.parse_seconds = 0.0
+
+    def record(self, fast: bool, seconds: float = 0.0):
+        if fast:
+            self.fast += 1
+        else:
+            self.fallback += 1
+        self.parse_seconds += seconds
+
+    def stats(self) -> dict:
+        total = self.fast + self.fallback
+        return {
+            "fast": self.fast,
+            "fallback": self.fallback,
+            "hit_rate": self.fast / total if total else 0.0,
+            "parse_us_avg": self.parse_seconds / total * 1e6 if total else 0.0,
+        }
+
+
+stats = ParserStats()
+
+
+def _amount(match) -> float:
+    value = float(match.group("amount").replace(",", ""))
+    scale = match.group("scale")
+    return value * _SCALE[scale.lower()] if scale else value
+
+
+def _token(word: str, network: str) -> Optional[tokenIndex.Token]:
+    try:
+        return tokenIndex.resolve_token(word.rstrip(".,;:!?"), network)
+    except LookupError:
+        return None
+
+
+def parse_intent(text: str, network: str = "matic") -> tuple:
+    """
+    Reads maker, taker, amount and expiry out of a trade request without the model.
+    Args:
+        text (str): The user's message.
+    Returns:
+        tuple: (fields, confidence). fields has the UserInput fields, or is None when no
+        trade phrase with two known tokens was found; confidence is in [0, 1].
+    """
+    match = _SELL.search(text) or _BUY.search(text)
+    if match is None:
+        return None, 0.0
+
+    maker_word = match.group("maker").rstrip(".,;:!?")
+    taker_word = match.group("taker").rstrip(".,;:!?")
+    maker = _token(maker_word, network)
+    taker = _token(taker_word, network)
+    if maker is None or taker is None or maker.address == taker.address:
+        return None, 0.0
+
+    amount = _amount(match)
+    if amount <= 0:
+        return None, 0.0
+
+    confidence = 1.0
+    # The expiry is read from the rest of the text, so "20m USDT" is never taken for minutes
+    rest = text[:match.start()] + " " + text[match.end():]
+    expiries = _EXPIRY.findall(rest)
+    if len(expiries) == 1:
+        n, unit = expiries[0]
+        max_expiry = float(n) * _UNIT_HOURS[unit[0].lower()]
+    else:
+        # Missing or conflicting expiry: the model's own default, but not confident enough to skip it
+        max_expiry = 15.0
+        confidence -= 0.4
+    if _NEGATION.search(text):
+        confidence -= 0.6
+    if len(tokenIndex.tokens_in_text(text, network)) > 2 or len(_SELL.findall(text)) + len(_BUY.findall(text)) > 1:
+        confidence -= 0.5
+
+    fields = {
+        "makerToken": maker_word,
+        "takerToken": taker_word,
+        "makerMaxAmount": amount,
+        "maxExpiry": max_expiry,
+    }
+    return fields, max(confidence, 0.0)
+
+
+def fast_parse(text: str, network: str = "matic", min_confidence: float = INTENT_MIN_CONFIDENCE) -> Optional[dict]:
+    """
+    The UserInput fields when the text parses with at least min_confidence, else None and
+    the caller asks the model. Every call is counted in `stats`.
+    """
+    started = time.perf_counter()
+    fields, confidence = parse_intent(text, network)
+    hit = fields is not None and confidence >= min_confidence
+    stats.record(hit, time.perf_counter() - started)
+    return fields if hit else None
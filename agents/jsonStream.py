@@ -0,0 +1,197 @@
+import json
+from functools import lru_cache
+from typing import Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+STREAM_MAX_CHARS = 16384
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = ",}]" + _WHITESPACE
+
+
+@lru_cache(maxsize=None)
+def _field_validators(model: Type[BaseModel]) -> tuple:
+    """TypeAdapters of the model's fields and its required field names, built once per model."""
+    adapters = {name: TypeAdapter(field.annotation) for name, field in model.model_fields.items()}
+    required = frozenset(name for name, field in model.model_fields.items() if field.is_required())
+    return adapters, required
+
+
+class MalformedStream(ValueError):
+    """The streamed output cannot become a valid instance of the expected model."""
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _string_end(text: str, pos: int):
+    """Index just past the JSON string starting at text[pos] == '"', or None if it is not closed yet."""
+    pos += 1
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\":
+            pos += 2
+            continue
+        if char == '"':
+            return pos + 1
+        pos += 1
+    return None
+
+
+def _value_end(text: str, pos: int):
+    """Index just past the JSON value starting at text[pos], or None if more text is needed."""
+    char = text[pos]
+    if char == '"':
+        return _string_end(text, pos)
+    if char in "{[":
+        depth = 0
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                end = _string_end(text, pos)
+                if end is None:
+                    return None
+                pos = end
+                continue
+            if char in "{[":
+                depth += 1
+            elif char in "}]":
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+            pos += 1
+        return None
+    # numbers and literals end at the next delimiter, which may not have arrived yet
+    while pos < len(text):
+        if text[pos] in _SCALAR_END:
+            return pos
+        pos += 1
+    return None
+
+
+class IncrementalObjectParser:
+    """
+    Parses a streamed JSON object into a pydantic model one field at a time.
+
+    Each top-level field is validated against the model as soon as its value is
+    complete, so bad output raises MalformedStream at the first wrong field instead
+    of after the whole completion. `feed` returns True once every required field is
+    valid; the caller can stop the stream there without waiting for the closing brace.
+    """
+
+    def __init__(self, model: Type[BaseModel], max_chars: int = STREAM_MAX_CHARS):
+        self.model = model
+        self.max_chars = max_chars
+        self.fields = {}
+        self._adapters, self._required = _field_validators(model)
+        self._text = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+
+    @property
+    def complete(self) -> bool:
+        return self._required.issubset(self.fields)
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> bool:
+        self._text += chunk
+        if len(self._text) > self.max_chars:
+            raise MalformedStream(f"output exceeds {self.max_chars} characters without completing {self.model.__name__}")
+        while self._step():
+            pass
+        return self.complete
+
+    def _fail(self, expected: str):
+        raise MalformedStream(f"expected {expected} at offset {self._pos}: {self._text[self._pos:self._pos + 40]!r}")
+
+    def _step(self) -> bool:
+        """Consumes one token if it is complete; returns whether it made progress."""
+        text = self._text
+        pos = _skip_whitespace(text, self._pos)
+        if pos >= len(text) or self._state == "done":
+            self._pos = pos
+            return False
+        char = text[pos]
+
+        if self._state == "start":
+            if text.startswith("```", pos):
+                # tolerate a code fence the model was told not to send
+                newline = text.find("\n", pos)
+                if newline < 0:
+                    return False
+                self._pos = newline + 1
+                return True
+            if char != "{":
+                self._pos = pos
+                self._fail("'{'")
+            self._pos, self._state = pos + 1, "key"
+            return True
+
+        if self._state == "key":
+            if char == "}":
+                return self._close(pos)
+            if char != '"':
+                self._pos = pos
+                self._fail("a field name")
+            end = _string_end(text, pos)
+            if end is None:
+                return False
+            self._key = json.loads(text[pos:end])
+            self._pos, self._state = end, "colon"
+            return True
+
+        if self._state == "colon":
+            if char != ":":
+                self._pos = pos
+                self._fail("':'")
+            self._pos, self._state = pos + 1, "value"
+            return True
+
+        if self._state == "value":
+            end = _value_end(text, pos)
+            if end is None:
+                return False
+            self._pos = pos
+            try:
+                value = json.loads(text[pos:end])
+            except ValueError:
+                self._fail(f"a JSON value for {self._key!r}")
+            adapter = self._adapters.get(self._key)
+            if adapter is not None:
+                try:
+                    self.fields[self._key] = adapter.validate_python(value)
+                except ValidationError as e:
+                    raise MalformedStream(f"invalid {self._key!r}: {e.errors()[0]['msg']}") from None
+            self._pos, self._state = end, "comma"
+            return True
+
+        # after a value
+        if char == ",":
+            self._pos, self._state = pos + 1, "key"
+            return True
+        if char == "}":
+            return self._close(pos)
+        self._pos = pos
+        self._fail("',' or '}'")
+
+    def _close(self, pos: int) -> bool:
+        self._pos, self._state = pos + 1, "done"
+        if not self.complete:
+            missing = ", ".join(sorted(self._required - set(self.fields)))
+            raise MalformedStream(f"object closed without {missing}")
+        return False
+
+    def result(self) -> BaseModel:
+        """The validated model; raises MalformedStream if the output ended before it was complete."""
+        if not self.complete:
+            missing = ", ".join(sorted(self._required - set(self.fields)))
+            raise MalformedStream(f"output ended without {missing}")
+        return self.model.model_validate(self.fields)
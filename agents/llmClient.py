@@ -0,0 +1,133 @@
+import asyncio
+import os
+from typing import Optional, Type
+
+import httpx
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+
+import admission
+import metrics
+import resilience
+from jsonStream import IncrementalObjectParser
+from promptBudget import count_tokens
+
+ASI_ONE_BASE_URL = "https://api.asi1.ai/v1"
+ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY","")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+# Stream completions and stop as soon as the expected JSON is complete
+LLM_STREAM = os.getenv("LLM_STREAM", "true").lower() in ("1", "true", "yes")
+# Immediate retries after output that cannot be parsed into the expected model
+LLM_MALFORMED_RETRIES = int(os.getenv("LLM_MALFORMED_RETRIES", "1"))
+# Calls per second (and burst) allowed to ASI:One across the agent, 0 for no limit
+ASI_ONE_RATE = float(os.getenv("ASI_ONE_RATE", "5"))
+ASI_ONE_BURST = float(os.getenv("ASI_ONE_BURST", "10"))
+# Retries of a transient failure (timeouts, 429, 5xx); hedging doubles the tokens of slow calls, so it is opt-in
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_rate_limiter = admission.TokenBucket(ASI_ONE_RATE, ASI_ONE_BURST)
+asi_one = resilience.Upstream("asi_one", LLM_TIMEOUT, LLM_RETRIES, hedge=LLM_HEDGE)
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Returns the shared async ASI:One client, creating it on first use.
+    Its HTTP pool is sized to LLM_MAX_CONCURRENCY so every allowed call has a warm connection.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=ASI_ONE_API_KEY,
+            base_url=ASI_ONE_BASE_URL,
+            timeout=LLM_TIMEOUT,
+            # retried by `asi_one` instead, which knows the request deadline
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONCURRENCY,
+                    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                ),
+                timeout=LLM_TIMEOUT,
+            ),
+        )
+    return _client
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def chat_completion(**kwargs):
+    """
+    `client.chat.completions.create` on the shared async client, with at most
+    LLM_MAX_CONCURRENCY calls in flight across the agent; the rest wait their turn
+    without blocking the event loop.
+    """
+    async with get_semaphore():
+        await _rate_limiter.acquire("asi_one")
+        return await get_client().chat.completions.create(**kwargs)
+
+
+def _record_tokens(kwargs: dict, usage, completion_text: str):
+    """Token counters of one call: the API's usage when it reports one, else counted locally."""
+    model = kwargs.get("model", "")
+    if usage is not None:
+        metrics.prompt_tokens.inc(usage.prompt_tokens, model)
+        metrics.completion_tokens.inc(usage.completion_tokens, model)
+        return
+    # A stream closed early never gets to its usage chunk
+    metrics.prompt_tokens.inc(sum(count_tokens(message.get("content") or "") for message in kwargs.get("messages", ())), model)
+    metrics.completion_tokens.inc(count_tokens(completion_text), model)
+
+
+async def stream_json(response_model: Type[BaseModel], **kwargs) -> BaseModel:
+    """
+    Streams a completion into an IncrementalObjectParser and closes the stream as soon as
+    every required field of `response_model` is valid, so trailing output is neither awaited nor
+    generated. Raises MalformedStream as soon as the output goes wrong.
+    """
+    parser = IncrementalObjectParser(response_model)
+    async with get_semaphore():
+        await _rate_limiter.acquire("asi_one")
+        stream = await get_client().chat.completions.create(stream=True, **kwargs)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content and parser.feed(chunk.choices[0].delta.content):
+                    break
+        finally:
+            await stream.close()
+            _record_tokens(kwargs, None, parser.text)
+    return parser.result()
+
+
+async def complete_json(response_model: Type[BaseModel], retries: int = LLM_MALFORMED_RETRIES, **kwargs) -> BaseModel:
+    """
+    A completion validated into `response_model`, streamed when LLM_STREAM is set.
+    Output that does not validate is retried right away up to `retries` times;
+    transient API failures are retried (and hedged) by `asi_one`.
+    """
+    for attempt in range(retries + 1):
+        try:
+            if LLM_STREAM:
+                return await asi_one.call(lambda: stream_json(response_model, **kwargs))
+            completion = await asi_one.call(lambda: chat_completion(**kwargs))
+            _record_tokens(kwargs, completion.usage, completion.choices[0].message.content or "")
+            return response_model.model_validate_json(completion.choices[0].message.content)
+        except ValueError:  # MalformedStream and pydantic's ValidationError
+            if attempt == retries:
+                raise
+
+
+async def close_client():
+    """Closes the shared client. Call this from the agent's shutdown handler."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+from typing import Optional
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Stage latencies range from a cached lookup to a long model call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}  # label values -> count
+
+    def inc(self, amount: float = 1, *labels):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label set. Buckets are stored per bucket
+    and only made cumulative when rendered, so an observation is one bisect and three adds.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # label values -> [bucket counts (last is +Inf), sum, count]
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_label_text(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    "agent_stage_seconds", "Time spent in each stage of a handler.", ("handler", "stage"),
+))
+stage_errors = registry.register(Counter(
+    "agent_stage_errors_total", "Stages that ended with an exception.", ("handler", "stage"),
+))
+swaps_fetched = registry.register(Counter(
+    "agent_swaps_fetched_total", "Swaps received from the token-api.", ("network",),
+))
+swaps_kept = registry.register(Counter(
+    "agent_swaps_kept_total", "Reduced swap records handed to prompt building.", ("handler",),
+))
+prompt_tokens = registry.register(Counter(
+    "agent_llm_prompt_tokens_total", "Prompt tokens sent to the model.", ("model",),
+))
+completion_tokens = registry.register(Counter(
+    "agent_llm_completion_tokens_total", "Completion tokens received from the model.", ("model",),
+))
+admission_results = registry.register(Counter(
+    "agent_admission_total", "Requests admitted or rejected by admission control.", ("handler", "result"),
+))
+upstream_throttled = registry.register(Counter(
+    "agent_upstream_throttled_total", "Upstream calls delayed or rejected by their rate limiter.", ("upstream", "result"),
+))
+upstream_seconds = registry.register(Histogram(
+    "agent_upstream_seconds", "Latency of successful upstream calls, hedged ones included.", ("upstream",),
+))
+upstream_failures = registry.register(Counter(
+    "agent_upstream_failures_total", "Upstream attempts that failed with a transient error.", ("upstream", "error"),
+))
+upstream_retries = registry.register(Counter(
+    "agent_upstream_retries_total", "Upstream attempts retried after a transient error.", ("upstream",),
+))
+hedges = registry.register(Counter(
+    "agent_upstream_hedges_total", "Hedge requests sent, and those that answered before the original.", ("upstream", "result"),
+))
+model_calls = registry.register(Counter(
+    "agent_model_calls_total", "Routed model calls by whether the answer validated.", ("task", "model", "result"),
+))
+model_seconds = registry.register(Histogram(
+    "agent_model_seconds", "Latency of routed model calls that returned a valid answer.", ("task", "model"),
+))
+watchlist_lookups = registry.register(Counter(
+    "agent_watchlist_lookups_total", "Requests for warm watchlist data, by whether it was fresh.", ("result",),
+))
+cache_results = registry.register(Counter(
+    "agent_cache_total", "In-process cache lookups by result (hits, misses, coalesced) and evicted entries.", ("cache", "result"),
+))
+response_cache_results = registry.register(Counter(
+    "agent_response_cache_total", "Cached model answer lookups by result, and answers dropped after a price move.", ("cache", "result"),
+))
+
+
+class span:
+    """
+    Times a block into agent_stage_seconds{handler, stage}:
+
+        with metrics.span("generate_limit_order", "fetch", timings):
+            ...
+
+    When a `timings` dict is given the duration is also stored under the stage name,
+    so the handler can log its breakdown with `format_timings`.
+    """
+
+    __slots__ = ("handler", "stage", "timings", "started")
+
+    def __init__(self, handler: str, stage: str, timings: Optional[dict] = None):
+        self.handler = handler
+        self.stage = stage
+        self.timings = timings
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        stage_seconds.observe(elapsed, self.handler, self.stage)
+        if exc_type is not None:
+            stage_errors.inc(1, self.handler, self.stage)
+        if self.timings is not None:
+            self.timings[self.stage] = elapsed
+        return False
+
+
+def timed(handler: str):
+    """Decorates an async handler so its whole run is timed as the "total" stage."""
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span(handler, "total"):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def format_timings(timings: dict) -> str:
+    return ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # The headers are not needed, but must be read before answering
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_server: Optional[asyncio.AbstractServer] = None
+
+
+async def start_server(port: int, host: str = METRICS_HOST) -> Optional[asyncio.AbstractServer]:
+    """
+    Serves GET /metrics on host:port; port 0 turns the endpoint off. Call this from the
+    agent's startup handler with the agent's own port, so agents on one host do not collide.
+    A port that is taken anyway is logged as an error and the agent runs without the endpoint.
+    """
+    global _server
+    if _server is None and port:
+        try:
+            _server = await asyncio.start_server(_serve, host, port)
+        except OSError as e:
+            logger.error(f"Metrics endpoint not started on {host}:{port}, set another port for this agent: {e}")
+    return _server
+
+
+async def stop_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
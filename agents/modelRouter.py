@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Type
+
+from pydantic import BaseModel
+
+import llmClient
+import metrics
+from promptBudget import count_tokens
+
+# Smallest (fastest, cheapest) first; escalation goes left to right
+ROUTER_MODELS = tuple(os.getenv("ROUTER_MODELS", "asi1-mini,asi1-extended").split(","))
+# Prompt tokens each model accepts, "model:tokens,..."
+ROUTER_CONTEXT_TOKENS = {
+    model: int(tokens)
+    for model, tokens in (entry.split(":") for entry in os.getenv("ROUTER_CONTEXT_TOKENS", "asi1-mini:32000,asi1-extended:64000").split(","))
+}
+# Off: every call uses the model its agent was written for
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() in ("1", "true", "yes")
+# A model failing validation more often than this for a task is skipped for it...
+ROUTER_MAX_INVALID_RATE = float(os.getenv("ROUTER_MAX_INVALID_RATE", "0.3"))
+# ...except every ROUTER_EXPLORE_EVERY calls, so it can win the task back
+ROUTER_EXPLORE_EVERY = int(os.getenv("ROUTER_EXPLORE_EVERY", "20"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+
+
+class ModelStats:
+    """Moving averages of one model on one task: latency of valid answers and the invalid answer rate."""
+
+    __slots__ = ("latency", "invalid_rate", "samples")
+
+    def __init__(self):
+        self.latency = None
+        self.invalid_rate = 0.0
+        self.samples = 0
+
+    def record(self, seconds: float, valid: bool, alpha: float = 0.2):
+        self.samples += 1
+        self.invalid_rate += alpha * ((0.0 if valid else 1.0) - self.invalid_rate)
+        if valid:
+            self.latency = seconds if self.latency is None else self.latency + alpha * (seconds - self.latency)
+
+
+class ModelRouter:
+    """
+    Picks the model of each call from the task, the prompt size and what each model has
+    recently done on that task.
+
+    Models too small for the prompt are skipped. Of the rest, the smallest one that
+    answers the task validly often enough is used, unless a larger one has proven faster
+    on it. Output that fails validation escalates to the next larger model; only the
+    largest one retries in place (LLM_MALFORMED_RETRIES).
+    """
+
+    def __init__(self, models: tuple = ROUTER_MODELS, context_tokens: dict = ROUTER_CONTEXT_TOKENS):
+        self.models = models
+        self.context_tokens = context_tokens
+        self.stats = {}  # (task, model) -> ModelStats
+        self.calls = {}  # task -> count
+
+    def _stats(self, task: str, model: str) -> ModelStats:
+        stats = self.stats.get((task, model))
+        if stats is None:
+            stats = self.stats[(task, model)] = ModelStats()
+        return stats
+
+    def route(self, task: str, prompt_tokens: int) -> list:
+        """The models to try in order: the chosen one, then the larger ones to escalate to."""
+        fitting = [model for model in self.models if self.context_tokens.get(model, 0) >= prompt_tokens]
+        if not fitting:
+            return [self.models[-1]]
+
+        self.calls[task] = self.calls.get(task, 0) + 1
+        if self.calls[task] % ROUTER_EXPLORE_EVERY == 0:
+            return fitting
+
+        reliable = [model for model in fitting if self._stats(task, model).invalid_rate <= ROUTER_MAX_INVALID_RATE]
+        if not reliable:
+            return fitting[-1:]
+        chosen = reliable[0]
+        chosen_latency = self._stats(task, chosen).latency
+        for model in reliable[1:]:
+            stats = self._stats(task, model)
+            if stats.samples >= ROUTER_MIN_SAMPLES and stats.latency is not None and chosen_latency is not None and stats.latency < chosen_latency:
+                chosen, chosen_latency = model, stats.latency
+        return fitting[fitting.index(chosen):]
+
+    async def complete_json(self, task: str, response_model: Type[BaseModel], default_model: str, messages: list, retries: int = llmClient.LLM_MALFORMED_RETRIES, **kwargs) -> BaseModel:
+        """
+        `llmClient.complete_json` on the routed model, escalating on output that does not
+        validate into `response_model`; `retries` applies to the last model tried.
+        With MODEL_ROUTING off, `default_model` is used as before.
+        """
+        if not MODEL_ROUTING:
+            return await llmClient.complete_json(response_model, retries=retries, model=default_model, messages=messages, **kwargs)
+
+        prompt_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+        models = self.route(task, prompt_tokens)
+        for index, model in enumerate(models):
+            last = index == len(models) - 1
+            started = time.perf_counter()
+            try:
+                result = await llmClient.complete_json(
+                    response_model,
+                    retries=retries if last else 0,
+                    model=model,
+                    messages=messages,
+                    **kwargs,
+                )
+            except ValueError:  # MalformedStream and pydantic's ValidationError
+                self._stats(task, model).record(time.perf_counter() - started, valid=False)
+                metrics.model_calls.inc(1, task, model, "invalid")
+                if last:
+                    raise
+                continue
+            elapsed = time.perf_counter() - started
+            self._stats(task, model).record(elapsed, valid=True)
+            metrics.model_calls.inc(1, task, model, "valid")
+            metrics.model_seconds.observe(elapsed, task, model)
+            return result
+
+    def snapshot(self) -> dict:
+        return {
+            f"{task}/{model}": {"latency": stats.latency, "invalid_rate": round(stats.invalid_rate, 3), "samples": stats.samples}
+            for (task, model), stats in sorted(self.stats.items())
+        }
+
+
+router = ModelRouter()
+
+
+async def complete_json(task: str, response_model: Type[BaseModel], default_model: str, messages: list, **kwargs) -> BaseModel:
+    """`ModelRouter.complete_json` on the shared router."""
+    return await router.complete_json(task, response_model, default_model, messages, **kwargs)
@@ -0,0 +1,138 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+import swapCache
+import swapFetcher
+import swapStore
+import tokenIndex
+
+MAX_SLIPPAGE = float(os.getenv("MAX_SLIPPAGE", "0.01"))
+IMPACT_MIN_SAMPLES = int(os.getenv("IMPACT_MIN_SAMPLES", "20"))
+
+
+class ImpactModel:
+    """
+    Price impact curve of one pool: slippage = coefficient * size ** exponent, with size
+    in token0 and slippage the fractional move of price0 caused by one swap.
+    """
+
+    def __init__(self, coefficient: float, exponent: float, samples: int, token0: dict, token1: dict, price0: float, rows: int, last_timestamp: Optional[int]):
+        self.coefficient = coefficient
+        self.exponent = exponent
+        self.samples = samples
+        self.token0 = token0
+        self.token1 = token1
+        self.price0 = price0
+        # what the curve was fitted on, to tell when new swaps have arrived
+        self.rows = rows
+        self.last_timestamp = last_timestamp
+
+    def __repr__(self):
+        return f"ImpactModel(coefficient={self.coefficient:.6g}, exponent={self.exponent:.3f}, samples={self.samples})"
+
+    def slippage(self, size0):
+        """Expected fractional price move of a swap of `size0` token0 (scalar or array)."""
+        return self.coefficient * np.power(np.abs(size0), self.exponent)
+
+    def max_size(self, max_slippage: float = MAX_SLIPPAGE) -> float:
+        """Largest swap in token0 whose expected slippage stays within max_slippage."""
+        return float((max_slippage / self.coefficient) ** (1.0 / self.exponent))
+
+    def to_token0(self, amount: float, is_token0: bool) -> float:
+        return amount if is_token0 else amount / self.price0
+
+    def from_token0(self, size0: float, is_token0: bool) -> float:
+        return size0 if is_token0 else size0 * self.price0
+
+
+def fit_impact(columns: dict, token0: dict = None, token1: dict = None) -> Optional[ImpactModel]:
+    """
+    Fits the impact curve by least squares in log-log space over consecutive swaps:
+    the size of each swap in token0 against the log change of price0 it caused.
+    Only swaps that moved the price the way their direction implies are used (a negative
+    amount0 means the trader bought token0, which raises price0); the rest are moves of
+    other swaps in the same block. Returns None without enough samples.
+    """
+    timestamps = np.asarray(columns["timestamp"])
+    prices = np.asarray(columns["price0"], dtype=np.float64)
+    amounts = np.asarray(columns["amount0"], dtype=np.float64)
+    rows = int(timestamps.size)
+    if rows < 2:
+        return None
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moves = np.diff(np.log(prices))
+    sizes = amounts[1:]
+    usable = np.isfinite(moves) & (moves != 0.0) & (sizes != 0.0) & (np.sign(moves) == -np.sign(sizes))
+    if np.count_nonzero(usable) < IMPACT_MIN_SAMPLES:
+        return None
+
+    x = np.log(np.abs(sizes[usable]))
+    y = np.log(np.abs(moves[usable]))
+    exponent, intercept = np.polyfit(x, y, 1)
+    # A flat or falling curve is noise, not a pool getting deeper with size
+    exponent = float(np.clip(exponent, 0.25, 2.0))
+    intercept = float(np.mean(y - exponent * x))
+    return ImpactModel(
+        coefficient=float(np.exp(intercept)),
+        exponent=exponent,
+        samples=int(np.count_nonzero(usable)),
+        token0=token0,
+        token1=token1,
+        price0=float(prices[-1]),
+        rows=rows,
+        last_timestamp=int(timestamps[-1]),
+    )
+
+
+_models = {}  # (network, protocol, pool) -> ImpactModel
+
+
+async def get_model(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, protocol: Optional[str] = None, timeout: Optional[float] = None) -> Optional[ImpactModel]:
+    """
+    The pool's impact curve over its recent swaps. The fitted curve is kept per pool and
+    refitted only when the store holds swaps it has not seen; the swap load itself sits
+    behind the shared TTL cache, so back to back orders do not hit the token-api again.
+    """
+    window = ("lookback", swapFetcher.SWAP_LOOKBACK_HOURS) if startTime is None else ("from", startTime)
+    loaded = await swapCache.swap_cache.get_or_fetch(
+        ("columns", network, protocol, poolAddress.lower(), window),
+        lambda: swapStore.load_columns(poolAddress, network=network, startTime=startTime, protocol=protocol, timeout=timeout),
+    )
+    columns = loaded["columns"]
+    rows = len(columns["timestamp"])
+    last_timestamp = int(columns["timestamp"][-1]) if rows else None
+
+    key = (network, protocol, poolAddress.lower())
+    model = _models.get(key)
+    if model is None or model.rows != rows or model.last_timestamp != last_timestamp:
+        model = fit_impact(columns, loaded["token0"], loaded["token1"])
+        if model is None:
+            _models.pop(key, None)
+        else:
+            _models[key] = model
+    return model
+
+
+def cap_amount(model: ImpactModel, maker: str, maker_amount: float, max_slippage: float = MAX_SLIPPAGE, network: str = "matic") -> tuple:
+    """
+    Caps a maker amount to what the pool absorbs within max_slippage.
+    Returns (amount, expected slippage of that amount).
+    """
+    maker_is_token0 = tokenIndex.is_token0(maker, model.token0, model.token1, network)
+    limit = model.from_token0(model.max_size(max_slippage), maker_is_token0)
+    amount = min(maker_amount, limit)
+    return amount, float(model.slippage(model.to_token0(amount, maker_is_token0)))
+
+
+async def capped_amount(poolAddress: str, maker: str, maker_amount: float, network: str = "matic", max_slippage: float = MAX_SLIPPAGE, protocol: Optional[str] = None) -> tuple:
+    """
+    `cap_amount` against the pool's current curve. Without enough history to fit one the
+    amount is returned unchanged with an unknown (None) slippage.
+    """
+    model = await get_model(poolAddress, network=network, protocol=protocol)
+    if model is None:
+        return maker_amount, None
+    return cap_amount(model, maker, maker_amount, max_slippage, network)
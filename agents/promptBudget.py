@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the length heuristic
+    tiktoken = None
+
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "cl100k_base")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "65536"))
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    The tiktoken encoding, loaded on first use; None when tiktoken or its BPE file is
+    unavailable, which is logged once since every count is then an estimate.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                if tiktoken is None:
+                    logger.warning("tiktoken is not installed, prompt tokens are estimated as len(text) / 4: pip install tiktoken")
+                else:
+                    try:
+                        _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+                    except Exception as e:
+                        logger.warning(f"Could not load the {PROMPT_TOKENIZER} tokenizer, prompt tokens are estimated as len(text) / 4: {e}")
+                _encoding_loaded = True
+    return _encoding
+
+
+async def load_encoding():
+    """
+    Loads the encoding in a worker thread. Call this from the agent's startup handler:
+    the first load may download the BPE file, which would otherwise block the first request.
+    """
+    return await asyncio.to_thread(get_encoding)
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the real tokenizer, or a rounded up len(text) / 4 estimate without one."""
+    encoding = get_encoding()
+    if encoding is None:
+        # Rounding up keeps the sum of per-record estimates an upper bound for the whole prompt
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class PromptTooLarge(ValueError):
+    """The fixed instruction part of a prompt alone exceeds the token budget."""
+
+
+def render_json_record(record) -> str:
+    """One element of `json.dumps(records, indent=2)`, indented as it sits inside the list."""
+    return "  " + json.dumps(record, indent=2).replace("\n", "\n  ")
+
+
+class PromptBudget:
+    """
+    Fits swap records into a token budget.
+
+    Each record is rendered and counted once; counts are cached by rendered text, so
+    the same swap seen in the next request is not encoded again. Whole oldest records
+    are dropped until the prompt fits, and the instruction text around the records is
+    never touched. Sizing is linear in the number of records.
+    """
+
+    def __init__(self, max_tokens: int, count: Callable[[str], int] = count_tokens, cache_size: int = TOKEN_CACHE_SIZE):
+        self.max_tokens = max_tokens
+        self.count = count
+        self.cache_size = cache_size
+        self._counts = OrderedDict()  # rendered record -> tokens
+
+    def count_cached(self, text: str) -> int:
+        tokens = self._counts.get(text)
+        if tokens is None:
+            tokens = self._counts[text] = self.count(text)
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        else:
+            self._counts.move_to_end(text)
+        return tokens
+
+    def fit_count(self, fixed: str, rendered: list, separator: str) -> int:
+        """
+        How many of the newest rendered items fit next to the fixed text, joined by separator.
+        Items are counted once each (cached), walking back from the newest.
+        """
+        fixed_tokens = self.count(fixed)
+        if fixed_tokens > self.max_tokens:
+            raise PromptTooLarge(f"prompt instructions need {fixed_tokens} tokens, budget is {self.max_tokens}")
+
+        separator_tokens = self.count(separator)
+        remaining = self.max_tokens - fixed_tokens
+        start = len(rendered)
+        while start > 0:
+            cost = self.count_cached(rendered[start - 1]) + (separator_tokens if start < len(rendered) else 0)
+            if cost > remaining:
+                break
+            remaining -= cost
+            start -= 1
+        return len(rendered) - start
+
+    def fit(self, head: str, records: list, tail: str = "", render: Callable = render_json_record, separator: str = ",\n", open_: str = "[\n", close: str = "\n]") -> str:
+        """
+        Returns head + the newest records that fit + tail. With the default arguments the
+        records part is exactly `json.dumps(records, indent=2)`. Records must be oldest first.
+        """
+        rendered = [render(record) for record in records]
+        kept = self.fit_count(head + open_ + close + tail, rendered, separator)
+        if not kept:
+            return head + "[]" + tail
+        return head + open_ + separator.join(rendered[len(rendered) - kept:]) + close + tail
+
+
+def split_template(template: str, field: str) -> tuple:
+    """Splits a prompt template around the `{field}` placeholder into (head, tail) templates."""
+    head, tail = template.split("{" + field + "}", 1)
+    return head, tail
@@ -0,0 +1,77 @@
+import json
+from datetime import datetime, timezone
+
+from promptBudget import PromptBudget, count_tokens
+
+COMPACT_COLUMNS = ("dt", "amount0", "amount1", "price0")
+
+
+def _num(value: float, significant: int = 8) -> str:
+    """Shortest general format of a number with the given significant digits."""
+    return f"{float(value):.{significant}g}"
+
+
+def compact_header(records: list) -> str:
+    """Token metadata and the base timestamp, stated once for the whole table."""
+    first = records[0]
+    base = first["timestamp"]
+    token0 = first["token0"]
+    token1 = first["token1"]
+    return (
+        f"token0: {token0['symbol']} {token0['address']} decimals={token0['decimals']}\n"
+        f"token1: {token1['symbol']} {token1['address']} decimals={token1['decimals']}\n"
+        f"base_timestamp: {base} ({datetime.fromtimestamp(base, tz=timezone.utc).isoformat()})\n"
+        f"columns: {','.join(COMPACT_COLUMNS)}\n"
+    )
+
+
+def compact_rows(records: list, significant: int = 8) -> list:
+    """
+    One CSV line per record: seconds since the previous row (the first row counts from
+    base_timestamp), the signed decimal scaled amounts, and price0. price1 is 1 / price0.
+    """
+    rows = []
+    previous = records[0]["timestamp"] if records else 0
+    for record in records:
+        rows.append(",".join((
+            str(record["timestamp"] - previous),
+            _num(record["amount0"], significant),
+            _num(record["amount1"], significant),
+            _num(record["price0"], significant),
+        )))
+        previous = record["timestamp"]
+    return rows
+
+
+def encode_compact(records: list, significant: int = 8) -> str:
+    """The compact form of cleaned swap records: header once, then a delta encoded table."""
+    if not records:
+        return "no swaps"
+    return compact_header(records) + "\n".join(compact_rows(records, significant))
+
+
+def fit_compact(budget: PromptBudget, head: str, records: list, tail: str = "", significant: int = 8) -> str:
+    """
+    head + the compact table of the newest records that fit the budget + tail.
+    Rows are sized with their deltas as encoded in the full table, then the kept
+    records are encoded again so the first kept row starts from base_timestamp.
+    """
+    if not records:
+        return head + encode_compact(records) + tail
+    fixed = head + compact_header(records) + tail
+    kept = budget.fit_count(fixed, compact_rows(records, significant), "\n")
+    return head + encode_compact(records[len(records) - kept:], significant) + tail
+
+
+def measure_reduction(records: list, per: int = 100) -> dict:
+    """Prompt tokens of `json.dumps(records, indent=2)` against the compact form, scaled to `per` swaps."""
+    if not records:
+        return {}
+    json_tokens = count_tokens(json.dumps(records, indent=2))
+    compact_tokens = count_tokens(encode_compact(records))
+    return {
+        "records": len(records),
+        f"json_tokens_per_{per}": round(json_tokens * per / len(records), 1),
+        f"compact_tokens_per_{per}": round(compact_tokens * per / len(records), 1),
+        "reduction_pct": round((1.0 - compact_tokens / json_tokens) * 100.0, 1),
+    }
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import httpx
+import openai
+
+import admission
+import metrics
+
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", "0.25"))
+RETRY_MAX_BACKOFF = float(os.getenv("RETRY_MAX_BACKOFF", "4"))
+# Hedging waits for this quantile of recent latencies before sending the second request
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "256"))
+
+
+class UpstreamError(Exception):
+    """An upstream kept failing with transient errors until the retries or the deadline ran out."""
+
+    def __init__(self, upstream: str, attempts: int, cause: BaseException):
+        detail = f"{type(cause).__name__}: {cause}" if str(cause) else type(cause).__name__
+        super().__init__(f"{upstream} failed after {attempts} attempt{'s' if attempts != 1 else ''}: {detail}")
+        self.upstream = upstream
+        self.attempts = attempts
+
+
+def is_transient(e: BaseException) -> bool:
+    """Timeouts, dropped connections, 429s and 5xx answers; anything else will fail the same way again."""
+    if isinstance(e, (TimeoutError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+    elif isinstance(e, openai.APIStatusError):
+        status = e.status_code
+    else:
+        return False
+    return status == 429 or status >= 500
+
+
+class Upstream:
+    """
+    Calls to one upstream with a per-attempt timeout, bounded retries with full jitter and
+    optional hedging.
+
+    Every attempt is capped by the upstream timeout and by what is left of the request
+    deadline (see `admission`). Transient failures are retried after a random backoff up
+    to `retries` times; other errors are raised as they are. With `hedge`, an attempt
+    still running after the HEDGE_QUANTILE latency of recent calls gets a second,
+    identical request and whichever answers first wins. `fetch` must be safe to run twice.
+    """
+
+    def __init__(self, name: str, timeout: float, retries: int = 2, hedge: bool = False):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.latencies = deque(maxlen=HEDGE_WINDOW)
+
+    def hedge_delay(self) -> Optional[float]:
+        """The HEDGE_QUANTILE of recent latencies, or None before there are enough of them."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(HEDGE_QUANTILE * len(ordered)), len(ordered) - 1)]
+
+    def _attempt_timeout(self, timeout: Optional[float]) -> float:
+        timeout = self.timeout if timeout is None else timeout
+        left = admission.remaining()
+        return timeout if left is None else min(timeout, left)
+
+    async def call(self, fetch: Callable[[], Awaitable], timeout: Optional[float] = None):
+        for attempt in range(self.retries + 1):
+            attempt_timeout = self._attempt_timeout(timeout)
+            if attempt_timeout <= 0:
+                raise admission.DeadlineExceeded(f"no time left for a {self.name} call")
+            try:
+                return await self._attempt(fetch, attempt_timeout)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                metrics.upstream_failures.inc(1, self.name, type(e).__name__)
+                backoff = random.uniform(0.0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt))
+                left = admission.remaining()
+                if attempt == self.retries or (left is not None and backoff >= left):
+                    raise UpstreamError(self.name, attempt + 1, e) from e
+                metrics.upstream_retries.inc(1, self.name)
+                await asyncio.sleep(backoff)
+
+    async def _attempt(self, fetch: Callable[[], Awaitable], timeout: float):
+        started = time.perf_counter()
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is None or delay >= timeout:
+            result = await asyncio.wait_for(fetch(), timeout)
+        else:
+            async with asyncio.timeout(timeout):
+                result = await self._hedged(fetch, delay)
+        elapsed = time.perf_counter() - started
+        self.latencies.append(elapsed)
+        metrics.upstream_seconds.observe(elapsed, self.name)
+        return result
+
+    async def _hedged(self, fetch: Callable[[], Awaitable], delay: float):
+        primary = asyncio.ensure_future(fetch())
+        pending = {primary}
+        hedge = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                metrics.hedges.inc(1, self.name, "sent")
+                hedge = asyncio.ensure_future(fetch())
+                pending.add(hedge)
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.hedges.inc(1, self.name, "won")
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
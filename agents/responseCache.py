@@ -0,0 +1,189 @@
+import asyncio
+import json
+import math
+import os
+import time
+from typing import Callable, Optional, Type
+
+from pydantic import BaseModel
+
+import metrics
+from swapCache import TTLCache
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "120"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Maker amounts within this relative step of each other share an answer
+RESPONSE_CACHE_AMOUNT_STEP = float(os.getenv("RESPONSE_CACHE_AMOUNT_STEP", "0.1"))
+# Width of the price buckets of the market fingerprint, relative
+RESPONSE_CACHE_PRICE_STEP = float(os.getenv("RESPONSE_CACHE_PRICE_STEP", "0.005"))
+# Width of the RSI buckets of the market fingerprint, in RSI points
+RESPONSE_CACHE_RSI_STEP = float(os.getenv("RESPONSE_CACHE_RSI_STEP", "10"))
+# An answer is dropped once its pool's price moved more than this from when it was given
+RESPONSE_CACHE_MAX_MOVE = float(os.getenv("RESPONSE_CACHE_MAX_MOVE", "0.005"))
+# Empty keeps the cache in memory only
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "")
+# Seconds between writes of a changed cache to RESPONSE_CACHE_DIR
+RESPONSE_CACHE_FLUSH_INTERVAL = float(os.getenv("RESPONSE_CACHE_FLUSH_INTERVAL", "30"))
+
+
+def _bucket(value: float, step: float) -> int:
+    return math.floor(math.log(value) / math.log1p(step))
+
+
+def market_state(swap_data, features: Optional[dict] = None) -> Optional[tuple]:
+    """
+    (price, fingerprint) of the pool data a prompt is built from, or None when there is
+    no price. The fingerprint is the price bucket, plus the RSI bucket and EMA trend
+    when indicator features are given.
+    """
+    price = None
+    if features:
+        price = features.get("last_price")
+    elif isinstance(swap_data, list):
+        price = swap_data[-1]["price0"] if swap_data else None
+    elif isinstance(swap_data, dict) and swap_data.get("candles"):
+        # The finest resolution has the most bars and the latest close
+        bars = max(swap_data["candles"].values(), key=lambda bars: len(bars["close"]))
+        price = float(bars["close"][-1]) if len(bars["close"]) else None
+    if not price or price <= 0:
+        return None
+
+    fingerprint = (_bucket(price, RESPONSE_CACHE_PRICE_STEP),)
+    if features:
+        rsi = features.get("rsi_14")
+        fast, slow = features.get("ema_12"), features.get("ema_26")
+        fingerprint += (
+            None if rsi is None else int(rsi // RESPONSE_CACHE_RSI_STEP),
+            None if fast is None or slow is None else fast > slow,
+        )
+    return price, fingerprint
+
+
+class ResponseCache(TTLCache):
+    """
+    Model answers keyed on (pool, maker, taker, bucketed maker amount, max expiry, market
+    fingerprint), so a repeated question about a market that has barely moved is answered
+    without a model call.
+
+    Answers expire after `ttl` and the least recently used go first beyond `maxsize`; an
+    answer is also dropped once its pool's price moved more than `max_move` from the
+    price it was given at, on lookup or through `invalidate_moved`. With a `directory`
+    the entries are kept in "<directory>/<name>.json" and survive restarts, hence the
+    wall clock. Changes are written by `flush`, which the agents call every
+    RESPONSE_CACHE_FLUSH_INTERVAL and on shutdown, rather than on every answer.
+    """
+
+    def __init__(self, name: str, response_model: Type[BaseModel], ttl: float = RESPONSE_CACHE_TTL, maxsize: int = RESPONSE_CACHE_SIZE, max_move: float = RESPONSE_CACHE_MAX_MOVE, directory: str = RESPONSE_CACHE_DIR, clock: Callable[[], float] = time.time):
+        super().__init__(ttl, maxsize, clock, name)
+        self.response_model = response_model
+        self.max_move = max_move
+        self.directory = directory
+        self.counters["invalidated"] = 0
+        self._dirty = False
+        self._flush_lock = asyncio.Lock()
+        self._load()
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.json")
+
+    def _load(self):
+        if not self.directory:
+            return
+        try:
+            with open(self._path()) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = self.clock()
+        for key, expires_at, response, price in entries:
+            if expires_at > now:
+                self._entries[tuple(tuple(part) if isinstance(part, list) else part for part in key)] = (
+                    expires_at, (self.response_model.model_validate(response), price)
+                )
+
+    def _write(self, entries: list) -> bool:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{self._path()}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self._path())
+        except OSError:
+            return False
+        return True
+
+    async def flush(self):
+        """Writes the entries to the cache file if they changed since the last flush, in a worker thread."""
+        if not self.directory:
+            return
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # Snapshot on the event loop: handlers keep changing the entries while the thread writes
+            entries = [
+                [key, expires_at, response.model_dump(), price]
+                for key, (expires_at, (response, price)) in self._entries.items()
+            ]
+            self._dirty = False
+            if not await asyncio.to_thread(self._write, entries):
+                self._dirty = True
+
+    def key(self, poolAddress: str, tradeInput: BaseModel, state: Optional[tuple]) -> Optional[tuple]:
+        """The cache key of a trade input (makerToken, takerToken, makerMaxAmount, maxExpiry), or None when it cannot be cached."""
+        if state is None or tradeInput.makerMaxAmount <= 0:
+            return None
+        return (
+            poolAddress.lower(),
+            tradeInput.makerToken.upper(),
+            tradeInput.takerToken.upper(),
+            _bucket(tradeInput.makerMaxAmount, RESPONSE_CACHE_AMOUNT_STEP),
+            tradeInput.maxExpiry,
+            state[1],
+        )
+
+    def lookup(self, key: Optional[tuple], state: Optional[tuple], makerMaxAmount: float) -> Optional[BaseModel]:
+        """
+        A copy of the cached answer with maker_amount capped to makerMaxAmount, or None.
+        The answer is dropped when the price in `state` moved past max_move since.
+        """
+        if key is None:
+            return None
+        entry = self.get(key)
+        if entry is None:
+            self.counters["misses"] += 1
+            metrics.response_cache_results.inc(1, self.name, "miss")
+            return None
+        response, price = entry
+        if abs(state[0] / price - 1.0) > self.max_move:
+            self.invalidate(key)
+            self._dirty = True
+            self.counters["invalidated"] += 1
+            metrics.response_cache_results.inc(1, self.name, "invalidated")
+            return None
+        self.counters["hits"] += 1
+        metrics.response_cache_results.inc(1, self.name, "hit")
+        response = response.model_copy()
+        if response.maker_amount > makerMaxAmount:
+            response.maker_amount = makerMaxAmount
+        return response
+
+    def store(self, key: Optional[tuple], response: BaseModel, state: Optional[tuple]):
+        if key is None:
+            return
+        self.put(key, (response.model_copy(), state[0]))
+        self._dirty = True
+
+    def invalidate_moved(self, poolAddress: str, price: float) -> int:
+        """Drops the answers for a pool given at a price more than max_move away; returns how many."""
+        poolAddress = poolAddress.lower()
+        moved = [
+            key for key, (_, (_, given_at)) in self._entries.items()
+            if key[0] == poolAddress and abs(price / given_at - 1.0) > self.max_move
+        ]
+        for key in moved:
+            del self._entries[key]
+        if moved:
+            self.counters["invalidated"] += len(moved)
+            metrics.response_cache_results.inc(len(moved), self.name, "invalidated")
+            self._dirty = True
+        return len(moved)
@@ -1,40 +1,23 @@
-import requests
 from uagents import Agent, Context
 from pydantic import BaseModel, Field
 import os
-from openai import OpenAI
-import json
-from datetime import datetime, timedelta, timezone
+import time
+from typing import Optional
 
-ASI_ONE_BASE_URL = "https://api.asi1.ai/v1"
-ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY","")
-MAX_TOKENS = 64000  
-ASI_ONE_MODEL = "asi1-extended"
-THEGRAPH_JWT_TOKEN = os.getenv("THEGRAPH_JWT_TOKEN","")
+import numpy as np
 
-client = OpenAI(
-    api_key=ASI_ONE_API_KEY,
-    base_url= ASI_ONE_BASE_URL
-)
+import candles
+import swapCache
+import swapFetcher
+import tokenIndex
+from riskEngine import order_risk
 
+RISK_LOOKBACK_HOURS = float(os.getenv("RISK_LOOKBACK_HOURS", "168"))
+RISK_RESOLUTION = candles.parse_resolutions(os.getenv("RISK_RESOLUTION", "5m"))[0]
 
 
-class UserInput(BaseModel):
-    makerToken: str = Field(
-        description="The token that the user will put in to be swapped"
-    )
-    takerToken: str = Field(
-        description="The token that the user intends to receive against the maker token"
-    )
-    poolAddress: str = Field(
-        description="The uniswap v4 pool address of the two tokens"
-    )
-    makerMaxAmount: float = Field(
-        description="Maximum amount of maker tokens the user is willing to swap"
-    )
-    maxExpiry: float = Field(
-        description="Maximum amount of time in hours the user can keep the limit order live"
-    )
+agent = Agent()
+
 
 class AIResponse(BaseModel):
     maker: str = Field(
@@ -50,182 +33,132 @@ class AIResponse(BaseModel):
         description="The expiry time in hours the order should stay live"
     )
 
+class RiskRequest(BaseModel):
+    poolAddress: str = Field(
+        description="The pool address of the two tokens"
+    )
+    order: AIResponse = Field(
+        description="The proposed limit order"
+    )
+    network: str = Field(
+        default="matic",
+        description="The token-api network of the pool"
+    )
+    confidence: float = Field(
+        default=0.95,
+        description="Confidence level of VaR and CVaR, e.g. 0.95"
+    )
 
-SYSTEM_PROMPT = """
-You are a Signal Agent in our DeFi investment/trading platform.
-Your job: forecast a limit order DeFi swap using technical indicators used in trading.
-The DeFi pool swap data you will receive will be in the following format:
-
-{
-    "timestamp":
-    "datetime":,
-    "token0": {
-        "symbol": ,
-        "address": ,
-        "decimals": ,
-    },
-    "token1": {
-        "symbol": ,
-        "address": ,
-        "decimals": ,
-    },
-    "amount0": ,
-    "amount1": ,
-    "price0": ,
-    "price1": ,
-}
-
-As such, please note that 
-The token with the negative amount (amount0 for token0, amount1 for token1) is the taker in the particular swap
-
-
-IMPORTANT: Your response MUST be valid JSON ONLY and match this schema:
-
-{
-    "maker": "string (token symbol, e.g., USDT)",
-    "taker": "string (token symbol, e.g., wETH)",
-    "maker_amount": "float (e.g., 1.2)",
-    "expiry": "integer (hours, e.g., 45)"
-}
-
-Do not include extra text or explanations.
-"""
-
-USER_PROMPT_TEMPLATE = """
-User wants to swap {makerToken} for {takerToken}.
-- Maximum maker tokens available: {makerMaxAmount}
-- Maximum expiry in hours: {maxExpiry}
-
-Here is recent pool swap data:
-{swap_data}
-"""
-
-def reduce_swaps(raw_data: dict, interval_minutes: int = 5):
-    swaps = raw_data.get("data", [])
-    if not swaps:
-        return []
-
-    # Sort by timestamp ascending
-    swaps.sort(key=lambda x: x["timestamp"])
-    reduced = []
-    interval_map = {}  # interval_start -> (trade, distance)
-
-    for swap in swaps:
-        ts = swap["timestamp"]
-        dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-
-        # Round down to nearest interval mark
-        interval_start = dt.replace(
-            minute=(dt.minute // interval_minutes) * interval_minutes,
-            second=0,
-            microsecond=0
-        )
-
-        # Distance from interval start
-        distance = abs((dt - interval_start).total_seconds())
-
-        if interval_start not in interval_map or distance < interval_map[interval_start][1]:
-            interval_map[interval_start] = (swap, distance)
-
-    # Keep only the nearest trade per interval
-    for swap, _ in sorted(interval_map.values(), key=lambda x: x["timestamp"]):
-        cleaned = {
-            "timestamp": swap["timestamp"],
-            "datetime": swap.get("datetime") or datetime.fromtimestamp(swap["timestamp"], tz=timezone.utc).isoformat(),
-            "token0": {
-                "symbol": swap["token0"]["symbol"],
-                "address": swap["token0"]["address"],
-                "decimals": swap["token0"]["decimals"],
-            },
-            "token1": {
-                "symbol": swap["token1"]["symbol"],
-                "address": swap["token1"]["address"],
-                "decimals": swap["token1"]["decimals"],
-            },
-            "amount0": swap["amount0"]/10**swap["token0"]["decimals"],
-            "amount1": swap["amount1"]/10**swap["token1"]["decimals"],
-            "price0": swap["price0"],
-            "price1": swap["price1"],
-        }
-        reduced.append(cleaned)
-
-    return reduced
-
-def approx_token_count(text: str) -> int:
-    """Approximate token count from text length."""
-    return len(text) // 4
-
-def safe_prompt(prompt: str) -> str:
-    tokens = approx_token_count(prompt)
-    if tokens > MAX_TOKENS:
-        excess = tokens - MAX_TOKENS
-        chars_to_trim = excess * 4
-        prompt = prompt[chars_to_trim:]
-    return prompt
-
-def fetch_swaps(poolAddress: str, network: str = "matic", startTime: int = 1735689600, endTime: int = 9999999999, swaps_interval_minutes: int = 5, limit: int = 100):
-    url = f"https://token-api.thegraph.com/swaps/evm?network_id={network}&pool={poolAddress}&protocol=uniswap_v4&&startTime={startTime}&endTime={endTime}&orderBy=timestamp&orderDirection=desc&limit={limit}"
-    headers = {"Authorization": f"Bearer {THEGRAPH_JWT_TOKEN}"}
-    response = requests.get(url, headers=headers)
-
-    response.raise_for_status()
-
-    graph_response = response.json()
-
-    return reduce_swaps(graph_response, swaps_interval_minutes)
-
-
-def query_openai_chat(prompt: str):
-    """
-    Sends a chat request to OpenAI's API and retrieves the response.
-    Args:
-        prompt (str): The input prompt/question formatted for the model.
-    Returns:
-        str: The response from the OpenAI chat model.
-    """
-    prompt = safe_prompt(prompt)
-    chat_completion = client.chat.completions.create(
-        model=ASI_ONE_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_schema", "json_schema": AIResponse.model_json_schema()},
-    )
-    return chat_completion.choices[0].message.content
-
-@agent.on_message(model=UserInput, replies=AIResponse)
-async def generate_limit_order(ctx: Context, sender: str, tradeInput: UserInput):
-    ctx.logger.info(f"Received trade input from {sender}: {tradeInput}")
+class RiskResponse(BaseModel):
+    order: AIResponse = Field(
+        description="The order the metrics are for"
+    )
+    bars: int = Field(
+        default=0,
+        description="Number of price bars the metrics are computed over"
+    )
+    window_hours: Optional[float] = Field(
+        default=None,
+        description="Hours of pool history covered by the bars"
+    )
+    confidence: float = Field(
+        description="Confidence level of VaR and CVaR"
+    )
+    volatility_annualized: Optional[float] = Field(
+        default=None,
+        description="Realized volatility of the taker price in maker tokens, annualized"
+    )
+    volatility_horizon: Optional[float] = Field(
+        default=None,
+        description="Realized volatility over the order's expiry"
+    )
+    var_historical: Optional[float] = Field(
+        default=None,
+        description="Historical value at risk over the expiry, as a fraction of the order value"
+    )
+    cvar_historical: Optional[float] = Field(
+        default=None,
+        description="Historical conditional value at risk over the expiry, as a fraction of the order value"
+    )
+    var_parametric: Optional[float] = Field(
+        default=None,
+        description="Gaussian value at risk over the expiry, as a fraction of the order value"
+    )
+    cvar_parametric: Optional[float] = Field(
+        default=None,
+        description="Gaussian conditional value at risk over the expiry, as a fraction of the order value"
+    )
+    max_drawdown: Optional[float] = Field(
+        default=None,
+        description="Largest peak to trough fall of the taker price over the window"
+    )
+    var_amount: Optional[float] = Field(
+        default=None,
+        description="Historical value at risk in maker tokens"
+    )
+    cvar_amount: Optional[float] = Field(
+        default=None,
+        description="Historical conditional value at risk in maker tokens"
+    )
+    share_of_window_flow: Optional[float] = Field(
+        default=None,
+        description="Order size as a share of the maker token volume traded over the window"
+    )
+    share_of_horizon_flow: Optional[float] = Field(
+        default=None,
+        description="Order size as a share of the maker token volume expected over the expiry"
+    )
+    error: str = Field(
+        default="",
+        description="Why the metrics could not be computed; empty on success"
+    )
 
 
-    try:
-        swap_data = fetch_swaps(tradeInput.poolAddress)
-    except Exception as e:
-        ctx.logger.error(f"Swap fetch failed: {e}")
-        await ctx.send(sender, AIResponse(
-        maker=tradeInput.makerToken,
-        taker=tradeInput.takerToken,
-        maker_amount=0,
-        expiry=0
-        ))
-        return
+async def fetch_bars(poolAddress: str, network: str = "matic", timeout: float = None):
+    # Whole minutes keep the cache key stable for a minute of requests
+    startTime = int(time.time() // 60 * 60 - RISK_LOOKBACK_HOURS * 3600)
+    return await swapCache.load_candles(
+        poolAddress,
+        network=network,
+        startTime=startTime,
+        resolutions=(RISK_RESOLUTION,),
+        page_size=swapFetcher.THEGRAPH_PAGE_SIZE,
+        protocol="uniswap_v4",
+        timeout=timeout,
+    )
 
 
-    prompt = USER_PROMPT_TEMPLATE.format(
-        makerToken=tradeInput.makerToken,
-        takerToken=tradeInput.takerToken,
-        makerMaxAmount=tradeInput.makerMaxAmount,
-        maxExpiry=tradeInput.maxExpiry,
-        swap_data=json.dumps(swap_data, indent=2)
-    )
+def assess(request: RiskRequest, loaded: dict) -> RiskResponse:
+    """The risk metrics of the requested order over the loaded bars."""
+    bars = loaded["candles"][RISK_RESOLUTION]
+    if loaded["token0"] is None or len(bars["timestamp"]) < 3:
+        raise ValueError("not enough pool history")
+    taker_is_token0 = tokenIndex.is_token0(request.order.taker, loaded["token0"], loaded["token1"], request.network)
+    metrics = order_risk(bars, taker_is_token0, request.order.maker_amount, request.order.expiry, request.confidence)
+    # NaN and infinity do not survive JSON, send them as missing values
+    return RiskResponse(order=request.order, **{name: value if np.isfinite(value) else None for name, value in metrics.items()})
+
 
+def empty_response(request: RiskRequest, error: str) -> RiskResponse:
+    return RiskResponse(order=request.order, confidence=request.confidence, error=error)
 
-    json_response = query_openai_chat(prompt)
-    ctx.logger.info(f"JSON LLM response: {json_response}")
 
-    if json_response.expiry > tradeInput.maxExpiry:
-        json_response.expiry = int(tradeInput.maxExpiry)
+@agent.on_message(model=RiskRequest, replies=RiskResponse)
+async def assess_order(ctx: Context, sender: str, request: RiskRequest):
+    ctx.logger.info(f"Received risk request from {sender}: {request}")
+
+    try:
+        loaded = await fetch_bars(request.poolAddress, request.network)
+        started = time.perf_counter()
+        response = assess(request, loaded)
+        ctx.logger.info(f"Risk computed in {(time.perf_counter() - started) * 1e3:.3f} ms: {response}")
+    except Exception as e:
+        ctx.logger.error(f"Risk assessment failed: {e}")
+        response = empty_response(request, str(e))
+
+    await ctx.send(sender, response)
 
 
-    await ctx.send(sender, json_response)
\ No newline at end of file
+@agent.on_event("shutdown")
+async def close_connections(ctx: Context):
+    await swapFetcher.close_client()
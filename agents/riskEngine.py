@@ -0,0 +1,119 @@
+from statistics import NormalDist
+
+import numpy as np
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+def oriented_prices(close: np.ndarray, taker_is_token0: bool) -> np.ndarray:
+    """
+    Price of the taker token in maker tokens. Bars quote price0 (token1 per token0), so
+    an order receiving token1 for token0 sees the inverse.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    return close if taker_is_token0 else 1.0 / close
+
+
+def log_returns(prices: np.ndarray) -> np.ndarray:
+    prices = np.asarray(prices, dtype=np.float64)
+    return np.diff(np.log(prices)) if prices.size > 1 else np.empty(0)
+
+
+def realized_volatility(returns: np.ndarray, seconds: float) -> float:
+    """Volatility per square root second: sqrt(sum of squared returns / elapsed seconds)."""
+    if returns.size == 0 or seconds <= 0:
+        return float("nan")
+    return float(np.sqrt(np.dot(returns, returns) / seconds))
+
+
+def historical_var_cvar(returns: np.ndarray, confidence: float = 0.95) -> tuple:
+    """
+    Value at risk and conditional value at risk of the empirical return distribution,
+    as positive loss fractions. CVaR is the mean loss beyond VaR.
+    """
+    if returns.size == 0:
+        return float("nan"), float("nan")
+    losses = -np.expm1(returns)  # fractional loss of each return
+    var = float(np.quantile(losses, confidence))
+    tail = losses[losses >= var]
+    return var, float(tail.mean())
+
+
+def parametric_var_cvar(mean: float, std: float, confidence: float = 0.95) -> tuple:
+    """Gaussian VaR and CVaR of a log return with the given mean and std, as positive loss fractions."""
+    if not np.isfinite(std):
+        return float("nan"), float("nan")
+    normal = NormalDist()
+    z = normal.inv_cdf(1.0 - confidence)
+    var_return = mean + std * z
+    # E[r | r <= var_return] for a normal r
+    tail_return = mean - std * normal.pdf(z) / (1.0 - confidence)
+    return float(-np.expm1(var_return)), float(-np.expm1(tail_return))
+
+
+def max_drawdown(prices: np.ndarray) -> float:
+    """Largest peak to trough fall of the price series, as a fraction of the peak."""
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.size == 0:
+        return float("nan")
+    peaks = np.maximum.accumulate(prices)
+    return float(np.max(1.0 - prices / peaks))
+
+
+def flow_exposure(amount: float, volumes: np.ndarray, seconds: float, horizon_seconds: float) -> dict:
+    """
+    Trade size against the pool's flow of the maker token: as a share of all volume seen
+    and of the volume expected over the order's lifetime at the observed rate.
+    """
+    total = float(np.sum(volumes))
+    expected = total * horizon_seconds / seconds if seconds > 0 else 0.0
+    return {
+        "share_of_window_flow": amount / total if total else float("inf"),
+        "share_of_horizon_flow": amount / expected if expected else float("inf"),
+    }
+
+
+def order_risk(bars: dict, taker_is_token0: bool, maker_amount: float, expiry_hours: float, confidence: float = 0.95) -> dict:
+    """
+    Risk of holding a limit order for `expiry_hours`, from OHLCV bars of its pool
+    (`candles.build_candles` of one resolution).
+
+    Per bar log returns of the taker price in maker tokens give the realized
+    volatility (annualized and over the order horizon), historical and Gaussian
+    VaR/CVaR scaled to the horizon by the square root of time, and the max drawdown.
+    Loss figures are fractions of the order's value; `*_amount` ones are in maker tokens.
+    """
+    timestamps = np.asarray(bars["timestamp"], dtype=np.int64)
+    prices = oriented_prices(bars["close"], taker_is_token0)
+    returns = log_returns(prices)
+    seconds = float(timestamps[-1] - timestamps[0]) if timestamps.size > 1 else 0.0
+    horizon = expiry_hours * 3600.0
+
+    vol = realized_volatility(returns, seconds)
+    # Bars are irregular where nothing traded; the mean spacing sets the horizon scale
+    bar_seconds = seconds / returns.size if returns.size else float("nan")
+    scale = np.sqrt(horizon / bar_seconds) if returns.size else float("nan")
+
+    hist_var, hist_cvar = historical_var_cvar(returns, confidence)
+    # scale the bar loss to the horizon through its log return, keeping it below 100%
+    hist_var, hist_cvar = (float(-np.expm1(np.log1p(-x) * scale)) for x in (hist_var, hist_cvar))
+    # zero drift: a mean estimated from a few days of swaps is mostly noise
+    param_var, param_cvar = parametric_var_cvar(0.0, vol * np.sqrt(horizon), confidence)
+
+    maker_volumes = bars["volume1"] if taker_is_token0 else bars["volume0"]
+    report = {
+        "bars": int(timestamps.size),
+        "window_hours": seconds / 3600.0,
+        "confidence": confidence,
+        "volatility_annualized": float(vol * np.sqrt(SECONDS_PER_YEAR)),
+        "volatility_horizon": float(vol * np.sqrt(horizon)),
+        "var_historical": hist_var,
+        "cvar_historical": hist_cvar,
+        "var_parametric": param_var,
+        "cvar_parametric": param_cvar,
+        "max_drawdown": max_drawdown(prices),
+        "var_amount": hist_var * maker_amount,
+        "cvar_amount": hist_cvar * maker_amount,
+    }
+    report.update(flow_exposure(maker_amount, maker_volumes, seconds, horizon))
+    return report
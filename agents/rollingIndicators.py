@@ -0,0 +1,408 @@
+import math
+import os
+from collections import deque
+import numpy as np
+
+import indicators
+import swapFetcher
+
+# Intervals a pool's state keeps: the lookback at one record per minute, the finest
+# interval reduce_swaps produces. Older records are expired as new ones arrive.
+ROLLING_MAX_INTERVALS = int(os.getenv("ROLLING_MAX_INTERVALS", str(int(swapFetcher.SWAP_LOOKBACK_HOURS * 60) + 1)))
+
+
+class RollingEMA:
+    """EMA updated one value at a time, seeded with the first value like `indicators.ema`."""
+
+    def __init__(self, span: int = None, alpha: float = None):
+        self.alpha = 2.0 / (span + 1) if alpha is None else alpha
+        self.value = None
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class RollingRSI:
+    """Wilder RSI over consecutive prices, matching `indicators.rsi`."""
+
+    def __init__(self, period: int = 14):
+        self.gain = RollingEMA(alpha=1.0 / period)
+        self.loss = RollingEMA(alpha=1.0 / period)
+        self.last_price = None
+        self.value = None
+
+    def update(self, price: float):
+        if self.last_price is not None:
+            change = price - self.last_price
+            gain = self.gain.update(max(change, 0.0))
+            loss = self.loss.update(max(-change, 0.0))
+            if loss == 0.0:
+                self.value = 50.0 if gain == 0.0 else 100.0
+            else:
+                self.value = 100.0 - 100.0 / (1.0 + gain / loss)
+        self.last_price = price
+        return self.value
+
+
+class RollingVWAP:
+    """Volume weighted average price of the values added and not yet removed; volumes are taken in absolute value."""
+
+    def __init__(self):
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def update(self, price: float, volume: float):
+        volume = abs(volume)
+        self.price_volume += price * volume
+        self.volume += volume
+        return self.value
+
+    def remove(self, price: float, volume: float):
+        volume = abs(volume)
+        self.price_volume -= price * volume
+        self.volume -= volume
+
+    @property
+    def value(self):
+        return self.price_volume / self.volume if self.volume else None
+
+
+class RollingVariance:
+    """
+    Population variance over the last `window` values.
+    Uses the sliding Welford update, which stays accurate at price levels where
+    sum-of-squares cancels out.
+    """
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x: float):
+        self.values.append(x)
+        if len(self.values) > self.window:
+            y = self.values.popleft()
+            old_mean = self.mean
+            self.mean += (x - y) / self.window
+            self.m2 += (x - y) * (x - self.mean + y - old_mean)
+        else:
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) < self.window:
+            return None
+        return max(self.m2, 0.0) / self.window
+
+
+class RollingMinMax:
+    """Minimum and maximum of the last `window` values with monotonic queues."""
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self.count = 0
+        self._min = deque()  # (index, value), values increasing
+        self._max = deque()  # (index, value), values decreasing
+
+    def update(self, x: float):
+        index = self.count
+        self.count += 1
+        while self._min and self._min[-1][1] >= x:
+            self._min.pop()
+        while self._max and self._max[-1][1] <= x:
+            self._max.pop()
+        self._min.append((index, x))
+        self._max.append((index, x))
+        while self._min[0][0] <= index - self.window:
+            self._min.popleft()
+        while self._max[0][0] <= index - self.window:
+            self._max.popleft()
+        return self.min, self.max
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+
+class RollingFlow:
+    """Sums of one pool token's signed amounts, as `indicators.net_flow` reports them."""
+
+    def __init__(self):
+        self.bought = 0.0
+        self.sold = 0.0
+        self.trades_bought = 0
+        self.trades_sold = 0
+
+    def update(self, amount: float, sign: int = 1):
+        if amount < 0:
+            self.bought -= sign * amount
+            self.trades_bought += sign
+        elif amount > 0:
+            self.sold += sign * amount
+            self.trades_sold += sign
+
+    def remove(self, amount: float):
+        self.update(amount, -1)
+
+    @property
+    def value(self) -> dict:
+        return {"bought": self.bought, "sold": self.sold, "net": self.bought - self.sold, "trades_bought": self.trades_bought, "trades_sold": self.trades_sold}
+
+
+class RecordRing:
+    """The last `capacity` rows of `width` floats, in storage allocated once."""
+
+    def __init__(self, capacity: int, width: int):
+        self.rows = np.empty((capacity, width), dtype=np.float64)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def full(self) -> bool:
+        return self.size == len(self.rows)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """Row `index` from the oldest, negative from the newest; a view into the ring."""
+        if not -self.size <= index < self.size:
+            raise IndexError(index)
+        return self.rows[(self.start + index % self.size) % len(self.rows)]
+
+    def append(self, row):
+        if self.full:
+            raise OverflowError("ring is full")
+        self.rows[(self.start + self.size) % len(self.rows)] = row
+        self.size += 1
+
+    def popleft(self) -> tuple:
+        if not self.size:
+            raise IndexError("pop from an empty ring")
+        row = tuple(self.rows[self.start].tolist())
+        self.start = (self.start + 1) % len(self.rows)
+        self.size -= 1
+        return row
+
+
+class PoolIndicatorState:
+    """
+    Streaming indicators of one pool, updated per reduced swap record
+    (the schema `reduce_swaps` produces) in constant time.
+
+    The records since the start of the window are kept in a ring of `capacity` rows, so
+    `expire` can take the windowed sums (VWAP, flows, change, log return volatility) back
+    off when the window moves; a full ring expires its oldest record. The EMAs, RSI and ATR keep decaying the history before the window instead of
+    restarting from its first price; past a few hundred intervals that difference is
+    below the rounding of `summary`.
+    """
+
+    def __init__(self, fast: int = 12, slow: int = 26, period: int = 14, window: int = 20, capacity: int = ROLLING_MAX_INTERVALS):
+        self.fast, self.slow, self.period = fast, slow, period
+        self.window = window
+        self.ema_fast = RollingEMA(fast)
+        self.ema_slow = RollingEMA(slow)
+        self.rsi = RollingRSI(period)
+        self.atr = RollingEMA(alpha=1.0 / period)
+        self.vwap = RollingVWAP()
+        self.variance = RollingVariance(window)
+        self.range = RollingMinMax(window)
+        self.flow0 = RollingFlow()
+        self.flow1 = RollingFlow()
+        self.records = RecordRing(capacity, 5)  # timestamp, price, amount0, amount1, log return from the previous record or nan
+        # Nothing before this timestamp is left in the windowed values
+        self.start_time = None
+        self.log_return_sum = 0.0
+        self.log_return_squares = 0.0
+        self.log_returns = 0
+        self.tokens = (None, None)
+        self.last_timestamp = None
+        self.last_price = None
+        self.count = 0
+
+    def update(self, record: dict):
+        price = float(record["price0"])
+        if not price > 0 or math.isinf(price):
+            return  # left out like in `indicators.indicator_summary`
+        amount0, amount1 = float(record["amount0"]), float(record["amount1"])
+        if self.last_price is not None:
+            self.atr.update(abs(price - self.last_price))
+        self.ema_fast.update(price)
+        self.ema_slow.update(price)
+        self.rsi.update(price)
+        self.vwap.update(price, amount0)
+        self.variance.update(price)
+        self.range.update(price)
+        self.flow0.update(amount0)
+        self.flow1.update(amount1)
+
+        if self.records.full:
+            self._expire_first()
+            self.start_time = int(self.records[0][0])
+        log_return = math.nan
+        if self.records:
+            log_return = math.log(price / self.records[-1][1])
+            self.log_return_sum += log_return
+            self.log_return_squares += log_return * log_return
+            self.log_returns += 1
+        self.records.append((record["timestamp"], price, amount0, amount1, log_return))
+        self.tokens = (record["token0"]["symbol"], record["token1"]["symbol"])
+        self.last_timestamp = record["timestamp"]
+        self.last_price = price
+        self.count += 1
+
+    def expire(self, startTime: int):
+        """Takes the records before startTime out of the windowed values."""
+        while self.records and self.records[0][0] < startTime:
+            self._expire_first()
+        self.start_time = startTime if self.start_time is None else max(self.start_time, startTime)
+
+    def _expire_first(self):
+        _, price, amount0, amount1, _ = self.records.popleft()
+        self.vwap.remove(price, amount0)
+        self.flow0.remove(amount0)
+        self.flow1.remove(amount1)
+        if self.records and not math.isnan(self.records[0][4]):
+            # The new first record's return reached back out of the window
+            log_return = float(self.records[0][4])
+            self.records[0][4] = math.nan
+            self.log_return_sum -= log_return
+            self.log_return_squares -= log_return * log_return
+            self.log_returns -= 1
+
+    def summary(self) -> dict:
+        """The window in the shape of `indicators.indicator_summary`; {} for an empty window."""
+        if not self.records:
+            return {}
+        first = float(self.records[0][1])
+        # The bands need `window` prices inside the window, like the full recompute
+        variance = self.variance.value if len(self.records) >= self.window else None
+        std = None if variance is None else variance ** 0.5
+        mean = self.variance.mean if variance is not None else None
+        volatility = None
+        if self.log_returns:
+            mean_return = self.log_return_sum / self.log_returns
+            volatility = max(self.log_return_squares / self.log_returns - mean_return * mean_return, 0.0) ** 0.5
+        rounded = indicators._rounded
+        return {
+            "token0": self.tokens[0],
+            "token1": self.tokens[1],
+            "price_quote": "token1 per token0",
+            "intervals": len(self.records),
+            "from_timestamp": int(self.records[0][0]),
+            "to_timestamp": int(self.last_timestamp),
+            "last_price": rounded(self.last_price),
+            "change_pct": round((self.last_price / first - 1.0) * 100.0, 4),
+            f"sma_{self.window}": None if mean is None else rounded(mean),
+            f"ema_{self.fast}": rounded(self.ema_fast.value),
+            f"ema_{self.slow}": rounded(self.ema_slow.value),
+            f"rsi_{self.period}": rounded(self.rsi.value, 2),
+            "vwap": rounded(self.vwap.value) if self.vwap.volume > 0 else None,
+            "bollinger_upper": None if std is None else rounded(mean + 2.0 * std),
+            "bollinger_lower": None if std is None else rounded(mean - 2.0 * std),
+            f"atr_{self.period}": rounded(self.atr.value),
+            "volatility_per_interval": None if volatility is None else rounded(volatility),
+            "flow_token0": self.flow0.value,
+            "flow_token1": self.flow1.value,
+        }
+
+    def snapshot(self) -> dict:
+        variance = self.variance.value
+        return {
+            "last_timestamp": self.last_timestamp,
+            "last_price": self.last_price,
+            "ema_fast": self.ema_fast.value,
+            "ema_slow": self.ema_slow.value,
+            "rsi": self.rsi.value,
+            "vwap": self.vwap.value,
+            "std": None if variance is None else variance ** 0.5,
+            "min": self.range.min,
+            "max": self.range.max,
+        }
+
+
+pool_states = {}  # (network, pool) -> PoolIndicatorState
+
+
+def get_state(network: str, poolAddress: str) -> PoolIndicatorState:
+    key = (network, poolAddress.lower())
+    state = pool_states.get(key)
+    if state is None:
+        state = pool_states[key] = PoolIndicatorState()
+    return state
+
+
+def update_pool(network: str, poolAddress: str, records: list) -> PoolIndicatorState:
+    """Feeds the records newer than what the pool's state has already seen."""
+    state = get_state(network, poolAddress)
+    for record in records:
+        if state.last_timestamp is None or record["timestamp"] > state.last_timestamp:
+            state.update(record)
+    return state
+
+
+def window_summary(network: str, poolAddress: str, records: list) -> dict:
+    """
+    `indicators.indicator_summary` of the reduced records of a pool's window, kept up to
+    date incrementally: only records newer than the pool's state are fed, and the ones
+    before the window's first record are expired. A state that does not overlap the
+    window (older data, or a gap) or has already expired part of it (a window that
+    starts earlier than the last one) is rebuilt from the records.
+    """
+    if not records:
+        return {}
+    state = get_state(network, poolAddress)
+    start = records[0]["timestamp"]
+    if (
+        state.last_timestamp is None
+        or not start <= state.last_timestamp <= records[-1]["timestamp"]
+        or (state.start_time is not None and start < state.start_time)
+    ):
+        state = pool_states[(network, poolAddress.lower())] = PoolIndicatorState()
+    update_pool(network, poolAddress, records)
+    state.expire(start)
+    return state.summary()
+
+
+def recompute_differences(records: list, state: PoolIndicatorState = None) -> dict:
+    """
+    Streams the records through a fresh state and returns the absolute difference
+    of each streaming value from the full recompute in `indicators`.
+    """
+    if state is None:
+        state = PoolIndicatorState()
+        for record in records:
+            state.update(record)
+
+    series = indicators.series_from_records(records)
+    prices = series["price0"]
+    amounts = series["amount0"]
+    window = state.window
+    full = {
+        "ema_fast": indicators.ema(prices, alpha=state.ema_fast.alpha)[-1],
+        "ema_slow": indicators.ema(prices, alpha=state.ema_slow.alpha)[-1],
+        "rsi": indicators.rsi(prices, int(round(1.0 / state.rsi.gain.alpha)))[-1],
+        "vwap": indicators.vwap(prices, amounts),
+        "std": indicators.rolling_std(prices, window)[-1],
+        "min": prices[-window:].min(),
+        "max": prices[-window:].max(),
+    }
+    streamed = state.snapshot()
+    return {
+        name: abs(float(streamed[name]) - float(value))
+        for name, value in full.items()
+        if streamed[name] is not None and not np.isnan(value)
+    }
@@ -1,8 +1,6 @@
 from datetime import datetime
 from uuid import uuid4
-import os
 
-from openai import OpenAI
 from uagents import Context, Protocol, Agent
 from uagents_core.contrib.protocols.chat import (
     ChatAcknowledgement,
@@ -11,27 +9,36 @@ from uagents_core.contrib.protocols.chat import (
     TextContent,
     chat_protocol_spec,
 )
+from pydantic import BaseModel, Field
 
+import llmClient
+import modelRouter
+import promptBudget
 
-ASI_ONE_BASE_URL = "https://api.asi1.ai/v1"
-ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY","")
 # MAX_TOKENS = 64000  
 ASI_ONE_MODEL = "asi1-extended"
-# THEGRAPH_JWT_TOKEN = os.getenv("THEGRAPH_JWT_TOKEN","")
 
 
-client = OpenAI(
-    base_url=ASI_ONE_BASE_URL,
-
-    api_key=ASI_ONE_API_KEY,
-)
-
 agent = Agent()
 
 # We create a new protocol which is compatible with the chat protocol spec. This ensures
 # compatibility between agents
 protocol = Protocol(spec=chat_protocol_spec)
 
+class AIResponse(BaseModel):
+    maker: str = Field(
+        description="The token the user is providing in the swap (e.g., USDT)"
+    )
+    taker: str = Field(
+        description="The token the user wants to receive (e.g., wETH)"
+    )
+    maker_amount: float = Field(
+        description="The amount of maker token to be swapped"
+    )
+    expiry: int = Field(
+        description="The expiry time in hours the order should stay live"
+    )
+
 SYSTEM_PROMPT = """
 You are a Signal Agent in our DeFi investment/trading platform.
 Your job: forecast a limit order DeFi swap using technical indicators used in trading.
@@ -73,15 +80,18 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
     # query the model based on the user question
     response = 'I am afraid something went wrong and I am unable to answer your question at the moment'
     try:
-        r = client.chat.completions.create(
-            model=ASI_ONE_MODEL,
+        # The smaller model answers unless its output fails AIResponse validation
+        ai_response = await modelRouter.complete_json(
+            "order",
+            AIResponse,
+            ASI_ONE_MODEL,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": text},
             ],
         )
 
-        response = str(r.choices[0].message.content)
+        response = ai_response.model_dump_json()
     except:
         ctx.logger.exception('Error querying model')
 
@@ -106,5 +116,15 @@ async def handle_ack(ctx: Context, sender: str, msg: ChatAcknowledgement):
     pass
 
 
+@agent.on_event("startup")
+async def load_tokenizer(ctx: Context):
+    await promptBudget.load_encoding()
+
+
+@agent.on_event("shutdown")
+async def close_connections(ctx: Context):
+    await llmClient.close_client()
+
+
 # attach the protocol to the agent
 agent.include(protocol, publish_manifest=True)
\ No newline at end of file
@@ -1,23 +1,24 @@
-import requests
 from uagents import Agent, Context
 from pydantic import BaseModel, Field
+from typing import List
+import asyncio
 import os
-from openai import OpenAI
-import json
-from datetime import datetime, timedelta, timezone
+import admission
+import metrics
+import modelRouter
+import resilience
+import responseCache
+from promptBudget import count_tokens
+from signalPipeline import AIResponse, SignalPipeline
 
-ASI_ONE_BASE_URL = "https://api.asi1.ai/v1"
-ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY","")
 MAX_TOKENS = 64000  
+# Each agent on a host needs its own port; 0 turns /metrics off
+METRICS_PORT = int(os.getenv("SIGNAL_METRICS_PORT", "9464"))
 ASI_ONE_MODEL = "asi1-extended"
-THEGRAPH_JWT_TOKEN = os.getenv("THEGRAPH_JWT_TOKEN","")
-
-client = OpenAI(
-    api_key=ASI_ONE_API_KEY,
-    base_url= ASI_ONE_BASE_URL
-)
+BATCH_MAX_PAIRS_PER_CALL = int(os.getenv("BATCH_MAX_PAIRS_PER_CALL", "8"))
 
 agent = Agent()
+admission_queue = admission.AdmissionQueue()
 
 
 class UserInput(BaseModel):
@@ -37,25 +38,29 @@ class UserInput(BaseModel):
         description="Maximum amount of time in hours the user can keep the limit order live"
     )
 
-class AIResponse(BaseModel):
-    maker: str = Field(
-        description="The token the user is providing in the swap (e.g., USDT)"
+class BatchUserInput(BaseModel):
+    intents: List[UserInput] = Field(
+        description="The trade intents to get limit orders for, one per maker/taker/pool"
     )
-    taker: str = Field(
-        description="The token the user wants to receive (e.g., wETH)"
+
+class BatchAIResponse(BaseModel):
+    responses: List[AIResponse] = Field(
+        description="One limit order per trade intent, in the order the intents were given"
     )
-    maker_amount: float = Field(
-        description="The amount of maker token to be swapped"
+
+class OrderError(BaseModel):
+    error: str = Field(
+        description="Why the agent turned the request away without an order"
     )
-    expiry: int = Field(
-        description="The expiry time in hours the order should stay live"
+    intents: List[UserInput] = Field(
+        description="The trade intents of the request that was turned away"
     )
 
 
 SYSTEM_PROMPT = """
 You are a Signal Agent in our DeFi investment/trading platform.
 Your job: forecast a limit order DeFi swap using technical indicators used in trading.
-If the pool swap data does not match the maker and taker tokens, Give an empty JSON object as output
+If the pool swap data does not match the maker and taker tokens, Give an order of the user's maker and taker tokens with maker_amount 0 and expiry 0 as output
 The DeFi pool swap data you will receive will be in the following format:
 
 {
@@ -102,107 +107,192 @@ Here is recent pool swap data:
 {swap_data}
 """
 
-def reduce_swaps(raw_data: dict, interval_minutes: int = 5):
-    swaps = raw_data.get("data", [])
-    if not swaps:
-        return []
-
-    # Sort by timestamp ascending
-    swaps.sort(key=lambda x: x["timestamp"])
-    reduced = []
-    interval_map = {}  # interval_start -> (trade, distance)
-
-    for swap in swaps:
-        ts = swap["timestamp"]
-        dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-
-        # Round down to nearest interval mark
-        interval_start = dt.replace(
-            minute=(dt.minute // interval_minutes) * interval_minutes,
-            second=0,
-            microsecond=0
-        )
+SYSTEM_PROMPT_COMPACT = """
+You are a Signal Agent in our DeFi investment/trading platform.
+Your job: forecast a limit order DeFi swap using technical indicators used in trading.
+If the pool swap data does not match the maker and taker tokens, Give an order of the user's maker and taker tokens with maker_amount 0 and expiry 0 as output
+The DeFi pool swap data you will receive will be in the following compact format:
+
+token0: <symbol> <address> decimals=<decimals>
+token1: <symbol> <address> decimals=<decimals>
+base_timestamp: <unix seconds> (<ISO datetime>)
+columns: dt,amount0,amount1,price0
+<dt>,<amount0>,<amount1>,<price0>
+...
+
+dt is the number of seconds since the previous row (the first row counts from base_timestamp).
+amount0 and amount1 are in whole tokens, price0 is token0 priced in token1 and price1 = 1 / price0.
+As such, please note that 
+The token with the negative amount (amount0 for token0, amount1 for token1) is the taker in the particular swap
+
+
+IMPORTANT: Your response MUST be valid JSON ONLY and match this schema:
+
+{
+    "maker": "string (token symbol, e.g., USDT)",
+    "taker": "string (token symbol, e.g., wETH)",
+    "maker_amount": "float (e.g., 1.2)",
+    "expiry": "integer (hours, e.g., 45)"
+}
+
+Do not include extra text or explanations. 
+"""
+
+SYSTEM_PROMPT_INDICATORS = """
+You are a Signal Agent in our DeFi investment/trading platform.
+Your job: forecast a limit order DeFi swap from technical indicators computed over recent pool swaps.
+If the pool tokens do not match the maker and taker tokens, Give an order of the user's maker and taker tokens with maker_amount 0 and expiry 0 as output
+The indicators you will receive are computed over one swap per interval and look like:
+
+{
+    "token0": , "token1": ,
+    "price_quote": "token1 per token0",
+    "intervals": , "from_timestamp": , "to_timestamp": ,
+    "last_price": , "change_pct": ,
+    "sma_20": , "ema_12": , "ema_26": , "rsi_14": , "vwap": ,
+    "bollinger_upper": , "bollinger_lower": , "atr_14": , "volatility_per_interval": ,
+    "flow_token0": {"bought": , "sold": , "net": , "trades_bought": , "trades_sold": },
+    "flow_token1": {"bought": , "sold": , "net": , "trades_bought": , "trades_sold": }
+}
+
+A positive net flow means traders took more of that token out of the pool than they put in.
+
+
+IMPORTANT: Your response MUST be valid JSON ONLY and match this schema:
+
+{
+    "maker": "string (token symbol, e.g., USDT)",
+    "taker": "string (token symbol, e.g., wETH)",
+    "maker_amount": "float (e.g., 1.2)",
+    "expiry": "integer (hours, e.g., 45)"
+}
+
+Do not include extra text or explanations. 
+"""
+
+INDICATOR_PROMPT_TEMPLATE = """
+User wants to swap {makerToken} for {takerToken}.
+- Maximum maker tokens available: {makerMaxAmount}
+- Maximum expiry in hours: {maxExpiry}
+
+Here are technical indicators of recent pool swap data:
+{indicators}
+"""
+
+SYSTEM_PROMPT_CANDLES = """
+You are a Signal Agent in our DeFi investment/trading platform.
+Your job: forecast a limit order DeFi swap using technical indicators used in trading.
+If the pool tokens do not match the maker and taker tokens, Give an order of the user's maker and taker tokens with maker_amount 0 and expiry 0 as output
+The pool data you will receive is OHLCV candles built from every swap in the pool:
 
-        # Distance from interval start
-        distance = abs((dt - interval_start).total_seconds())
-
-        if interval_start not in interval_map or distance < interval_map[interval_start][1]:
-            interval_map[interval_start] = (swap, distance)
-
-    # Keep only the nearest trade per interval
-    for swap, _ in sorted(interval_map.values(), key=lambda x: x["timestamp"]):
-        cleaned = {
-            "timestamp": swap["timestamp"],
-            "datetime": swap.get("datetime") or datetime.fromtimestamp(swap["timestamp"], tz=timezone.utc).isoformat(),
-            "token0": {
-                "symbol": swap["token0"]["symbol"],
-                "address": swap["token0"]["address"],
-                "decimals": swap["token0"]["decimals"],
-            },
-            "token1": {
-                "symbol": swap["token1"]["symbol"],
-                "address": swap["token1"]["address"],
-                "decimals": swap["token1"]["decimals"],
-            },
-            "amount0": swap["amount0"]/10**swap["token0"]["decimals"],
-            "amount1": swap["amount1"]/10**swap["token1"]["decimals"],
-            "price0": swap["price0"],
-            "price1": swap["price1"],
+{
+    "token0": , "token1": ,
+    "price_quote": "token1 per token0",
+    "candles": {
+        "<resolution, e.g. 1h>": {
+            "columns": ["timestamp", "open", "high", "low", "close", "volume0", "volume1", "trades"],
+            "rows": [[...], ...]
         }
-        reduced.append(cleaned)
+    }
+}
+
+volume0 and volume1 are the traded amounts of token0 and token1 in whole tokens.
+
+
+IMPORTANT: Your response MUST be valid JSON ONLY and match this schema:
+
+{
+    "maker": "string (token symbol, e.g., USDT)",
+    "taker": "string (token symbol, e.g., wETH)",
+    "maker_amount": "float (e.g., 1.2)",
+    "expiry": "integer (hours, e.g., 45)"
+}
+
+Do not include extra text or explanations. 
+"""
 
-    return reduced
+CANDLE_PROMPT_TEMPLATE = """
+User wants to swap {makerToken} for {takerToken}.
+- Maximum maker tokens available: {makerMaxAmount}
+- Maximum expiry in hours: {maxExpiry}
 
-def approx_token_count(text: str) -> int:
-    """Approximate token count from text length."""
-    return len(text) // 4
+Here are OHLCV candles of recent pool swap data:
+{candles}
+"""
 
-def safe_prompt(prompt: str) -> str:
-    tokens = approx_token_count(prompt)
-    if tokens > MAX_TOKENS:
-        excess = tokens - MAX_TOKENS
-        chars_to_trim = excess * 4
-        prompt = prompt[chars_to_trim:]
-    return prompt
+BATCH_SYSTEM_PROMPT_SUFFIX = """
+You will receive several numbered trade requests, each with its own pool data.
+Answer every request independently.
 
-def fetch_swaps(poolAddress: str, network: str = "matic", startTime: int = 1735689600, endTime: int = 9999999999, swaps_interval_minutes: int = 5, limit: int = 100):
-    url = f"https://token-api.thegraph.com/swaps/evm?network_id={network}&pool={poolAddress}&protocol=uniswap_v4&&startTime={startTime}&endTime={endTime}&orderBy=timestamp&orderDirection=desc&limit={limit}"
-    headers = {"Authorization": f"Bearer {THEGRAPH_JWT_TOKEN}"}
-    response = requests.get(url, headers=headers)
+IMPORTANT: Your response MUST be valid JSON ONLY and match this schema instead:
 
-    response.raise_for_status()
+{
+    "responses": [
+        {"maker": "string", "taker": "string", "maker_amount": "float", "expiry": "integer"}
+    ]
+}
 
-    graph_response = response.json()
+with exactly one entry per request, in the same order as the requests.
+Do not include extra text or explanations.
+"""
 
-    return reduce_swaps(graph_response, swaps_interval_minutes)
+pipeline = SignalPipeline(
+    "signal",
+    MAX_TOKENS,
+    system_prompts={
+        "swaps": SYSTEM_PROMPT,
+        "compact": SYSTEM_PROMPT_COMPACT,
+        "indicators": SYSTEM_PROMPT_INDICATORS,
+        "candles": SYSTEM_PROMPT_CANDLES,
+    },
+    templates={
+        "swaps": USER_PROMPT_TEMPLATE,
+        "indicators": INDICATOR_PROMPT_TEMPLATE,
+        "candles": CANDLE_PROMPT_TEMPLATE,
+    },
+    metrics_port=METRICS_PORT,
+    protocol="uniswap_v4",
+)
+pipeline.add_handlers(agent)
 
 
-def query_openai_chat(prompt: str):
+async def query_openai_chat(prompt: str, system_prompt: str = SYSTEM_PROMPT):
     """
     Sends a chat request to OpenAI's API and retrieves the response.
     Args:
         prompt (str): The input prompt/question formatted for the model.
+        system_prompt (str): The system prompt matching how the prompt was built.
     Returns:
-        str: The response from the OpenAI chat model.
+        AIResponse: The response from the OpenAI chat model, validated.
     """
-    prompt = safe_prompt(prompt)
-    chat_completion = client.chat.completions.create(
-        model=ASI_ONE_MODEL,
+    prompt = pipeline.safe_prompt(prompt)
+    return await modelRouter.complete_json(
+        "order",
+        AIResponse,
+        ASI_ONE_MODEL,
         messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt},
         ],
         response_format={"type": "json_schema", "json_schema": AIResponse.model_json_schema()},
     )
-    return chat_completion.choices[0].message.content
 
-@agent.on_message(model=UserInput, replies=AIResponse)
+async def reject_order(ctx: Context, sender: str, tradeInput: UserInput, reason: str):
+    await ctx.send(sender, OrderError(error=reason, intents=[tradeInput]))
+
+@agent.on_message(model=UserInput, replies={AIResponse, OrderError})
+@metrics.timed("generate_limit_order")
+@admission.admitted(admission_queue, "generate_limit_order", admission.PRIORITY_ORDER, admission.REQUEST_DEADLINE, reject_order)
 async def generate_limit_order(ctx: Context, sender: str, tradeInput: UserInput):
     ctx.logger.info(f"Received trade input from {sender}: {tradeInput}")
+    timings = {}
 
 
     try:
-        swap_data = fetch_swaps(tradeInput.poolAddress)
+        with metrics.span("generate_limit_order", "fetch", timings):
+            swap_data, features = await pipeline.load_pool_data(tradeInput.poolAddress)
+    except admission.Rejected:
+        raise
     except Exception as e:
         ctx.logger.error(f"Swap fetch failed: {e}")
         await ctx.send(sender, AIResponse(
@@ -214,20 +304,157 @@ async def generate_limit_order(ctx: Context, sender: str, tradeInput: UserInput)
         return
 
 
-    prompt = USER_PROMPT_TEMPLATE.format(
-        makerToken=tradeInput.makerToken,
-        takerToken=tradeInput.takerToken,
-        makerMaxAmount=tradeInput.makerMaxAmount,
-        maxExpiry=tradeInput.maxExpiry,
-        swap_data=json.dumps(swap_data, indent=2)
-    )
+    if isinstance(swap_data, list):
+        metrics.swaps_kept.inc(len(swap_data), "generate_limit_order")
+
+    with metrics.span("generate_limit_order", "cache", timings):
+        state = responseCache.market_state(swap_data, features)
+        cache_key = pipeline.response_cache.key(tradeInput.poolAddress, tradeInput, state)
+        cached = pipeline.response_cache.lookup(cache_key, state, tradeInput.makerMaxAmount)
+    if cached is not None:
+        ctx.logger.info(f"Cached LLM response: {cached}, stage timings: {metrics.format_timings(timings)}")
+        await ctx.send(sender, cached)
+        return
 
+    with metrics.span("generate_limit_order", "prompt", timings):
+        system_prompt, prompt = pipeline.build_prompt(tradeInput, swap_data, features)
 
-    json_response = query_openai_chat(prompt)
+
+    try:
+        with metrics.span("generate_limit_order", "llm", timings):
+            json_response = await query_openai_chat(prompt, system_prompt)
+    except (resilience.UpstreamError, ValueError) as e:
+        ctx.logger.error(f"LLM call failed: {e}")
+        await reject_order(ctx, sender, tradeInput, f"no answer from the model: {e}")
+        return
     ctx.logger.info(f"JSON LLM response: {json_response}")
 
     if json_response.expiry > tradeInput.maxExpiry:
         json_response.expiry = int(tradeInput.maxExpiry)
+    with metrics.span("generate_limit_order", "cap", timings):
+        json_response = await pipeline.cap_to_liquidity(ctx, tradeInput.poolAddress, json_response)
+    pipeline.response_cache.store(cache_key, json_response, state)
+    ctx.logger.info(f"Stage timings: {metrics.format_timings(timings)}")
 
+    await ctx.send(sender, json_response)
+
+def pack_prompts(prompts: list) -> list:
+    """
+    Groups (index, prompt) pairs into as few LLM calls as the token budget and
+    BATCH_MAX_PAIRS_PER_CALL allow, keeping the original order.
+    """
+    packs, pack, pack_tokens = [], [], 0
+    for index, prompt in prompts:
+        # A few tokens on top for the "### Request n" line the prompt is packed under
+        tokens = count_tokens(prompt) + 8
+        if pack and (pack_tokens + tokens > MAX_TOKENS or len(pack) >= BATCH_MAX_PAIRS_PER_CALL):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append((index, prompt))
+        pack_tokens += tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+async def query_openai_batch(pack: list, system_prompt: str) -> list:
+    """Asks for the limit orders of several prompts in one call; falls back to one call each if the answer does not line up."""
+    if len(pack) == 1:
+        return [await query_openai_chat(pack[0][1], system_prompt)]
+
+    prompt = "\n".join(f"### Request {number}\n{prompt}" for number, (_, prompt) in enumerate(pack, 1))
+    try:
+        # no retry here, a bad batch answer falls back to one call per request below
+        batch = await modelRouter.complete_json(
+            "batch",
+            BatchAIResponse,
+            ASI_ONE_MODEL,
+            retries=0,
+            messages=[
+                {"role": "system", "content": system_prompt + BATCH_SYSTEM_PROMPT_SUFFIX},
+                {"role": "user", "content": pipeline.safe_prompt(prompt)},
+            ],
+            response_format={"type": "json_schema", "json_schema": BatchAIResponse.model_json_schema()},
+        )
+        responses = batch.responses
+    except ValueError:
+        responses = []
+    if len(responses) != len(pack):
+        return list(await asyncio.gather(*[query_openai_chat(prompt, system_prompt) for _, prompt in pack]))
+    return responses
+
+
+async def reject_batch(ctx: Context, sender: str, batch: BatchUserInput, reason: str):
+    await ctx.send(sender, OrderError(error=reason, intents=batch.intents))
+
+
+@agent.on_message(model=BatchUserInput, replies={BatchAIResponse, OrderError})
+@metrics.timed("generate_limit_orders")
+@admission.admitted(admission_queue, "generate_limit_orders", admission.PRIORITY_BATCH, admission.BATCH_REQUEST_DEADLINE, reject_batch)
+async def generate_limit_orders(ctx: Context, sender: str, batch: BatchUserInput):
+    ctx.logger.info(f"Received {len(batch.intents)} trade inputs from {sender}")
+    timings = {}
+
+    # Every distinct pool is fetched once, all of them concurrently
+    pools = list(dict.fromkeys(tradeInput.poolAddress.lower() for tradeInput in batch.intents))
+    with metrics.span("generate_limit_orders", "fetch", timings):
+        fetched = await asyncio.gather(*[pipeline.load_pool_data(pool) for pool in pools], return_exceptions=True)
+    pool_data = dict(zip(pools, fetched))
+
+    responses = [
+        AIResponse(maker=tradeInput.makerToken, taker=tradeInput.takerToken, maker_amount=0, expiry=0)
+        for tradeInput in batch.intents
+    ]
+    prompts = []
+    cache_keys = {}  # index -> (key, market state) of the answers to cache
+    cache_hits = 0
+    system_prompt = None
+    with metrics.span("generate_limit_orders", "prompt", timings):
+        for index, tradeInput in enumerate(batch.intents):
+            loaded = pool_data[tradeInput.poolAddress.lower()]
+            if isinstance(loaded, Exception):
+                ctx.logger.error(f"Swap fetch failed for {tradeInput.poolAddress}: {loaded}")
+                continue
+            swap_data, features = loaded
+            if isinstance(swap_data, list):
+                metrics.swaps_kept.inc(len(swap_data), "generate_limit_orders")
+            state = responseCache.market_state(swap_data, features)
+            cache_key = pipeline.response_cache.key(tradeInput.poolAddress, tradeInput, state)
+            cached = pipeline.response_cache.lookup(cache_key, state, tradeInput.makerMaxAmount)
+            if cached is not None:
+                responses[index] = cached
+                cache_hits += 1
+                continue
+            cache_keys[index] = (cache_key, state)
+            system_prompt, prompt = pipeline.build_prompt(tradeInput, swap_data, features)
+            prompts.append((index, prompt))
+        packs = pack_prompts(prompts)
+
+    ctx.logger.info(f"{len(prompts)} prompts packed into {len(packs)} LLM calls for {len(pools)} pools, {cache_hits} answered from cache")
+    with metrics.span("generate_limit_orders", "llm", timings):
+        answers = await asyncio.gather(*[query_openai_batch(pack, system_prompt) for pack in packs], return_exceptions=True)
+
+    answered = []
+    for pack, answer in zip(packs, answers):
+        if isinstance(answer, Exception):
+            ctx.logger.error(f"LLM call failed: {answer}")
+            continue
+        for (index, _), ai_response in zip(pack, answer):
+            maxExpiry = batch.intents[index].maxExpiry
+            if ai_response.expiry > maxExpiry:
+                ai_response.expiry = int(maxExpiry)
+            responses[index] = ai_response
+            answered.append(index)
+
+    # Orders the model filled in are capped in place, every pool concurrently
+    with metrics.span("generate_limit_orders", "cap", timings):
+        await asyncio.gather(*[
+            pipeline.cap_to_liquidity(ctx, tradeInput.poolAddress, response)
+            for tradeInput, response in zip(batch.intents, responses)
+            if response.maker_amount > 0
+        ])
+    for index in answered:
+        pipeline.response_cache.store(cache_keys[index][0], responses[index], cache_keys[index][1])
+    ctx.logger.info(f"Stage timings: {metrics.format_timings(timings)}")
+    await ctx.send(sender, BatchAIResponse(responses=responses))
 
-    await ctx.send(sender, json_response)
\ No newline at end of file
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+import candles
+import llmClient
+import metrics
+import priceImpact
+import promptBudget
+import resilience
+import responseCache
+import rollingIndicators
+import swapCache
+import swapFetcher
+import watchlist
+from indicators import indicator_summary
+from promptCodec import fit_compact
+from promptBudget import PromptBudget, PromptTooLarge, count_tokens, split_template
+
+# "indicators" sends computed indicators to the model, "candles" OHLCV bars,
+# "compact" the reduced swap records as a delta encoded table, "swaps" the records as JSON
+SIGNAL_PROMPT_MODE = os.getenv("SIGNAL_PROMPT_MODE", "indicators")
+CANDLE_RESOLUTIONS = candles.parse_resolutions(os.getenv("CANDLE_RESOLUTIONS", "1h"))
+
+logger = logging.getLogger(__name__)
+
+
+class AIResponse(BaseModel):
+    maker: str = Field(
+        description="The token the user is providing in the swap (e.g., USDT)"
+    )
+    taker: str = Field(
+        description="The token the user wants to receive (e.g., wETH)"
+    )
+    maker_amount: float = Field(
+        description="The amount of maker token to be swapped"
+    )
+    expiry: int = Field(
+        description="The expiry time in hours the order should stay live"
+    )
+
+
+class SignalPipeline:
+    """
+    The part of a signal agent between a parsed trade intent and the model call, and
+    after it: loading pool data (warm watchlist first), building the prompt for
+    SIGNAL_PROMPT_MODE within the token budget, answering from the response cache and
+    capping the order to the pool's liquidity.
+
+    Each agent brings its own prompts: `system_prompts` maps every mode to its system
+    prompt, `templates` maps "swaps" (also used by "compact"), "indicators" and "candles"
+    to the user prompt, with {swap_data}, {indicators} and {candles} for the pool data.
+    `metrics_port` is where the agent serves /metrics, 0 for nowhere.
+    """
+
+    def __init__(self, name: str, max_tokens: int, system_prompts: dict, templates: dict, metrics_port: int, network: str = "matic", protocol: Optional[str] = None, mode: str = SIGNAL_PROMPT_MODE, resolutions: tuple = CANDLE_RESOLUTIONS):
+        self.max_tokens = max_tokens
+        self.system_prompts = system_prompts
+        self.templates = templates
+        self.metrics_port = metrics_port
+        self.network = network
+        self.protocol = protocol
+        self.mode = mode
+        self.resolutions = resolutions
+        self.prompt_budget = PromptBudget(max_tokens)
+        self.watchlist = watchlist.Watchlist(
+            watchlist.parse_watchlist(watchlist.WATCHLIST),
+            resolutions=resolutions if mode == "candles" else None,
+            protocol=protocol,
+        )
+        self.response_cache = responseCache.ResponseCache(f"{name}-{mode}", AIResponse)
+
+    def safe_prompt(self, prompt: str) -> str:
+        """Rejects a prompt over max_tokens; swap records are trimmed to the budget in build_prompt."""
+        tokens = count_tokens(prompt)
+        if tokens > self.max_tokens:
+            raise PromptTooLarge(f"prompt needs {tokens} tokens, budget is {self.max_tokens}")
+        return prompt
+
+    async def fetch_swaps(self, poolAddress: str, startTime: int = None, endTime: int = 9999999999, swaps_interval_minutes: int = 5, limit: int = swapFetcher.THEGRAPH_PAGE_SIZE, timeout: float = None):
+        swaps = await swapCache.load_swaps(
+            poolAddress,
+            network=self.network,
+            startTime=startTime,
+            endTime=endTime,
+            interval_minutes=swaps_interval_minutes,
+            page_size=limit,
+            protocol=self.protocol,
+            timeout=timeout,
+        )
+        logger.info(f"Loaded {len(swaps)} reduced swaps for {poolAddress}, cache: {swapCache.swap_cache.stats()}")
+        return swaps
+
+    async def fetch_candles(self, poolAddress: str, startTime: int = None, endTime: int = 9999999999, timeout: float = None):
+        loaded = await swapCache.load_candles(
+            poolAddress,
+            network=self.network,
+            startTime=startTime,
+            endTime=endTime,
+            resolutions=self.resolutions,
+            protocol=self.protocol,
+            timeout=timeout,
+        )
+        bar_counts = {resolution: len(bars["timestamp"]) for resolution, bars in loaded["candles"].items()}
+        logger.info(f"Loaded candles for {poolAddress}: {bar_counts}")
+        return loaded
+
+    async def fetch_pool_data(self, poolAddress: str):
+        """Loads whatever the current mode puts into the prompt."""
+        if self.mode == "candles":
+            return await self.fetch_candles(poolAddress)
+        return await self.fetch_swaps(poolAddress)
+
+    async def load_pool_data(self, poolAddress: str):
+        """
+        (pool data, features): warm watchlist data when it is fresh, else `fetch_pool_data`.
+        In "indicators" mode features are computed here, once for the response cache key and the prompt,
+        from the pool's rolling indicator state.
+        """
+        warm = self.watchlist.fresh(self.network, poolAddress)
+        if warm is not None:
+            return warm.data, warm.features
+        swap_data = await self.fetch_pool_data(poolAddress)
+        return swap_data, rollingIndicators.window_summary(self.network, poolAddress, swap_data) if self.mode == "indicators" else None
+
+    def build_prompt(self, tradeInput: BaseModel, swap_data, features: dict = None):
+        """
+        Builds the (system prompt, user prompt) pair for a trade input.
+        In "indicators" mode the model gets a few computed numbers instead of every swap record,
+        in "candles" mode swap_data is the output of `fetch_candles`. `features` are the
+        indicators already computed for swap_data, e.g. by the watchlist.
+        """
+        fields = dict(
+            makerToken=tradeInput.makerToken,
+            takerToken=tradeInput.takerToken,
+            makerMaxAmount=tradeInput.makerMaxAmount,
+            maxExpiry=tradeInput.maxExpiry,
+        )
+        system_prompt = self.system_prompts[self.mode]
+        if self.mode == "candles":
+            return system_prompt, self.templates["candles"].format(
+                candles=json.dumps(candles.serialize(swap_data), separators=(",", ":")),
+                **fields,
+            )
+
+        if self.mode in ("swaps", "compact"):
+            # Only whole oldest records are dropped to fit max_tokens, the instructions stay intact
+            head, tail = split_template(self.templates["swaps"], "swap_data")
+            if self.mode == "compact":
+                return system_prompt, fit_compact(self.prompt_budget, head.format(**fields), swap_data, tail.format(**fields))
+            return system_prompt, self.prompt_budget.fit(head.format(**fields), swap_data, tail.format(**fields))
+
+        return system_prompt, self.templates["indicators"].format(
+            indicators=json.dumps(indicator_summary(swap_data) if features is None else features, indent=2),
+            **fields,
+        )
+
+    async def cap_to_liquidity(self, ctx, poolAddress: str, ai_response: AIResponse) -> AIResponse:
+        """
+        Caps maker_amount to what the pool absorbs within priceImpact.MAX_SLIPPAGE, without another model call.
+        An order whose pool cannot be checked is left as is; admission errors reach the handler's reject.
+        """
+        try:
+            amount, slippage = await priceImpact.capped_amount(poolAddress, ai_response.maker, ai_response.maker_amount, self.network, protocol=self.protocol)
+        except (resilience.UpstreamError, ValueError) as e:
+            ctx.logger.error(f"Price impact check failed for {poolAddress}: {e}")
+            return ai_response
+        if amount < ai_response.maker_amount:
+            ctx.logger.info(f"Capped maker_amount {ai_response.maker_amount} to {amount} (expected slippage {slippage:.4%})")
+            ai_response.maker_amount = amount
+        return ai_response
+
+    def add_handlers(self, agent):
+        """Registers the watchlist and response cache intervals and the startup/shutdown handlers on the agent."""
+
+        @agent.on_interval(period=watchlist.WATCHLIST_INTERVAL)
+        async def warm_watchlist(ctx):
+            for (network, pool), result in (await self.watchlist.refresh_all()).items():
+                if isinstance(result, Exception):
+                    ctx.logger.error(f"Watchlist refresh failed for {network}:{pool}: {result}")
+                    continue
+                # Answers given before the price moved are dropped without waiting for a lookup
+                state = responseCache.market_state(result.data, result.features)
+                if state is not None:
+                    self.response_cache.invalidate_moved(pool, state[0])
+
+        @agent.on_interval(period=responseCache.RESPONSE_CACHE_FLUSH_INTERVAL)
+        async def flush_response_cache(ctx):
+            await self.response_cache.flush()
+
+        @agent.on_event("startup")
+        async def start_metrics(ctx):
+            await metrics.start_server(self.metrics_port)
+
+        @agent.on_event("startup")
+        async def load_tokenizer(ctx):
+            await promptBudget.load_encoding()
+
+        @agent.on_event("shutdown")
+        async def close_connections(ctx):
+            await self.response_cache.flush()
+            await swapFetcher.close_client()
+            await llmClient.close_client()
+            await metrics.stop_server()
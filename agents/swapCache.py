@@ -0,0 +1,141 @@
+import asyncio
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional
+
+import admission
+import metrics
+import swapFetcher
+import swapStore
+
+SWAP_CACHE_TTL = float(os.getenv("SWAP_CACHE_TTL", "15"))
+SWAP_CACHE_SIZE = int(os.getenv("SWAP_CACHE_SIZE", "256"))
+
+
+class TTLCache:
+    """
+    In-process cache with a time to live and LRU eviction.
+    Concurrent misses for the same key share one in-flight fetch (single flight).
+    Values are shared between callers and must not be mutated.
+
+    The fetch runs as a task of the cache, outside of the deadline of the request that
+    missed first: a caller that is cancelled or times out stops waiting, but the fetch
+    carries on for the others and still fills the cache.
+
+    The counters are also exported as agent_cache_total{cache=name}.
+    """
+
+    def __init__(self, ttl: float = SWAP_CACHE_TTL, maxsize: int = SWAP_CACHE_SIZE, clock: Callable[[], float] = time.monotonic, name: str = "swaps"):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> asyncio.Task
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        """Returns the fresh value for key, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._count("evictions")
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable]):
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count("coalesced")
+        else:
+            self._count("misses")
+            task = asyncio.get_running_loop().create_task(fetch(), context=admission.detached_context())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._fetched, key))
+        return await asyncio.shield(task)
+
+    def _count(self, result: str):
+        self.counters[result] += 1
+        metrics.cache_results.inc(1, self.name, result)
+
+    def _fetched(self, key: Hashable, task: asyncio.Task):
+        # Runs before the waiters resume, so none of them misses the new entry
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # exception() also marks a failure nobody waits for any more as retrieved
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "hit_ratio": (self.counters["hits"] + self.counters["coalesced"]) / lookups if lookups else 0.0,
+        }
+
+
+swap_cache = TTLCache()
+
+
+async def load_swaps(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, endTime: int = 9999999999, interval_minutes: int = 5, page_size: int = swapFetcher.THEGRAPH_PAGE_SIZE, protocol: Optional[str] = None, timeout: Optional[float] = None) -> list:
+    """
+    `swapStore.load_swaps` behind the shared TTL cache.
+    Without a startTime the window is keyed by the lookback rather than the moving start.
+    """
+    window = ("lookback", swapFetcher.SWAP_LOOKBACK_HOURS) if startTime is None else ("from", startTime)
+    key = (network, protocol, poolAddress.lower(), window, endTime, interval_minutes)
+    return await swap_cache.get_or_fetch(
+        key,
+        lambda: swapStore.load_swaps(
+            poolAddress,
+            network=network,
+            startTime=startTime,
+            endTime=endTime,
+            interval_minutes=interval_minutes,
+            page_size=page_size,
+            protocol=protocol,
+            timeout=timeout,
+        ),
+    )
+
+
+async def load_candles(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, endTime: int = 9999999999, resolutions=("1m", "5m", "1h", "1d"), page_size: int = swapFetcher.THEGRAPH_PAGE_SIZE, protocol: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+    """`swapStore.load_candles` behind the shared TTL cache."""
+    window = ("lookback", swapFetcher.SWAP_LOOKBACK_HOURS) if startTime is None else ("from", startTime)
+    key = ("candles", network, protocol, poolAddress.lower(), window, endTime, tuple(resolutions))
+    return await swap_cache.get_or_fetch(
+        key,
+        lambda: swapStore.load_candles(
+            poolAddress,
+            network=network,
+            startTime=startTime,
+            endTime=endTime,
+            resolutions=resolutions,
+            page_size=page_size,
+            protocol=protocol,
+            timeout=timeout,
+        ),
+    )
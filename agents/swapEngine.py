@@ -0,0 +1,153 @@
+import numpy as np
+from datetime import datetime, timezone
+
+
+def decimal_scale(decimals) -> np.ndarray:
+    """Map an array of token decimals to the float divisor 10**decimals."""
+    decimals = np.asarray(decimals, dtype=np.int64)
+    unique, inverse = np.unique(decimals, return_inverse=True)
+    # float(10**d) is exact where the python path is, so scaled amounts match bit for bit
+    scales = np.array([float(10 ** int(d)) for d in unique], dtype=np.float64)
+    return scales[inverse]
+
+
+def swap_columns(swaps: list) -> dict:
+    """
+    Turns the TheGraph swap `data` list into column arrays in a single pass.
+    Amounts are decimal scaled, so amount0/amount1 are in whole token units.
+    """
+    n = len(swaps)
+    columns = {
+        "timestamp": np.fromiter((s["timestamp"] for s in swaps), dtype=np.int64, count=n),
+        "amount0": np.fromiter((float(s["amount0"]) for s in swaps), dtype=np.float64, count=n),
+        "amount1": np.fromiter((float(s["amount1"]) for s in swaps), dtype=np.float64, count=n),
+        "price0": np.fromiter((float(s["price0"]) for s in swaps), dtype=np.float64, count=n),
+        "price1": np.fromiter((float(s["price1"]) for s in swaps), dtype=np.float64, count=n),
+    }
+    if n:
+        decimals0 = np.fromiter((int(s["token0"]["decimals"]) for s in swaps), dtype=np.int64, count=n)
+        decimals1 = np.fromiter((int(s["token1"]["decimals"]) for s in swaps), dtype=np.int64, count=n)
+        columns["amount0"] /= decimal_scale(decimals0)
+        columns["amount1"] /= decimal_scale(decimals1)
+    return columns
+
+
+def interval_starts(timestamps: np.ndarray, interval_minutes: int = 5) -> np.ndarray:
+    """
+    Rounds unix timestamps down to the nearest interval mark within their hour,
+    the same way `datetime.replace(minute=(minute // interval) * interval)` does.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    hour_start = timestamps // 3600 * 3600
+    minute = timestamps % 3600 // 60
+    return hour_start + minute // interval_minutes * interval_minutes * 60
+
+
+def nearest_per_interval(timestamps: np.ndarray, interval_minutes: int = 5) -> np.ndarray:
+    """
+    Returns the row indices of the trade nearest to each interval start,
+    ordered by timestamp. Ties go to the earliest row, as in the dict based reducer.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if timestamps.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    starts = interval_starts(timestamps, interval_minutes)
+    distance = timestamps - starts
+
+    # Group by interval, then by distance; the first row of each group is its argmin
+    order = np.lexsort((distance, starts))
+    grouped = starts[order]
+    first = np.empty(grouped.size, dtype=bool)
+    first[0] = True
+    np.not_equal(grouped[1:], grouped[:-1], out=first[1:])
+    return order[first]
+
+
+def swap_datetime(swap: dict) -> str:
+    """The swap's datetime as the token-api sent it, or its timestamp in ISO format."""
+    return swap.get("datetime") or datetime.fromtimestamp(swap["timestamp"], tz=timezone.utc).isoformat()
+
+
+def clean_swap(swap: dict, amount0: float, amount1: float) -> dict:
+    """Builds the cleaned swap record the agents put into their prompts."""
+    return {
+        "timestamp": swap["timestamp"],
+        "datetime": swap_datetime(swap),
+        "token0": {
+            "symbol": swap["token0"]["symbol"],
+            "address": swap["token0"]["address"],
+            "decimals": swap["token0"]["decimals"],
+        },
+        "token1": {
+            "symbol": swap["token1"]["symbol"],
+            "address": swap["token1"]["address"],
+            "decimals": swap["token1"]["decimals"],
+        },
+        "amount0": amount0,
+        "amount1": amount1,
+        "price0": swap["price0"],
+        "price1": swap["price1"],
+    }
+
+
+def clean_swaps(swaps: list) -> list:
+    """Cleans the kept swaps, scaling their amounts in one vectorized step."""
+    if not swaps:
+        return []
+
+    amounts = swap_columns(swaps)
+    return [
+        clean_swap(swap, amount0, amount1)
+        for swap, amount0, amount1 in zip(swaps, amounts["amount0"].tolist(), amounts["amount1"].tolist())
+    ]
+
+
+class IntervalReducer:
+    """
+    Incremental form of `reduce_swaps` for swaps that arrive in batches.
+    Only the current nearest trade of each interval is held, so memory grows
+    with the number of intervals rather than the number of swaps.
+    """
+
+    def __init__(self, interval_minutes: int = 5):
+        self.interval_minutes = interval_minutes
+        self.swaps_seen = 0
+        self._nearest = {}  # interval_start -> (distance, swap)
+
+    def update(self, swaps: list):
+        if not swaps:
+            return
+        self.swaps_seen += len(swaps)
+
+        timestamps = np.fromiter((s["timestamp"] for s in swaps), dtype=np.int64, count=len(swaps))
+        kept = nearest_per_interval(timestamps, self.interval_minutes)
+        starts = interval_starts(timestamps[kept], self.interval_minutes)
+        distances = timestamps[kept] - starts
+
+        for index, start, distance in zip(kept.tolist(), starts.tolist(), distances.tolist()):
+            current = self._nearest.get(start)
+            # Strictly nearer only, so earlier batches keep ties like the single pass reducer
+            if current is None or distance < current[0]:
+                self._nearest[start] = (distance, swaps[index])
+
+    def __len__(self):
+        return len(self._nearest)
+
+    def records(self) -> list:
+        """Returns the cleaned records, one per interval, ordered by timestamp."""
+        return clean_swaps([self._nearest[start][1] for start in sorted(self._nearest)])
+
+
+def reduce_swaps(raw_data: dict, interval_minutes: int = 5) -> list:
+    """
+    Keeps only the trade nearest to each interval mark.
+    Only the timestamp column is built for every row; amounts are
+    scaled for the kept rows alone.
+    """
+    swaps = raw_data.get("data", [])
+    if not swaps:
+        return []
+
+    timestamps = np.fromiter((s["timestamp"] for s in swaps), dtype=np.int64, count=len(swaps))
+    return clean_swaps([swaps[i] for i in nearest_per_interval(timestamps, interval_minutes).tolist()])
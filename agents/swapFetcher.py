@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+
+import admission
+import metrics
+import resilience
+
+THEGRAPH_SWAPS_URL = "https://token-api.thegraph.com/swaps/evm"
+THEGRAPH_POOLS_URL = "https://token-api.thegraph.com/pools/evm"
+THEGRAPH_JWT_TOKEN = os.getenv("THEGRAPH_JWT_TOKEN","")
+THEGRAPH_TIMEOUT = float(os.getenv("THEGRAPH_TIMEOUT", "10"))
+THEGRAPH_MAX_CONNECTIONS = int(os.getenv("THEGRAPH_MAX_CONNECTIONS", "20"))
+THEGRAPH_PAGE_SIZE = int(os.getenv("THEGRAPH_PAGE_SIZE", "1000"))
+THEGRAPH_MAX_PAGES = int(os.getenv("THEGRAPH_MAX_PAGES", "200"))
+SWAP_LOOKBACK_HOURS = float(os.getenv("SWAP_LOOKBACK_HOURS", "24"))
+# Requests per second (and burst) allowed to the token-api across the agent, 0 for no limit
+THEGRAPH_RATE = float(os.getenv("THEGRAPH_RATE", "10"))
+THEGRAPH_BURST = float(os.getenv("THEGRAPH_BURST", "20"))
+# Retries of a transient failure, and whether slow requests get a hedge (token-api reads are idempotent)
+THEGRAPH_RETRIES = int(os.getenv("THEGRAPH_RETRIES", "2"))
+THEGRAPH_HEDGE = os.getenv("THEGRAPH_HEDGE", "true").lower() in ("1", "true", "yes")
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_rate_limiter = admission.TokenBucket(THEGRAPH_RATE, THEGRAPH_BURST)
+thegraph = resilience.Upstream("thegraph", THEGRAPH_TIMEOUT, THEGRAPH_RETRIES, hedge=THEGRAPH_HEDGE)
+
+logger = logging.getLogger(__name__)
+
+
+def default_start_time() -> int:
+    """The startTime used when a caller does not give one: SWAP_LOOKBACK_HOURS ago."""
+    return int(time.time() - SWAP_LOOKBACK_HOURS * 3600)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the shared token-api client, creating it on first use.
+    Keeping one client keeps its connection pool (and TLS sessions) alive across requests.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        # httpx rejects the bare "Bearer " an unset token would give
+        headers = {"Authorization": f"Bearer {THEGRAPH_JWT_TOKEN}"} if THEGRAPH_JWT_TOKEN else {}
+        _client = httpx.AsyncClient(
+            headers=headers,
+            timeout=THEGRAPH_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=THEGRAPH_MAX_CONNECTIONS,
+                max_keepalive_connections=THEGRAPH_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """Caps requests in flight at the pool size, so callers queue here instead of timing out in the pool."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(THEGRAPH_MAX_CONNECTIONS)
+    return _semaphore
+
+
+async def close_client():
+    """Closes the shared client. Call this from the agent's shutdown handler."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _get(url: str, params: dict, timeout: Optional[float] = None) -> dict:
+    """One token-api GET under the rate limit, with the retries and hedging of `thegraph`."""
+    async def attempt():
+        async with get_semaphore():
+            await _rate_limiter.acquire("thegraph")
+            response = await get_client().get(url, params=params, timeout=THEGRAPH_TIMEOUT if timeout is None else timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return await thegraph.call(attempt, timeout)
+
+
+async def fetch_swaps_raw(poolAddress: str, network: str = "matic", startTime: int = 1735689600, endTime: int = 9999999999, limit: int = 100, orderDirection: str = "desc", protocol: Optional[str] = None, timeout: Optional[float] = None, page: int = 1) -> dict:
+    """
+    Fetches one page of swaps for a pool from the token-api without blocking the event loop.
+    Args:
+        page (int): 1-based page of the query, `limit` swaps each.
+        timeout (float): Per-attempt timeout in seconds, defaults to THEGRAPH_TIMEOUT.
+            Transient failures are retried, see `thegraph`.
+    Returns:
+        dict: The raw TheGraph response, with the swaps under "data".
+    """
+    params = {
+        "network_id": network,
+        "pool": poolAddress,
+        "startTime": startTime,
+        "endTime": endTime,
+        "orderBy": "timestamp",
+        "orderDirection": orderDirection,
+        "limit": limit,
+    }
+    if protocol:
+        params["protocol"] = protocol
+    if page > 1:
+        params["page"] = page
+
+    return await _get(THEGRAPH_SWAPS_URL, params, timeout)
+
+
+async def fetch_pools_raw(token: str, network: str = "matic", protocol: Optional[str] = None, limit: int = 100, timeout: Optional[float] = None) -> dict:
+    """
+    Fetches the pools that trade a token from the token-api.
+    Returns:
+        dict: The raw TheGraph response, with the pools under "data".
+    """
+    params = {
+        "network_id": network,
+        "token": token,
+        "limit": limit,
+    }
+    if protocol:
+        params["protocol"] = protocol
+
+    return await _get(THEGRAPH_POOLS_URL, params, timeout)
+
+
+def swap_key(swap: dict) -> tuple:
+    """Identifies a swap well enough to drop the repeats a timestamp cursor returns at page edges."""
+    return (swap.get("transaction_id"), swap.get("amount0"), swap.get("amount1"))
+
+
+async def iter_swap_pages(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, endTime: int = 9999999999, page_size: int = THEGRAPH_PAGE_SIZE, max_pages: int = THEGRAPH_MAX_PAGES, protocol: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[list]:
+    """
+    Walks the swaps of a pool in ascending timestamp order between startTime and endTime,
+    yielding each page's batch of swaps as soon as it arrives.
+
+    The cursor restarts every page at the last timestamp seen, since several swaps can
+    share a block timestamp across the page edge; swaps already yielded at that
+    timestamp are skipped. A full page at a single timestamp leaves the cursor where it
+    is and asks for the query's next page instead. Without a startTime the walk covers
+    the last SWAP_LOOKBACK_HOURS. Hitting max_pages is logged: the newest swaps are the
+    ones left out.
+    """
+    cursor = default_start_time() if startTime is None else startTime
+    page = 1
+    edge_keys = set()
+
+    for _ in range(max_pages):
+        response = await fetch_swaps_raw(
+            poolAddress,
+            network=network,
+            startTime=cursor,
+            endTime=endTime,
+            limit=page_size,
+            orderDirection="asc",
+            protocol=protocol,
+            timeout=timeout,
+            page=page,
+        )
+        swaps = response.get("data", [])
+        metrics.swaps_fetched.inc(len(swaps), network)
+        batch = [swap for swap in swaps if swap["timestamp"] != cursor or swap_key(swap) not in edge_keys]
+        if batch:
+            yield batch
+
+        if len(swaps) < page_size:
+            return
+
+        last = swaps[-1]["timestamp"]
+        if last == cursor:
+            # A full page at a single timestamp: moving the cursor would skip the rest of that second
+            page += 1
+            edge_keys.update(swap_key(swap) for swap in swaps)
+        else:
+            cursor = last
+            page = 1
+            edge_keys = {swap_key(swap) for swap in swaps if swap["timestamp"] == last}
+
+    logger.warning(f"Stopped paging swaps of {poolAddress} on {network} after {max_pages} pages at timestamp {cursor}; newer swaps were not fetched (THEGRAPH_MAX_PAGES)")
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not on posix, fall back to in-process locking only
+    fcntl = None
+
+import candles
+import swapEngine
+import swapFetcher
+
+SWAP_STORE_DIR = os.getenv("SWAP_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".swapstore"))
+
+COLUMNS = {
+    "timestamp": np.int64,
+    "amount0": np.float64,
+    "amount1": np.float64,
+    "price0": np.float64,
+    "price1": np.float64,
+    # as reduce_swaps passes it on, see swapEngine.swap_datetime
+    "datetime": np.dtype("S32"),
+}
+# Stores written in an older format are rebuilt from scratch
+STORE_FORMAT = 2
+
+_sync_locks = {}  # (network, protocol, pool) -> asyncio.Lock
+
+
+class SwapStore:
+    """
+    Append-only columnar store of the swaps of one (network, pool), as fetched for one
+    token-api protocol filter (None for all protocols).
+
+    Each column is a flat binary file that readers memory-map, so they get the
+    data without copying. Amounts are stored decimal scaled. `meta.json` holds
+    the committed row count and is swapped in atomically after the columns are
+    written, so readers in other processes never see a half-written append.
+
+    Several swaps can share a timestamp, so the keys (`swapFetcher.swap_key`) of the
+    swaps at the last stored timestamp are kept too: a sync restarts at that timestamp
+    and `append` drops only the swaps it already holds.
+
+    Swaps older than the store are prepended by `backfill`, which writes the
+    columns into new files under the next `generation`; readers of the previous
+    generation keep their maps.
+    """
+
+    def __init__(self, network: str, poolAddress: str, protocol: Optional[str] = None, root: Optional[str] = None):
+        self.network = network
+        self.poolAddress = poolAddress.lower()
+        self.protocol = protocol
+        self.path = os.path.join(root or SWAP_STORE_DIR, network, protocol or "all", self.poolAddress)
+        self.meta = self._read_meta()
+
+    def _column_path(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self.meta.get("generation", 0) if generation is None else generation
+        return os.path.join(self.path, f"{name}.bin" if generation == 0 else f"{name}.{generation}.bin")
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("format") == STORE_FORMAT:
+                return meta
+        except FileNotFoundError:
+            pass
+        return {"format": STORE_FORMAT, "rows": 0, "synced_from": None, "last_timestamp": None, "last_keys": [], "token0": None, "token1": None}
+
+    def _write_meta(self):
+        tmp_path = os.path.join(self.path, f"meta.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    def refresh(self):
+        """Picks up rows appended since this store was opened, possibly by another process."""
+        self.meta = self._read_meta()
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def next_start_time(self) -> Optional[int]:
+        """
+        The startTime to request the delta from, or None for an empty store. The last
+        stored second is asked for again: swaps indexed after the last sync may share it.
+        """
+        if self.meta["synced_from"] is None:
+            return None
+        if self.meta["last_timestamp"] is None:
+            return self.meta["synced_from"]
+        return self.meta["last_timestamp"]
+
+    def covers(self, startTime: int) -> bool:
+        """Whether the store holds every swap of the pool from startTime onwards."""
+        return self.meta["synced_from"] is not None and self.meta["synced_from"] <= startTime
+
+    def columns(self) -> dict:
+        """Read-only memory maps of every committed column."""
+        rows = self.meta["rows"]
+        if rows == 0:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        try:
+            return {
+                name: np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(rows,))
+                for name, dtype in COLUMNS.items()
+            }
+        except FileNotFoundError:
+            # A backfill in another process replaced this generation: read the current one
+            self.refresh()
+            return self.columns()
+
+    def window(self, startTime: int, endTime: int) -> dict:
+        """Column views of the swaps with startTime <= timestamp <= endTime."""
+        columns = self.columns()
+        timestamps = columns["timestamp"]
+        lo = np.searchsorted(timestamps, startTime, side="left")
+        hi = np.searchsorted(timestamps, endTime, side="right")
+        return {name: column[lo:hi] for name, column in columns.items()}
+
+    def append(self, swaps: list, synced_from: Optional[int] = None):
+        """
+        Appends swaps in ascending timestamp order. Swaps before the last stored
+        timestamp, or at it and already stored, are dropped, so a delta fetched twice
+        by racing agents is only stored once.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self.refresh()
+
+            last = self.meta["last_timestamp"]
+            if last is not None:
+                stored = {tuple(key) for key in self.meta["last_keys"]}
+                swaps = [
+                    swap for swap in swaps
+                    if swap["timestamp"] > last or (swap["timestamp"] == last and swapFetcher.swap_key(swap) not in stored)
+                ]
+            if self.meta["synced_from"] is None:
+                self.meta["synced_from"] = synced_from
+            if swaps:
+                self._append_columns(_store_columns(swaps))
+                self.meta["rows"] += len(swaps)
+                self._set_last(swaps, self.meta["last_keys"] if swaps[-1]["timestamp"] == last else [])
+                if self.meta["token0"] is None:
+                    cleaned = swapEngine.clean_swap(swaps[0], 0.0, 0.0)
+                    self.meta["token0"] = cleaned["token0"]
+                    self.meta["token1"] = cleaned["token1"]
+            self._write_meta()
+
+    def backfill(self, swaps: list, synced_from: int):
+        """
+        Prepends swaps older than the stored ones, in ascending timestamp order, and moves
+        synced_from back to the start of the window they were fetched for.
+        """
+        with open(os.path.join(self.path, "lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self.refresh()
+            if self.meta["synced_from"] is not None and self.meta["synced_from"] <= synced_from:
+                return  # another agent backfilled meanwhile
+
+            if self.meta["synced_from"] is not None:
+                swaps = [swap for swap in swaps if swap["timestamp"] < self.meta["synced_from"]]
+            if swaps:
+                new = _store_columns(swaps)
+                old = self.columns()
+                generation = self.meta.get("generation", 0) + 1
+                for name, dtype in COLUMNS.items():
+                    with open(self._column_path(name, generation), "wb") as f:
+                        f.write(np.ascontiguousarray(new[name], dtype=dtype).tobytes())
+                        f.write(np.ascontiguousarray(old[name]).tobytes())
+                self.meta["generation"] = generation
+                self.meta["rows"] += len(swaps)
+                if self.meta["last_timestamp"] is None:
+                    self._set_last(swaps, [])
+                if self.meta["token0"] is None:
+                    cleaned = swapEngine.clean_swap(swaps[0], 0.0, 0.0)
+                    self.meta["token0"] = cleaned["token0"]
+                    self.meta["token1"] = cleaned["token1"]
+            self.meta["synced_from"] = synced_from
+            self._write_meta()
+
+            # Readers that saw the generation before last have had a whole backfill to map it
+            if self.meta.get("generation", 0) >= 2:
+                for name in COLUMNS:
+                    try:
+                        os.remove(self._column_path(name, self.meta["generation"] - 2))
+                    except FileNotFoundError:
+                        pass
+
+    def _set_last(self, swaps: list, last_keys: list):
+        """Records the last timestamp of `swaps` and the keys of its swaps on top of `last_keys`."""
+        last = swaps[-1]["timestamp"]
+        self.meta["last_timestamp"] = last
+        self.meta["last_keys"] = last_keys + [list(swapFetcher.swap_key(swap)) for swap in swaps if swap["timestamp"] == last]
+
+    def _append_columns(self, columns: dict):
+        rows = self.meta["rows"]
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(name), "ab+") as f:
+                # Drop anything an interrupted append left past the committed rows
+                f.truncate(rows * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+    def records(self, startTime: int, endTime: int, interval_minutes: int = 5) -> list:
+        """The cleaned records `reduce_swaps` would give for the stored swaps in the window."""
+        columns = self.window(startTime, endTime)
+        kept = swapEngine.nearest_per_interval(columns["timestamp"], interval_minutes)
+        token0 = self.meta["token0"]
+        token1 = self.meta["token1"]
+        return [
+            {
+                "timestamp": timestamp,
+                "datetime": swap_datetime.decode(),
+                "token0": dict(token0),
+                "token1": dict(token1),
+                "amount0": amount0,
+                "amount1": amount1,
+                "price0": price0,
+                "price1": price1,
+            }
+            for timestamp, swap_datetime, amount0, amount1, price0, price1 in zip(
+                columns["timestamp"][kept].tolist(),
+                columns["datetime"][kept].tolist(),
+                columns["amount0"][kept].tolist(),
+                columns["amount1"][kept].tolist(),
+                columns["price0"][kept].tolist(),
+                columns["price1"][kept].tolist(),
+            )
+        ]
+
+
+def _store_columns(swaps: list) -> dict:
+    columns = swapEngine.swap_columns(swaps)
+    columns["datetime"] = np.array([swapEngine.swap_datetime(swap).encode() for swap in swaps], dtype=COLUMNS["datetime"])
+    return columns
+
+
+async def sync(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, page_size: int = swapFetcher.THEGRAPH_PAGE_SIZE, protocol: Optional[str] = None, timeout: Optional[float] = None) -> SwapStore:
+    """
+    Brings the pool's store up to date, fetching only swaps newer than the last stored one.
+    A store that starts later than startTime is first backfilled with the swaps in between,
+    once; later windows reaching as far back are served from the store. The locked writes
+    run in a worker thread, so a long append does not stall the event loop.
+    """
+    if startTime is None:
+        startTime = swapFetcher.default_start_time()
+
+    key = (network, protocol, poolAddress.lower())
+    lock = _sync_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        store = SwapStore(network, poolAddress, protocol)
+        if store.meta["synced_from"] is not None and not store.covers(startTime):
+            older = []
+            async for batch in swapFetcher.iter_swap_pages(
+                poolAddress,
+                network=network,
+                startTime=startTime,
+                endTime=store.meta["synced_from"] - 1,
+                page_size=page_size,
+                protocol=protocol,
+                timeout=timeout,
+            ):
+                older.extend(batch)
+            await asyncio.to_thread(store.backfill, older, startTime)
+
+        cursor = store.next_start_time
+        if cursor is None:
+            cursor = startTime
+            await asyncio.to_thread(store.append, [], startTime)
+
+        # Swaps sharing the last timestamp of a batch are held back until the next one,
+        # so the swaps of one second are appended together
+        pending = []
+        async for batch in swapFetcher.iter_swap_pages(
+            poolAddress,
+            network=network,
+            startTime=cursor,
+            page_size=page_size,
+            protocol=protocol,
+            timeout=timeout,
+        ):
+            pending.extend(batch)
+            split = len(pending)
+            while split > 0 and pending[split - 1]["timestamp"] == pending[-1]["timestamp"]:
+                split -= 1
+            if split:
+                await asyncio.to_thread(store.append, pending[:split])
+                pending = pending[split:]
+        await asyncio.to_thread(store.append, pending)
+    return store
+
+
+async def load_swaps(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, endTime: int = 9999999999, interval_minutes: int = 5, page_size: int = swapFetcher.THEGRAPH_PAGE_SIZE, protocol: Optional[str] = None, timeout: Optional[float] = None) -> list:
+    """Returns the reduced swaps of a pool, served from its local store after syncing the delta."""
+    if startTime is None:
+        startTime = swapFetcher.default_start_time()
+
+    store = await sync(poolAddress, network=network, startTime=startTime, page_size=page_size, protocol=protocol, timeout=timeout)
+    return store.records(startTime, endTime, interval_minutes)
+
+
+async def load_columns(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, endTime: int = 9999999999, page_size: int = swapFetcher.THEGRAPH_PAGE_SIZE, protocol: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+    """
+    Returns the columns of every swap in the window, served from the pool's store.
+    The result holds the pool tokens under "token0"/"token1" and the columns under "columns".
+    """
+    if startTime is None:
+        startTime = swapFetcher.default_start_time()
+
+    store = await sync(poolAddress, network=network, startTime=startTime, page_size=page_size, protocol=protocol, timeout=timeout)
+    return {
+        "token0": store.meta["token0"],
+        "token1": store.meta["token1"],
+        "columns": store.window(startTime, endTime),
+    }
+
+
+async def load_candles(poolAddress: str, network: str = "matic", startTime: Optional[int] = None, endTime: int = 9999999999, resolutions=("1m", "5m", "1h", "1d"), page_size: int = swapFetcher.THEGRAPH_PAGE_SIZE, protocol: Optional[str] = None, timeout: Optional[float] = None) -> dict:
+    """
+    Returns OHLCV bars of every stored swap in the window, built in one pass for all resolutions.
+    The result holds the pool tokens under "token0"/"token1" and the bars under "candles".
+    """
+    loaded = await load_columns(poolAddress, network=network, startTime=startTime, endTime=endTime, page_size=page_size, protocol=protocol, timeout=timeout)
+    return {
+        "token0": loaded["token0"],
+        "token1": loaded["token1"],
+        "candles": candles.build_candles(loaded["columns"], resolutions),
+    }
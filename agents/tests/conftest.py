@@ -0,0 +1,99 @@
+import asyncio
+import importlib
+import os
+import random
+import sys
+
+import pytest
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENTS_DIR)
+# llmClient builds its client on import
+os.environ.setdefault("ASI_ONE_API_KEY", "test")
+
+TOKEN0 = {"symbol": "WETH", "address": "0x7ceb23fd6bc0add59e62ac25578270cff1b9f619", "decimals": 18}
+TOKEN1 = {"symbol": "USDT0", "address": "0xc2132d05d31c914a87c6611c10748aeb04b58e8f", "decimals": 6}
+
+
+def random_walk_records(n: int, seed: int = 0, start: int = 1748874000, step: int = 300) -> list:
+    """n reduced swap records (the `reduce_swaps` schema), one per `step` seconds, on a random walk price."""
+    rng = random.Random(seed)
+    price = 2500.0
+    records = []
+    for index in range(n):
+        price *= 1.0 + rng.gauss(0.0, 0.002)
+        amount0 = rng.uniform(-2.0, 2.0)
+        timestamp = start + index * step + rng.randrange(step // 2)
+        records.append({
+            "timestamp": timestamp,
+            "datetime": "",
+            "token0": dict(TOKEN0),
+            "token1": dict(TOKEN1),
+            "amount0": amount0,
+            "amount1": -amount0 * price,
+            "price0": price,
+            "price1": 1.0 / price,
+        })
+    return records
+
+
+def raw_swaps(n: int, seed: int = 0, end: int = 1748874000, span: int = 24 * 3600) -> list:
+    """n raw token-api swaps shaped like the records of abc.json, ascending over the `span` seconds before `end`."""
+    import backtest
+
+    template = backtest.load_history(os.path.join(AGENTS_DIR, "abc.json"))[0]
+    rng = random.Random(seed)
+    price = float(template["price0"])
+    swaps = []
+    for index, timestamp in enumerate(sorted(end - rng.randrange(span) for _ in range(n))):
+        price *= 1.0 + rng.gauss(0.0, 0.002)
+        amount0 = rng.randrange(10**12, 10**18) * rng.choice((1, -1))
+        swap = dict(template)
+        swap["timestamp"] = timestamp
+        swap["transaction_id"] = f"0x{index:064x}"
+        swap["amount0"] = str(amount0)
+        swap["amount1"] = str(int(-amount0 * price / 10**12))
+        swap["price0"] = price
+        swap["price1"] = 1.0 / price
+        swaps.append(swap)
+    return swaps
+
+
+class FakeTokenApi:
+    """Serves `fetch_swaps_raw` pages from a list of swaps and counts the requests."""
+
+    def __init__(self, swaps: list):
+        self.swaps = swaps
+        self.requests = 0
+
+    async def fetch_swaps_raw(self, poolAddress, network="matic", startTime=0, endTime=9999999999, limit=100, orderDirection="desc", protocol=None, timeout=None, page=1):
+        self.requests += 1
+        matching = [swap for swap in self.swaps if startTime <= swap["timestamp"] <= endTime]
+        if orderDirection == "desc":
+            matching.reverse()
+        offset = (page - 1) * limit
+        return {"data": matching[offset:offset + limit]}
+
+
+@pytest.fixture
+def agents_dir():
+    return AGENTS_DIR
+
+
+@pytest.fixture
+def import_agent():
+    """Imports an agent module; uagents builds the Agent on the current event loop, which asyncio.run leaves unset."""
+    def load(name: str):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        return importlib.import_module(name)
+    return load
+
+
+@pytest.fixture
+def swap_store_dir(tmp_path, monkeypatch):
+    """Points the swap stores at a fresh directory."""
+    import swapStore
+
+    monkeypatch.setattr(swapStore, "SWAP_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(swapStore, "_sync_locks", {})
+    return tmp_path
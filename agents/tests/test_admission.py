@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+import admission
+
+
+def test_waiters_run_by_priority():
+    queue = admission.AdmissionQueue(max_concurrency=1, max_queue=8)
+    order = []
+
+    async def request(name, priority):
+        async with queue.slot(priority, time.monotonic() + 10):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        async with queue.slot(admission.PRIORITY_CHAT, time.monotonic() + 10):
+            tasks = [
+                asyncio.create_task(request("batch", admission.PRIORITY_BATCH)),
+                asyncio.create_task(request("order", admission.PRIORITY_ORDER)),
+                asyncio.create_task(request("chat", admission.PRIORITY_CHAT)),
+            ]
+            await asyncio.sleep(0.01)
+            assert len(queue) == 3
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["chat", "order", "batch"]
+    assert queue.active == 0
+
+
+def test_full_queue_turns_requests_away():
+    queue = admission.AdmissionQueue(max_concurrency=1, max_queue=1)
+
+    async def request():
+        async with queue.slot(admission.PRIORITY_ORDER, time.monotonic() + 10):
+            pass
+
+    async def main():
+        async with queue.slot(admission.PRIORITY_ORDER, time.monotonic() + 10):
+            waiter = asyncio.create_task(request())
+            await asyncio.sleep(0.01)
+            with pytest.raises(admission.QueueFull):
+                await request()
+        await waiter
+
+    asyncio.run(main())
+    assert queue.active == 0
+
+
+def test_deadline_passing_in_the_queue():
+    queue = admission.AdmissionQueue(max_concurrency=1, max_queue=8)
+
+    async def main():
+        async with queue.slot(admission.PRIORITY_ORDER, time.monotonic() + 10):
+            with pytest.raises(admission.DeadlineExceeded):
+                async with queue.slot(admission.PRIORITY_ORDER, time.monotonic() + 0.01):
+                    pass
+        # The slot is free again for the next request
+        async with queue.slot(admission.PRIORITY_ORDER, time.monotonic() + 10):
+            return admission.remaining()
+
+    assert 0 < asyncio.run(main()) <= 10
+    assert queue.active == 0
+
+
+def test_deadline_is_only_set_inside_the_slot():
+    queue = admission.AdmissionQueue()
+
+    async def main():
+        assert admission.current_deadline() is None
+        deadline = time.monotonic() + 5
+        async with queue.slot(admission.PRIORITY_ORDER, deadline):
+            assert admission.current_deadline() == deadline
+            assert admission.detached_context().run(admission.current_deadline) is None
+        assert admission.current_deadline() is None
+
+    asyncio.run(main())
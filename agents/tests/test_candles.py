@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import candles
+
+
+def swap_columns(n: int, seed: int = 0, span: int = 3 * 86400) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        "timestamp": 1748874000 + rng.integers(0, span, n),  # unsorted, with repeats
+        "price0": 2500.0 * np.exp(np.cumsum(rng.normal(0.0, 0.001, n))),
+        "amount0": rng.normal(0.0, 1.0, n),
+        "amount1": rng.normal(0.0, 2500.0, n),
+    }
+
+
+def reference_bars(columns: dict, seconds: int) -> dict:
+    """Buckets every swap directly, one bar at a time."""
+    order = np.argsort(columns["timestamp"], kind="stable")
+    bars = {}
+    for index in order:
+        start = int(columns["timestamp"][index]) // seconds * seconds
+        price = float(columns["price0"][index])
+        bar = bars.setdefault(start, {"open": price, "high": price, "low": price, "volume0": 0.0, "volume1": 0.0, "trades": 0})
+        bar["high"] = max(bar["high"], price)
+        bar["low"] = min(bar["low"], price)
+        bar["close"] = price
+        bar["volume0"] += abs(float(columns["amount0"][index]))
+        bar["volume1"] += abs(float(columns["amount1"][index]))
+        bar["trades"] += 1
+    starts = sorted(bars)
+    table = {"timestamp": np.array(starts)}
+    for name in ("open", "high", "low", "close", "volume0", "volume1", "trades"):
+        table[name] = np.array([bars[start][name] for start in starts])
+    return table
+
+
+def test_rolled_up_bars_equal_direct_bucketing():
+    columns = swap_columns(20000)
+    built = candles.build_candles(columns, tuple(candles.RESOLUTIONS))
+    for resolution, seconds in candles.RESOLUTIONS.items():
+        expected = reference_bars(columns, seconds)
+        for name in candles.FIELDS:
+            np.testing.assert_allclose(built[resolution][name], expected[name], rtol=1e-12, err_msg=f"{resolution} {name}")
+
+
+def test_resolutions_that_do_not_nest_are_built_from_the_swaps():
+    columns = swap_columns(3000, seed=1)
+    built = candles.build_candles(columns, ("15m", "1h", "4h"))
+    alone = candles.build_candles(columns, ("4h",))
+    for name in candles.FIELDS:
+        np.testing.assert_allclose(built["4h"][name], alone["4h"][name])
+    assert list(built) == ["15m", "1h", "4h"]
+
+
+def test_no_swaps_give_empty_bars():
+    empty = {name: np.empty(0) for name in ("timestamp", "price0", "amount0", "amount1")}
+    built = candles.build_candles(empty, ("1m", "1h"))
+    assert all(built[resolution]["timestamp"].size == 0 for resolution in ("1m", "1h"))
+
+
+def test_serialize_rows():
+    columns = swap_columns(50, seed=2, span=600)
+    loaded = {"token0": {"symbol": "WETH"}, "token1": {"symbol": "USDT0"}, "candles": candles.build_candles(columns, ("5m",))}
+    table = candles.serialize(loaded)["candles"]["5m"]
+    assert table["columns"] == list(candles.FIELDS)
+    assert sum(row[-1] for row in table["rows"]) == 50
+
+
+def test_resolution_specs_are_stripped_and_checked():
+    assert candles.parse_resolutions("1h, 5m,") == ("1h", "5m")
+    with pytest.raises(ValueError, match="30m"):
+        candles.parse_resolutions("1h,30m")
+    with pytest.raises(ValueError):
+        candles.parse_resolutions(" ")
+    with pytest.raises(ValueError, match="expected"):
+        candles.build_candles(swap_columns(10), ("1h ",))
@@ -0,0 +1,61 @@
+import math
+
+import numpy as np
+import pytest
+
+import indicators
+from conftest import random_walk_records
+
+
+def loop_ema(values, alpha):
+    out = [values[0]]
+    for value in values[1:]:
+        out.append(alpha * value + (1.0 - alpha) * out[-1])
+    return np.array(out)
+
+
+def test_sma():
+    np.testing.assert_allclose(indicators.sma([1, 2, 3, 4, 5], 3), [np.nan, np.nan, 2.0, 3.0, 4.0])
+    assert np.isnan(indicators.sma([1, 2], 3)).all()
+
+
+def test_ema_by_hand_and_over_long_series():
+    np.testing.assert_allclose(indicators.ema([1.0, 2.0, 3.0], span=3), [1.0, 1.5, 2.25])
+    values = np.random.default_rng(1).normal(100.0, 5.0, 5000)
+    # long enough to cross several of the closed form blocks
+    np.testing.assert_allclose(indicators.ema(values, alpha=0.01), loop_ema(values, 0.01), rtol=1e-10)
+
+
+def test_wilder_rsi():
+    # changes +1, -1, +1 with alpha 1/2: gains 1, .5, .75 and losses 0, .5, .25
+    np.testing.assert_allclose(indicators.rsi([1.0, 2.0, 1.0, 2.0], period=2), [np.nan, 100.0, 50.0, 75.0])
+    np.testing.assert_allclose(indicators.rsi([1.0, 1.0, 1.0], period=14), [np.nan, 50.0, 50.0])
+
+
+def test_atr():
+    np.testing.assert_allclose(indicators.atr([1.0, 3.0, 2.0], period=2), [np.nan, 2.0, 1.5])
+
+
+def test_vwap_and_bollinger():
+    assert indicators.vwap([1.0, 2.0], [1.0, -3.0]) == pytest.approx(1.75)
+    assert math.isnan(indicators.vwap([1.0], [0.0]))
+    middle, upper, lower = indicators.bollinger([1.0, 2.0, 3.0], window=3, k=2.0)
+    assert middle[-1] == pytest.approx(2.0)
+    assert upper[-1] - middle[-1] == pytest.approx(2.0 * math.sqrt(2.0 / 3.0))
+    assert middle[-1] - lower[-1] == pytest.approx(2.0 * math.sqrt(2.0 / 3.0))
+
+
+def test_net_flow():
+    flow = indicators.net_flow([-2.0, 1.0, -0.5])
+    assert flow == {"bought": 2.5, "sold": 1.0, "net": 1.5, "trades_bought": 2, "trades_sold": 1}
+
+
+def test_summary_leaves_out_non_positive_prices():
+    records = random_walk_records(60, seed=2)
+    broken = [dict(record) for record in records]
+    broken[10]["price0"] = 0.0
+    broken[20]["price0"] = -1.0
+    expected = indicators.indicator_summary([record for index, record in enumerate(records) if index not in (10, 20)])
+    assert indicators.indicator_summary(broken) == expected
+    assert expected["intervals"] == 58
+    assert indicators.indicator_summary([]) == {}
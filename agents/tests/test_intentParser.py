@@ -0,0 +1,33 @@
+import pytest
+
+import intentParser
+
+
+@pytest.mark.parametrize("text, fields", [
+    ("swap 20 USDT for WETH in 12 hours", ("USDT", "WETH", 20.0, 12.0)),
+    ("sell up to 1.5k USDC to WETH, 2 days", ("USDC", "WETH", 1500.0, 48.0)),
+    ("20 USDT -> WETH 6h", ("USDT", "WETH", 20.0, 6.0)),
+    ("buy WETH with 20 USDT for 3 hours", ("USDT", "WETH", 20.0, 3.0)),
+    ("Exchange 1,000 USDT into WETH within 30 minutes", ("USDT", "WETH", 1000.0, 0.5)),
+])
+def test_documented_phrasings_take_the_fast_path(text, fields):
+    parsed = intentParser.fast_parse(text)
+    assert (parsed["makerToken"], parsed["takerToken"], parsed["makerMaxAmount"], parsed["maxExpiry"]) == fields
+
+
+@pytest.mark.parametrize("text", [
+    "swap 20 USDT for WETH",  # no expiry
+    "get WETH for 20 USDT",
+    "don't swap 20 USDT for WETH in 1h",
+    "swap 20 USDT for WETH and 5 WMATIC for USDC in 2h",
+    "swap 20 FOO for WETH in 1h",
+    "swap 20 USDT for USDT in 1h",
+    "what is the price of WETH?",
+])
+def test_unclear_intents_go_to_the_model(text):
+    assert intentParser.fast_parse(text) is None
+
+
+def test_expiry_is_not_read_from_the_amount():
+    fields, _ = intentParser.parse_intent("swap 20m USDT for WETH in 2h")
+    assert fields["makerMaxAmount"] == 20e6 and fields["maxExpiry"] == 2.0
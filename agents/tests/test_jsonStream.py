@@ -0,0 +1,67 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+from jsonStream import IncrementalObjectParser, MalformedStream
+
+
+class Order(BaseModel):
+    amount: float
+    side: str
+    note: str = ""
+
+
+COMPLETION = json.dumps({"note": "a \"quoted\" {brace}, and comma", "amount": 1.5e3, "side": "buy", "extra": [1, {"x": "]"}]})
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(COMPLETION)])
+def test_split_chunks_parse_like_the_whole_text(size):
+    parser = IncrementalObjectParser(Order)
+    chunks = [COMPLETION[i:i + size] for i in range(0, len(COMPLETION), size)]
+    done = [parser.feed(chunk) for chunk in chunks]
+    assert parser.result() == Order.model_validate_json(COMPLETION)
+    # complete once side arrives, before the trailing field and closing brace
+    assert done[-1] and (len(chunks) == 1 or done.index(True) < len(chunks) - 1)
+
+
+def test_complete_before_the_object_closes():
+    parser = IncrementalObjectParser(Order)
+    assert not parser.feed('{"amount": 2')  # the number may still continue
+    assert not parser.feed(', "side": "se')
+    assert parser.feed('ll", "note": "unterminated')
+    assert parser.result() == Order(amount=2, side="sell")
+
+
+def test_tolerates_a_code_fence():
+    parser = IncrementalObjectParser(Order)
+    parser.feed("```json\n")
+    parser.feed('{"amount": 1, "side": "buy"}\n```')
+    assert parser.result().side == "buy"
+
+
+@pytest.mark.parametrize("text, message", [
+    ("Sure! {", "expected '{'"),
+    ('{amount: 1}', "expected a field name"),
+    ('{"amount" 1}', "expected ':'"),
+    ('{"amount": 1 "side"', "expected ',' or '}'"),
+    ('{"amount": tru,', "a JSON value for 'amount'"),
+    ('{"amount": "lots",', "invalid 'amount'"),
+    ('{"amount": 1}', "object closed without side"),
+])
+def test_malformed_streams_fail_at_the_first_bad_token(text, message):
+    parser = IncrementalObjectParser(Order)
+    with pytest.raises(MalformedStream, match=message):
+        for char in text:
+            parser.feed(char)
+
+
+def test_output_that_ends_early_or_runs_long_is_malformed():
+    parser = IncrementalObjectParser(Order)
+    parser.feed('{"amount": 1, ')
+    with pytest.raises(MalformedStream, match="output ended without side"):
+        parser.result()
+
+    parser = IncrementalObjectParser(Order, max_chars=32)
+    with pytest.raises(MalformedStream, match="exceeds 32 characters"):
+        parser.feed('{"note": "' + "x" * 40)
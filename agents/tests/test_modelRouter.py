@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+import llmClient
+import metrics
+import modelRouter
+from jsonStream import MalformedStream
+
+
+class Answer(BaseModel):
+    value: int
+
+
+def router():
+    return modelRouter.ModelRouter(("small", "large"), {"small": 1000, "large": 4000})
+
+
+def record(router, task, model, seconds, valid, times):
+    for _ in range(times):
+        router._stats(task, model).record(seconds, valid)
+
+
+def test_route_skips_models_too_small_for_the_prompt():
+    r = router()
+    assert r.route("task", 500) == ["small", "large"]
+    assert r.route("task", 2000) == ["large"]
+    # nothing fits: the largest model gets it anyway
+    assert r.route("task", 10_000) == ["large"]
+
+
+def test_route_skips_a_model_that_answers_invalidly_until_its_explore_turn(monkeypatch):
+    monkeypatch.setattr(modelRouter, "ROUTER_EXPLORE_EVERY", 4)
+    r = router()
+    record(r, "task", "small", 0.1, False, 10)
+    assert [r.route("task", 100) for _ in range(4)] == [["large"]] * 3 + [["small", "large"]]
+    # invalid answers are per task
+    assert r.route("other", 100) == ["small", "large"]
+    record(r, "task", "large", 0.1, False, 10)
+    assert r.route("task", 100) == ["large"]
+
+
+def test_route_prefers_a_larger_model_proven_faster():
+    r = router()
+    record(r, "task", "small", 2.0, True, 3)
+    record(r, "task", "large", 0.5, True, modelRouter.ROUTER_MIN_SAMPLES - 1)
+    assert r.route("task", 100) == ["small", "large"]
+    record(r, "task", "large", 0.5, True, 1)
+    assert r.route("task", 100) == ["large"]
+
+
+class Calls(list):
+    """The (model, retries) of each call, and each model's answer."""
+
+    answers = None
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Stubs llmClient.complete_json with one answer (or exception) per model."""
+    calls = Calls()
+
+    async def complete_json(response_model, retries, model, messages, **kwargs):
+        calls.append((model, retries))
+        answer = calls.answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        return response_model(value=answer)
+
+    monkeypatch.setattr(llmClient, "complete_json", complete_json)
+    monkeypatch.setattr(modelRouter, "MODEL_ROUTING", True)
+    monkeypatch.setattr(metrics.model_calls, "values", {})
+    return calls
+
+
+MESSAGES = [{"role": "user", "content": "answer"}]
+
+
+def test_complete_json_escalates_on_invalid_output(calls):
+    r = router()
+    calls.answers = {"small": MalformedStream("object closed without value"), "large": 7}
+    assert asyncio.run(r.complete_json("task", Answer, "large", MESSAGES, retries=2)) == Answer(value=7)
+    # only the last model retries in place
+    assert calls == [("small", 0), ("large", 2)]
+    assert r.stats[("task", "small")].invalid_rate > 0
+    assert r.stats[("task", "large")].latency is not None
+    assert metrics.model_calls.values == {("task", "small", "invalid"): 1, ("task", "large", "valid"): 1}
+
+
+def test_complete_json_raises_when_the_last_model_is_invalid(calls):
+    calls.answers = {"small": ValueError("bad"), "large": ValueError("worse")}
+    with pytest.raises(ValueError, match="worse"):
+        asyncio.run(router().complete_json("task", Answer, "large", MESSAGES))
+
+
+def test_complete_json_does_not_escalate_other_errors(calls):
+    calls.answers = {"small": TimeoutError(), "large": 1}
+    with pytest.raises(TimeoutError):
+        asyncio.run(router().complete_json("task", Answer, "large", MESSAGES))
+    assert calls == [("small", 0)]
+
+
+def test_complete_json_without_routing_uses_the_default_model(calls, monkeypatch):
+    monkeypatch.setattr(modelRouter, "MODEL_ROUTING", False)
+    calls.answers = {"small": 1, "large": 2}
+    assert asyncio.run(router().complete_json("task", Answer, "large", MESSAGES, retries=1)).value == 2
+    assert calls == [("large", 1)]
@@ -0,0 +1,98 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import priceImpact
+import swapCache
+import swapStore
+import tokenIndex
+
+WETH = {"address": "0x7ceb23fd6bc0add59e62ac25578270cff1b9f619", "symbol": "WETH", "decimals": 18}
+USDT0 = {"address": "0xc2132d05d31c914a87c6611c10748aeb04b58e8f", "symbol": "USDT0", "decimals": 6}
+
+
+def impact_columns(n=200, coefficient=1e-4, exponent=0.5, seed=3, price=2500.0):
+    """Swaps whose log price move is exactly coefficient * |amount0| ** exponent, against their direction."""
+    rng = np.random.default_rng(seed)
+    amounts = rng.choice([-1.0, 1.0], n) * rng.uniform(0.1, 50.0, n)
+    moves = -np.sign(amounts) * coefficient * np.abs(amounts) ** exponent
+    moves[0] = 0.0
+    return {
+        "timestamp": np.arange(n) * 12 + 1_700_000_000,
+        "price0": price * np.exp(np.cumsum(moves)),
+        "amount0": amounts,
+    }
+
+
+def test_fit_impact_recovers_the_curve():
+    model = priceImpact.fit_impact(impact_columns(), WETH, USDT0)
+    assert model.coefficient == pytest.approx(1e-4, rel=1e-6)
+    assert model.exponent == pytest.approx(0.5, rel=1e-6)
+    assert model.samples == 199
+    assert model.rows == 200
+    assert model.max_size(0.01) == pytest.approx((0.01 / 1e-4) ** 2, rel=1e-5)
+
+
+def test_fit_impact_ignores_moves_against_the_swap_direction():
+    columns = impact_columns()
+    noisy = dict(columns, amount0=columns["amount0"].copy())
+    noisy["amount0"][1::2] *= -1  # half the swaps now moved the price the wrong way
+    model = priceImpact.fit_impact(noisy)
+    assert model.samples == 99  # swaps 2, 4, ..., 198 of the 199 moves
+    assert model.exponent == pytest.approx(0.5, rel=1e-6)
+
+
+def test_fit_impact_needs_enough_samples():
+    columns = impact_columns(n=priceImpact.IMPACT_MIN_SAMPLES)
+    assert priceImpact.fit_impact(columns) is None
+    assert priceImpact.fit_impact({"timestamp": [], "price0": [], "amount0": []}) is None
+
+
+class Loads(list):
+    """The pools loaded, and the columns the next load returns."""
+
+    columns = None
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    index = tokenIndex.TokenIndex.from_token_list({
+        token["address"]: {**token, "chainId": 137, "name": token["symbol"], "providers": ["p"], "tags": []}
+        for token in (WETH, USDT0)
+    })
+    monkeypatch.setattr(tokenIndex, "_index", index)
+    monkeypatch.setattr(swapCache, "swap_cache", swapCache.TTLCache())
+    monkeypatch.setattr(priceImpact, "_models", {})
+    loads = Loads()
+
+    async def load_columns(poolAddress, network="matic", startTime=None, protocol=None, timeout=None):
+        loads.append(poolAddress)
+        return {"token0": WETH, "token1": USDT0, "columns": loads.columns}
+
+    loads.columns = impact_columns()
+    monkeypatch.setattr(swapStore, "load_columns", load_columns)
+    return loads
+
+
+def test_capped_amount_limits_either_side_of_the_pool(pool):
+    async def run():
+        # 10 000 WETH would move the price 1%; 1 WETH is well within it
+        weth = await priceImpact.capped_amount("0xPOOL", "WETH", 20_000)
+        small = await priceImpact.capped_amount("0xPOOL", WETH["address"], 1)
+        usdt = await priceImpact.capped_amount("0xPOOL", "USDT0", 1e12)
+        return weth, small, usdt
+
+    weth, small, usdt = asyncio.run(run())
+    model = priceImpact._models[("matic", None, "0xpool")]
+    assert weth == (pytest.approx(10_000, rel=1e-5), pytest.approx(0.01))
+    assert small == (1, pytest.approx(1e-4))
+    assert usdt[0] == pytest.approx(10_000 * model.price0, rel=1e-5)
+    assert usdt[1] == pytest.approx(0.01)
+    assert len(pool) == 1  # the swap load and the fit are both reused
+
+
+def test_capped_amount_without_history_leaves_the_amount(pool):
+    pool.columns = impact_columns(n=5)
+    assert asyncio.run(priceImpact.capped_amount("0xPOOL", "WETH", 3.5)) == (3.5, None)
+    assert priceImpact._models == {}
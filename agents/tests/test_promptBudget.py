@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from conftest import random_walk_records
+from promptBudget import PromptBudget, PromptTooLarge, count_tokens, split_template
+
+
+def test_fit_count_keeps_the_newest_items_that_fit():
+    budget = PromptBudget(20, count=len)
+    # 5 fixed + "aaaa" + "," + "bbbb" + "," + "cccc" = 19; the oldest does not fit
+    assert budget.fit_count("fixed", ["zzzz", "aaaa", "bbbb", "cccc"], ",") == 3
+    assert budget.fit_count("fixed", ["x" * 16], ",") == 0
+    assert budget.fit_count("fixed", [], ",") == 0
+    with pytest.raises(PromptTooLarge):
+        budget.fit_count("f" * 21, ["a"], ",")
+
+
+def test_fit_is_json_dumps_when_everything_fits():
+    records = random_walk_records(5)
+    head, tail = split_template("Data:\n{swap_data}\nAnswer.", "swap_data")
+    prompt = PromptBudget(100000).fit(head, records, tail)
+    assert prompt == f"Data:\n{json.dumps(records, indent=2)}\nAnswer."
+
+
+def test_fit_drops_whole_oldest_records():
+    records = random_walk_records(200, seed=4)
+    budget = PromptBudget(3000)
+    prompt = budget.fit("head ", records, " tail")
+    assert count_tokens(prompt) <= 3000
+    kept = json.loads(prompt[len("head "):-len(" tail")])
+    assert 0 < len(kept) < len(records)
+    assert kept == records[-len(kept):]
+
+
+def test_records_are_counted_once():
+    calls = []
+
+    def count(text):
+        calls.append(text)
+        return len(text)
+
+    budget = PromptBudget(10000, count=count)
+    records = random_walk_records(20, seed=5)
+    budget.fit("", records)
+    first = len(calls)
+    budget.fit("", records)
+    # only the fixed text and the separator are counted again
+    assert len(calls) - first == 2
+
+
+def test_nothing_fits():
+    assert PromptBudget(12, count=len).fit("head", random_walk_records(3), "tail") == "head[]tail"
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from conftest import random_walk_records
+from promptBudget import PromptBudget
+from promptCodec import encode_compact, fit_compact, measure_reduction
+
+
+def decode_compact(text: str) -> list:
+    """Reads the table of `encode_compact` back into (timestamp, amount0, amount1, price0) rows."""
+    lines = text.split("\n")
+    base = int(lines[2].split()[1])
+    assert lines[3] == "columns: dt,amount0,amount1,price0"
+    rows, timestamp = [], base
+    for line in lines[4:]:
+        dt, amount0, amount1, price0 = line.split(",")
+        timestamp += int(dt)
+        rows.append((timestamp, float(amount0), float(amount1), float(price0)))
+    return rows
+
+
+def test_compact_round_trip():
+    records = random_walk_records(300, seed=6)
+    rows = decode_compact(encode_compact(records))
+    assert [row[0] for row in rows] == [record["timestamp"] for record in records]
+    for row, record in zip(rows, records):
+        assert row[1:] == pytest.approx((record["amount0"], record["amount1"], record["price0"]), rel=1e-7)
+
+
+def test_header_states_the_tokens_once():
+    records = random_walk_records(3)
+    text = encode_compact(records)
+    assert text.startswith(f"token0: WETH {records[0]['token0']['address']} decimals=18\ntoken1: USDT0 ")
+    assert text.count("WETH") == 1
+    assert encode_compact([]) == "no swaps"
+
+
+def test_fit_compact_restarts_the_deltas_at_the_first_kept_row():
+    records = random_walk_records(500, seed=7)
+    prompt = fit_compact(PromptBudget(1500), "head\n", records, "\ntail")
+    table = prompt[len("head\n"):-len("\ntail")]
+    rows = decode_compact(table)
+    assert 0 < len(rows) < len(records)
+    assert [row[0] for row in rows] == [record["timestamp"] for record in records[-len(rows):]]
+
+
+def test_compact_form_is_smaller_than_json():
+    records = random_walk_records(100, seed=8)
+    measured = measure_reduction(records)
+    assert measured["records"] == 100
+    assert measured["compact_tokens_per_100"] < measured["json_tokens_per_100"]
+    assert measured["reduction_pct"] > 50
+    assert len(encode_compact(records)) < len(json.dumps(records, indent=2)) / 2
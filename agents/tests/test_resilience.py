@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+import pytest
+
+import resilience
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0.0)
+
+
+def http_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "http://token-api")
+    return httpx.HTTPStatusError(f"{status}", request=request, response=httpx.Response(status, request=request))
+
+
+def test_transient_failures_are_retried():
+    upstream = resilience.Upstream("test", timeout=1.0, retries=2)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        if len(calls) < 3:
+            raise http_error(503)
+        return "ok"
+
+    assert asyncio.run(upstream.call(fetch)) == "ok"
+    assert len(calls) == 3
+
+
+def test_retries_run_out():
+    upstream = resilience.Upstream("test", timeout=1.0, retries=1)
+
+    async def fetch():
+        raise http_error(429)
+
+    with pytest.raises(resilience.UpstreamError) as raised:
+        asyncio.run(upstream.call(fetch))
+    assert raised.value.attempts == 2 and raised.value.upstream == "test"
+
+
+def test_slow_attempts_time_out():
+    upstream = resilience.Upstream("test", timeout=0.01, retries=1)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(1)
+
+    with pytest.raises(resilience.UpstreamError):
+        asyncio.run(upstream.call(fetch))
+    assert len(calls) == 2
+
+
+def test_other_errors_pass_through():
+    upstream = resilience.Upstream("test", timeout=1.0, retries=2)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        raise http_error(404)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(upstream.call(fetch))
+    assert len(calls) == 1
+
+
+def test_slow_attempt_is_hedged():
+    upstream = resilience.Upstream("test", timeout=1.0, retries=0, hedge=True)
+    upstream.latencies.extend([0.01] * resilience.HEDGE_MIN_SAMPLES)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(0.5)
+            return "primary"
+        return "hedge"
+
+    assert asyncio.run(upstream.call(fetch)) == "hedge"
+    assert len(calls) == 2
+
+
+def test_no_hedge_without_enough_latencies():
+    upstream = resilience.Upstream("test", timeout=1.0, retries=0, hedge=True)
+    assert upstream.hedge_delay() is None
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import os
+
+from pydantic import BaseModel
+
+from responseCache import ResponseCache
+
+
+class Order(BaseModel):
+    maker: str
+    taker: str
+    maker_amount: float
+    expiry: int
+
+
+class TradeInput(BaseModel):
+    makerToken: str = "USDT"
+    takerToken: str = "WETH"
+    makerMaxAmount: float = 100.0
+    maxExpiry: int = 24
+
+
+POOL = "0x4ccd010148379ea531d6c587cfdd60180196f9b1"
+STATE = (2500.0, (1,))
+
+
+def test_answers_are_written_on_flush_only(tmp_path):
+    cache = ResponseCache("test", Order, directory=str(tmp_path))
+    path = os.path.join(tmp_path, "test.json")
+    key = cache.key(POOL, TradeInput(), STATE)
+    cache.store(key, Order(maker="USDT", taker="WETH", maker_amount=50, expiry=12), STATE)
+    assert not os.path.exists(path)
+
+    asyncio.run(cache.flush())
+    with open(path) as f:
+        assert len(json.load(f)) == 1
+    mtime = os.stat(path).st_mtime_ns
+    asyncio.run(cache.flush())  # nothing changed since
+    assert os.stat(path).st_mtime_ns == mtime
+
+    reloaded = ResponseCache("test", Order, directory=str(tmp_path))
+    assert reloaded.lookup(key, STATE, 40).maker_amount == 40
+
+
+def test_invalidated_answers_are_flushed(tmp_path):
+    cache = ResponseCache("test", Order, directory=str(tmp_path))
+    key = cache.key(POOL, TradeInput(), STATE)
+    cache.store(key, Order(maker="USDT", taker="WETH", maker_amount=50, expiry=12), STATE)
+    asyncio.run(cache.flush())
+
+    assert cache.invalidate_moved(POOL, STATE[0] * 1.1) == 1
+    asyncio.run(cache.flush())
+    assert ResponseCache("test", Order, directory=str(tmp_path)).get(key) is None
@@ -0,0 +1,81 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+import riskEngine
+from conftest import TOKEN0, TOKEN1
+
+
+def bars_from_prices(prices, spacing: int = 300, start: int = 1748874000) -> dict:
+    n = len(prices)
+    return {
+        "timestamp": np.arange(n, dtype=np.int64) * spacing + start,
+        "close": np.asarray(prices, dtype=np.float64),
+        "volume0": np.ones(n),
+        "volume1": np.full(n, 10.0),
+    }
+
+
+def test_historical_var_cvar_of_known_losses():
+    losses = np.arange(101) / 1000.0  # 0% to 10% in steps of 0.1%
+    var, cvar = riskEngine.historical_var_cvar(np.log1p(-losses), 0.95)
+    assert var == pytest.approx(0.095)
+    assert cvar == pytest.approx(np.mean(losses[95:]))
+
+
+def test_parametric_var_cvar_matches_the_normal_quantiles():
+    z = NormalDist().inv_cdf(0.05)
+    var, cvar = riskEngine.parametric_var_cvar(0.0, 0.02, 0.95)
+    assert var == pytest.approx(-math.expm1(0.02 * z))
+    assert cvar == pytest.approx(-math.expm1(-0.02 * NormalDist().pdf(z) / 0.05))
+    assert riskEngine.parametric_var_cvar(0.0, 0.0) == (0.0, 0.0)
+
+
+def test_max_drawdown_and_orientation():
+    prices = np.array([1.0, 2.0, 1.5, 3.0, 1.2])
+    assert riskEngine.max_drawdown(prices) == pytest.approx(0.6)
+    assert riskEngine.max_drawdown(riskEngine.oriented_prices(prices, False)) == pytest.approx(1.0 - 1.0 / 3.0)
+
+
+def test_order_risk_scales_with_the_square_root_of_the_horizon():
+    r = 0.01
+    prices = np.exp(np.cumsum([0.0] + [r if i % 2 else -r for i in range(200)]))
+    bars = bars_from_prices(prices)  # 5 minute bars
+
+    one_bar = riskEngine.order_risk(bars, True, 100.0, 300 / 3600.0)
+    four_bars = riskEngine.order_risk(bars, True, 100.0, 4 * 300 / 3600.0)
+    assert one_bar["volatility_horizon"] == pytest.approx(r)
+    assert four_bars["volatility_horizon"] == pytest.approx(2 * r)
+    # a bar loses at most 1 - e^-r, four bars compound it twice over (sqrt 4)
+    assert one_bar["var_historical"] == pytest.approx(-math.expm1(-r))
+    assert four_bars["var_historical"] == pytest.approx(-math.expm1(-2 * r))
+    assert four_bars["var_amount"] == pytest.approx(100.0 * four_bars["var_historical"])
+    assert one_bar["volatility_annualized"] == pytest.approx(r / math.sqrt(300) * math.sqrt(riskEngine.SECONDS_PER_YEAR))
+
+
+def test_order_risk_flow_exposure():
+    bars = bars_from_prices(np.linspace(1.0, 2.0, 13))  # one hour of bars
+    report = riskEngine.order_risk(bars, True, 26.0, 2.0)
+    # the maker gives token1 when receiving token0: 130 of it traded over the hour
+    assert report["share_of_window_flow"] == pytest.approx(0.2)
+    assert report["share_of_horizon_flow"] == pytest.approx(0.1)
+    assert report["window_hours"] == pytest.approx(1.0)
+
+
+def test_assess_reports_the_order_and_drops_non_finite_values(import_agent):
+    riskAgent = import_agent("riskAgent")
+
+    order = riskAgent.AIResponse(maker=TOKEN1["symbol"], taker=TOKEN0["symbol"], maker_amount=10.0, expiry=4)
+    request = riskAgent.RiskRequest(poolAddress="0x4ccd010148379ea531d6c587cfdd60180196f9b1", order=order)
+    bars = bars_from_prices(np.linspace(2500.0, 2600.0, 50))
+    bars["volume1"] = np.zeros(50)  # no flow: the exposure shares are infinite
+    response = riskAgent.assess(request, {"token0": TOKEN0, "token1": TOKEN1, "candles": {riskAgent.RISK_RESOLUTION: bars}})
+    assert response.order == order and response.bars == 50
+    assert response.share_of_window_flow is None
+    assert response.var_historical is not None
+
+    short = {"token0": TOKEN0, "token1": TOKEN1, "candles": {riskAgent.RISK_RESOLUTION: bars_from_prices([1.0, 1.1])}}
+    with pytest.raises(ValueError):
+        riskAgent.assess(request, short)
@@ -0,0 +1,73 @@
+import math
+
+import rollingIndicators
+from conftest import random_walk_records
+from indicators import indicator_summary
+
+
+def assert_summaries_match(streamed: dict, full: dict):
+    assert streamed.keys() == full.keys()
+    for name, expected in full.items():
+        value = streamed[name]
+        if isinstance(expected, dict):
+            for field, flow in expected.items():
+                assert math.isclose(value[field], flow, rel_tol=1e-9, abs_tol=1e-9), (name, field)
+        elif isinstance(expected, float):
+            # Both sides are rounded for the prompt: allow one unit in the last kept digit
+            assert math.isclose(value, expected, rel_tol=1e-9, abs_tol=0.011 if name == "rsi_14" else 2e-6), name
+        else:
+            assert value == expected, name
+
+
+def test_fresh_state_matches_full_recompute():
+    records = random_walk_records(300, seed=1)
+    rollingIndicators.pool_states.clear()
+    assert_summaries_match(rollingIndicators.window_summary("matic", "0xpool", records), indicator_summary(records))
+
+
+def test_sliding_window_matches_full_recompute():
+    records = random_walk_records(2000, seed=2)
+    rollingIndicators.pool_states.clear()
+    window = 288
+    for end in range(window, len(records), 37):
+        records_in_window = records[end - window:end]
+        streamed = rollingIndicators.window_summary("matic", "0xpool", records_in_window)
+        assert_summaries_match(streamed, indicator_summary(records_in_window))
+    # Fed incrementally, not rebuilt every tick
+    assert rollingIndicators.get_state("matic", "0xpool").count == end
+
+
+def test_non_positive_prices_are_left_out_like_the_full_recompute():
+    records = random_walk_records(100, seed=3)
+    records[40] = dict(records[40], price0=0.0)
+    records[60] = dict(records[60], price0=-1.0)
+    rollingIndicators.pool_states.clear()
+    assert_summaries_match(rollingIndicators.window_summary("matic", "0xpool", records), indicator_summary(records))
+
+
+def test_recompute_differences_stay_small():
+    records = random_walk_records(1000, seed=4)
+    differences = rollingIndicators.recompute_differences(records)
+    assert differences and max(differences.values()) < 1e-8
+
+
+def test_window_starting_earlier_than_the_last_one_is_rebuilt():
+    records = random_walk_records(600, seed=5)
+    rollingIndicators.pool_states.clear()
+    rollingIndicators.window_summary("matic", "0xpool", records[300:500])
+    # same end, but the state already expired records 100-299
+    widened = records[100:500]
+    assert_summaries_match(rollingIndicators.window_summary("matic", "0xpool", widened), indicator_summary(widened))
+
+
+def test_state_keeps_a_fixed_number_of_records():
+    records = random_walk_records(500, seed=6)
+    state = rollingIndicators.PoolIndicatorState(capacity=50)
+    for record in records:
+        state.update(record)
+    assert len(state.records) == 50
+    assert state.start_time == records[-50]["timestamp"]
+    # the windowed values cover the kept records; the EMAs keep their longer history
+    streamed, full = state.summary(), indicator_summary(records[-50:])
+    for name in ("intervals", "from_timestamp", "to_timestamp", "change_pct", "vwap", "volatility_per_interval", "flow_token0", "flow_token1"):
+        assert_summaries_match({name: streamed[name]}, {name: full[name]})
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+
+import pytest
+
+import admission
+import indicators
+import priceImpact
+import resilience
+import responseCache
+from conftest import random_walk_records
+
+POOL_A = "0x4ccd010148379ea531d6c587cfdd60180196f9b1"
+POOL_B = "0x1111111111111111111111111111111111111111"
+
+
+class Context:
+    """The slice of uagents' Context the handlers use."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("test")
+        self.sent = []
+
+    async def send(self, destination, message):
+        self.sent.append(message)
+
+
+@pytest.fixture
+def signalAgent(import_agent, monkeypatch):
+    module = import_agent("signalAgent")
+    monkeypatch.setattr(module.pipeline, "mode", "indicators")
+    monkeypatch.setattr(module.pipeline, "response_cache", responseCache.ResponseCache("test", module.AIResponse, directory=""))
+    return module
+
+
+def test_pack_prompts_respects_the_pair_and_token_limits(signalAgent, monkeypatch):
+    monkeypatch.setattr(signalAgent, "count_tokens", len)
+    monkeypatch.setattr(signalAgent, "MAX_TOKENS", 100)
+    monkeypatch.setattr(signalAgent, "BATCH_MAX_PAIRS_PER_CALL", 3)
+
+    prompts = [(index, "x" * 10) for index in range(7)]
+    assert [[index for index, _ in pack] for pack in signalAgent.pack_prompts(prompts)] == [[0, 1, 2], [3, 4, 5], [6]]
+    # 42 + 8 tokens each: two fit in 100, a prompt over the budget still gets a call of its own
+    prompts = [(0, "x" * 42), (1, "x" * 42), (2, "x" * 200), (3, "x")]
+    assert [[index for index, _ in pack] for pack in signalAgent.pack_prompts(prompts)] == [[0, 1], [2], [3]]
+    assert signalAgent.pack_prompts([]) == []
+
+
+def test_generate_limit_orders_fans_out_and_caches(signalAgent, monkeypatch):
+    records = random_walk_records(100, seed=9)
+    fetched, calls = [], []
+
+    async def load_pool_data(poolAddress):
+        fetched.append(poolAddress)
+        if poolAddress == POOL_B:
+            raise RuntimeError("token-api down")
+        return records, indicators.indicator_summary(records)
+
+    async def query_openai_batch(pack, system_prompt):
+        calls.append([index for index, _ in pack])
+        return [signalAgent.AIResponse(maker="USDT", taker="WETH", maker_amount=5, expiry=48) for _ in pack]
+
+    async def cap_to_liquidity(ctx, poolAddress, response):
+        return response
+
+    monkeypatch.setattr(signalAgent.pipeline, "load_pool_data", load_pool_data)
+    monkeypatch.setattr(signalAgent, "query_openai_batch", query_openai_batch)
+    monkeypatch.setattr(signalAgent.pipeline, "cap_to_liquidity", cap_to_liquidity)
+
+    intents = [
+        signalAgent.UserInput(makerToken="USDT", takerToken="WETH", poolAddress=POOL_A, makerMaxAmount=10, maxExpiry=12),
+        signalAgent.UserInput(makerToken="USDT", takerToken="WETH", poolAddress=POOL_B, makerMaxAmount=10, maxExpiry=12),
+        signalAgent.UserInput(makerToken="WETH", takerToken="USDT", poolAddress="0x4CCD010148379EA531D6C587CFDD60180196F9B1", makerMaxAmount=1, maxExpiry=24),
+    ]
+    ctx = Context()
+    asyncio.run(signalAgent.generate_limit_orders(ctx, "sender", signalAgent.BatchUserInput(intents=intents)))
+
+    assert sorted(fetched) == sorted([POOL_A, POOL_B])  # one fetch per distinct pool
+    assert calls == [[0, 2]]  # both answerable intents in one call
+    responses = ctx.sent[-1].responses
+    assert [response.maker_amount for response in responses] == [5, 0, 5]
+    assert [response.expiry for response in responses] == [12, 0, 24]  # capped to maxExpiry
+
+    # The same question on the same market is answered from the response cache
+    asyncio.run(signalAgent.generate_limit_orders(ctx, "sender", signalAgent.BatchUserInput(intents=intents[:1])))
+    assert calls == [[0, 2]]
+    assert ctx.sent[-1].responses[0].maker_amount == 5
+
+
+def test_cap_to_liquidity_keeps_the_order_on_upstream_errors_only(signalAgent, monkeypatch):
+    errors = iter([resilience.UpstreamError("thegraph", 3, TimeoutError()), admission.DeadlineExceeded("too late")])
+
+    async def capped_amount(*args, **kwargs):
+        raise next(errors)
+
+    monkeypatch.setattr(priceImpact, "capped_amount", capped_amount)
+    order = signalAgent.AIResponse(maker="USDT", taker="WETH", maker_amount=5, expiry=12)
+    assert asyncio.run(signalAgent.pipeline.cap_to_liquidity(Context(), POOL_A, order)).maker_amount == 5
+    with pytest.raises(admission.DeadlineExceeded):
+        asyncio.run(signalAgent.pipeline.cap_to_liquidity(Context(), POOL_A, order))
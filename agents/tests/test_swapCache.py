@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+import admission
+import metrics
+from swapCache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_expire_and_evict():
+    clock = Clock()
+    cache = TTLCache(ttl=10, maxsize=2, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # "b" is the least recently used
+    assert cache.get("b") is None and cache.counters["evictions"] == 1
+    clock.now = 10
+    assert cache.get("a") is None
+
+
+def test_concurrent_misses_share_one_fetch(monkeypatch):
+    monkeypatch.setattr(metrics.cache_results, "values", {})
+    cache = TTLCache(name="test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        values = await asyncio.gather(*[cache.get_or_fetch("key", fetch) for _ in range(5)])
+        return values + [await cache.get_or_fetch("key", fetch)]
+
+    assert asyncio.run(main()) == ["value"] * 6
+    assert len(calls) == 1
+    assert cache.counters == {"hits": 1, "misses": 1, "coalesced": 4, "evictions": 0}
+    assert metrics.cache_results.values == {("test", "hits"): 1, ("test", "misses"): 1, ("test", "coalesced"): 4}
+
+
+def test_cancelled_leader_leaves_the_fetch_to_the_followers():
+    cache = TTLCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(asyncio.wait_for(cache.get_or_fetch("key", fetch), 0.01))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_fetch("key", fetch))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+    assert len(calls) == 1
+    assert cache.get("key") == "value"
+
+
+def test_failed_fetch_is_not_cached():
+    cache = TTLCache()
+
+    async def fail():
+        raise ValueError("upstream down")
+
+    async def fetch():
+        return "value"
+
+    async def main():
+        with pytest.raises(ValueError):
+            await cache.get_or_fetch("key", fail)
+        return await cache.get_or_fetch("key", fetch)
+
+    assert asyncio.run(main()) == "value"
+    assert not cache._inflight
+
+
+def test_fetch_runs_outside_the_leaders_deadline():
+    cache = TTLCache()
+    queue = admission.AdmissionQueue(max_concurrency=1, max_queue=1)
+
+    async def fetch():
+        return admission.current_deadline()
+
+    async def main():
+        async with queue.slot(admission.PRIORITY_ORDER, time.monotonic() + 60):
+            assert admission.current_deadline() is not None
+            return await cache.get_or_fetch("key", fetch)
+
+    assert asyncio.run(main()) is None
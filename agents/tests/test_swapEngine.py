@@ -0,0 +1,58 @@
+import os
+from datetime import datetime, timezone
+
+import backtest
+import swapEngine
+from conftest import raw_swaps
+
+
+def reference_reduce(swaps: list, interval_minutes: int = 5) -> list:
+    """The dict-based loop reduce_swaps replaced, kept to check the vectorized engine against."""
+    swaps = sorted(swaps, key=lambda x: x["timestamp"])
+    interval_map = {}  # interval_start -> (trade, distance)
+    for swap in swaps:
+        dt = datetime.fromtimestamp(swap["timestamp"], tz=timezone.utc)
+        interval_start = dt.replace(minute=(dt.minute // interval_minutes) * interval_minutes, second=0, microsecond=0)
+        distance = abs((dt - interval_start).total_seconds())
+        if interval_start not in interval_map or distance < interval_map[interval_start][1]:
+            interval_map[interval_start] = (swap, distance)
+
+    reduced = []
+    for swap, _ in sorted(interval_map.values(), key=lambda x: x[0]["timestamp"]):
+        reduced.append({
+            "timestamp": swap["timestamp"],
+            "datetime": swap.get("datetime") or datetime.fromtimestamp(swap["timestamp"], tz=timezone.utc).isoformat(),
+            "token0": {key: swap["token0"][key] for key in ("symbol", "address", "decimals")},
+            "token1": {key: swap["token1"][key] for key in ("symbol", "address", "decimals")},
+            "amount0": float(swap["amount0"]) / 10 ** int(swap["token0"]["decimals"]),
+            "amount1": float(swap["amount1"]) / 10 ** int(swap["token1"]["decimals"]),
+            "price0": swap["price0"],
+            "price1": swap["price1"],
+        })
+    return reduced
+
+
+def test_reduce_swaps_matches_the_reference_on_the_recorded_history(agents_dir):
+    swaps = backtest.load_history(os.path.join(agents_dir, "abc.json"))
+    for interval_minutes in (1, 5, 15, 60):
+        expected = reference_reduce(swaps, interval_minutes)
+        reduced = swapEngine.reduce_swaps({"data": list(swaps)}, interval_minutes)
+        assert [record["timestamp"] for record in reduced] == [record["timestamp"] for record in expected]
+        for record, reference in zip(reduced, expected):
+            assert record.keys() == reference.keys()
+            for key in ("datetime", "token0", "token1", "price0", "price1"):
+                assert record[key] == reference[key]
+            assert abs(record["amount0"] - reference["amount0"]) <= 1e-12 * abs(reference["amount0"])
+            assert abs(record["amount1"] - reference["amount1"]) <= 1e-12 * abs(reference["amount1"])
+
+
+def test_reduce_swaps_keeps_the_same_trades_over_a_day():
+    swaps = raw_swaps(5000, seed=7)
+    expected = reference_reduce(swaps)
+    reduced = swapEngine.reduce_swaps({"data": list(swaps)})
+    assert [(record["timestamp"], record["price0"]) for record in reduced] == [(record["timestamp"], record["price0"]) for record in expected]
+
+
+def test_reduce_swaps_of_nothing():
+    assert swapEngine.reduce_swaps({"data": []}) == []
+    assert swapEngine.reduce_swaps({}) == []
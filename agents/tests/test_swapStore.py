@@ -0,0 +1,98 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import swapEngine
+import swapFetcher
+import swapStore
+from conftest import FakeTokenApi, raw_swaps
+
+POOL = "0x4ccd010148379ea531d6c587cfdd60180196f9b1"
+NOW = 1748874000
+HOUR = 3600
+
+
+@pytest.fixture
+def token_api(monkeypatch, swap_store_dir):
+    api = FakeTokenApi(raw_swaps(4000, seed=3, end=NOW, span=168 * HOUR))
+    monkeypatch.setattr(swapFetcher, "fetch_swaps_raw", api.fetch_swaps_raw)
+    return api
+
+
+def load_bars(startTime: int) -> dict:
+    # The riskAgent request: 168h of 5m bars of the uniswap_v4 swaps
+    return asyncio.run(swapStore.load_candles(POOL, startTime=startTime, resolutions=("5m",), page_size=200, protocol="uniswap_v4"))
+
+
+def test_risk_window_backfills_a_short_store_once(token_api):
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200, protocol="uniswap_v4"))
+
+    before = token_api.requests
+    first = load_bars(NOW - 168 * HOUR)
+    assert token_api.requests - before > 10  # the six older days, streamed once
+
+    # Later requests slide the window by a minute and only ask for the delta
+    for minute in range(1, 4):
+        before = token_api.requests
+        loaded = load_bars(NOW - 168 * HOUR + minute * 60)
+        assert token_api.requests - before == 1
+    assert loaded["candles"]["5m"]["timestamp"][0] >= first["candles"]["5m"]["timestamp"][0]
+
+    store = swapStore.SwapStore("matic", POOL, "uniswap_v4")
+    assert len(store) == len(token_api.swaps)
+    assert store.meta["synced_from"] == NOW - 168 * HOUR
+
+
+def test_backfilled_store_matches_a_full_fetch(token_api, tmp_path):
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200, protocol="uniswap_v4"))
+    backfilled = load_bars(NOW - 168 * HOUR)
+
+    fresh = swapStore.SwapStore("matic", POOL, root=str(tmp_path / "fresh"))
+    fresh.append(token_api.swaps, NOW - 168 * HOUR)
+    columns = fresh.window(NOW - 168 * HOUR, NOW)
+    stored = swapStore.SwapStore("matic", POOL, "uniswap_v4").window(NOW - 168 * HOUR, NOW)
+    for name in swapStore.COLUMNS:
+        np.testing.assert_array_equal(stored[name], columns[name])
+    assert len(backfilled["candles"]["5m"]["timestamp"]) > 0
+
+
+def test_swaps_indexed_later_in_the_last_stored_second_are_kept(token_api):
+    swaps = token_api.swaps
+    last = swaps[-1]["timestamp"]
+    late = [dict(swaps[-1], transaction_id="0xlate", amount0="-5", amount1="7")]
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200))
+    # a swap of the same second shows up after the first sync
+    token_api.swaps = swaps + late
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200))
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200))
+
+    store = swapStore.SwapStore("matic", POOL)
+    window = [swap for swap in token_api.swaps if swap["timestamp"] >= NOW - 24 * HOUR]
+    assert len(store) == len(window)
+    assert store.meta["last_timestamp"] == last
+    assert ["0xlate", "-5", "7"] in store.meta["last_keys"]
+
+
+def test_records_match_reduce_swaps(token_api):
+    startTime = NOW - 24 * HOUR
+    swaps = [swap for swap in token_api.swaps if swap["timestamp"] >= startTime]
+    swaps[0] = {key: value for key, value in swaps[0].items() if key != "datetime"}
+    token_api.swaps = swaps
+    records = asyncio.run(swapStore.load_swaps(POOL, startTime=startTime, page_size=200))
+    assert records == swapEngine.reduce_swaps({"data": swaps}, 5)
+    assert records[0]["datetime"] == swapEngine.swap_datetime(swaps[0])
+    assert records[1]["datetime"] == swaps[1]["datetime"]
+
+
+def test_store_in_an_older_format_is_rebuilt(token_api, swap_store_dir):
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200))
+    store = swapStore.SwapStore("matic", POOL)
+    rows = len(store)
+    meta = dict(store.meta, format=swapStore.STORE_FORMAT - 1)
+    store.meta = meta
+    store._write_meta()
+
+    assert len(swapStore.SwapStore("matic", POOL)) == 0
+    asyncio.run(swapStore.load_swaps(POOL, startTime=NOW - 24 * HOUR, page_size=200))
+    assert len(swapStore.SwapStore("matic", POOL)) == rows
@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+
+import swapFetcher
+import tokenIndex
+
+WETH = "0x7ceb23fd6bc0add59e62ac25578270cff1b9f619"
+USDT0 = "0xc2132d05d31c914a87c6611c10748aeb04b58e8f"
+USDC = "0x3c499c542cef5e3811e1192ce70d8cc03d5c3359"
+USDC_E = "0x2791bca1f2de4661ed88a30c99a7e9449aa84174"
+FAKE_USDC = "0x0000000000000000000000000000000000000bad"
+LINK = "0x53e0bca35ec356bd5dddfebbd1fc0fd03fabad39"
+
+
+def entry(address, symbol, providers=1, tags=(), **extra):
+    return address, {"chainId": 137, "symbol": symbol, "name": symbol, "address": address, "decimals": 18, "providers": ["p"] * providers, "tags": list(tags), **extra}
+
+
+TOKEN_LIST = dict([
+    entry(WETH, "WETH", 5),
+    entry(USDT0, "USDT0", 5, displayedSymbol="USDT"),
+    entry(USDC, "USDC", 5, tags=("GROUP:USDC",)),
+    entry(USDC_E, "USDC.e", 8, tags=("GROUP:USDC",)),
+    entry(FAKE_USDC, "USDC", 20, tags=("RISK:unverified",)),
+    entry(LINK, "LINK", 3),
+    entry(tokenIndex.NATIVE_ADDRESS, "POL", 5),
+])
+
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    built = tokenIndex.TokenIndex.from_token_list(TOKEN_LIST)
+    monkeypatch.setattr(tokenIndex, "_index", built)
+    monkeypatch.setattr(tokenIndex, "_pools", None)
+    monkeypatch.setattr(tokenIndex, "_pool_locks", {})
+    monkeypatch.setattr(tokenIndex, "TOKEN_INDEX_DIR", str(tmp_path))
+    return built
+
+
+def test_lookup_ranks_symbols_over_groups_and_verified_tokens_first(index):
+    # the unverified USDC has more providers but ranks after the verified one
+    assert index.lookup("usdc").address == USDC
+    assert [token.address for token in index.candidates("USDC")] == [USDC, FAKE_USDC, USDC_E]
+    assert index.lookup("USDT").address == USDT0  # displayed symbol
+    assert index.lookup("ETH").address == WETH  # alias
+    assert index.lookup(WETH.upper().replace("0X", "0x")).symbol == "WETH"
+    with pytest.raises(tokenIndex.TokenNotFound):
+        index.lookup("DOGE")
+    with pytest.raises(tokenIndex.TokenNotFound):
+        index.lookup(WETH, chainId=1)
+
+
+def test_strict_lookup_raises_on_equally_ranked_tokens():
+    twins = dict([entry(USDC, "USDX", 2), entry(USDC_E, "USDX", 2)])
+    index = tokenIndex.TokenIndex.from_token_list(twins)
+    assert index.lookup("USDX").address == min(USDC, USDC_E)
+    with pytest.raises(tokenIndex.AmbiguousToken) as raised:
+        index.lookup("USDX", strict=True)
+    assert {token.address for token in raised.value.candidates} == {USDC, USDC_E}
+
+
+def test_tokens_in_text(index):
+    found = index.tokens_in_text("swap 20 usdc for WETH, then LINK. Get USDC and link too")
+    assert [token.symbol for token in found] == ["WETH", "LINK", "USDC"]
+
+
+def test_resolve_pool_looks_up_each_pair_once(index, monkeypatch):
+    requests = []
+
+    async def fetch_pools_raw(token, network="matic", protocol=None, limit=100, timeout=None):
+        requests.append(token)
+        await asyncio.sleep(0.01)
+        return {"data": [
+            {"pool": "0xother", "token0": LINK, "token1": USDT0},
+            {"pool": "0xPOOL", "token0": {"address": LINK}, "token1": {"address": WETH.upper().replace("0X", "0x")}},
+        ]}
+
+    monkeypatch.setattr(swapFetcher, "fetch_pools_raw", fetch_pools_raw)
+
+    async def main():
+        return await asyncio.gather(*[tokenIndex.resolve_pool(a, b) for a, b in [("LINK", "WETH"), ("weth", "link")] * 3])
+
+    assert asyncio.run(main()) == ["0xpool"] * 6
+    assert len(requests) == 1
+    # known pools and pools found earlier need no lookup, also after a restart
+    monkeypatch.setattr(tokenIndex, "_pools", None)
+    assert asyncio.run(tokenIndex.resolve_pool("LINK", "ETH")) == "0xpool"
+    assert asyncio.run(tokenIndex.resolve_pool("USDT", "WETH")) == "0x4ccd010148379ea531d6c587cfdd60180196f9b1"
+    assert len(requests) == 1
+
+
+def test_resolve_pool_without_a_pool(index, monkeypatch):
+    async def fetch_pools_raw(token, network="matic", protocol=None, limit=100, timeout=None):
+        return {"data": []}
+
+    monkeypatch.setattr(swapFetcher, "fetch_pools_raw", fetch_pools_raw)
+    with pytest.raises(tokenIndex.PoolNotFound):
+        asyncio.run(tokenIndex.resolve_pool("LINK", "USDC"))
+
+
+def test_native_token_pools_hold_the_wrapped_token(index):
+    native = index.lookup("POL")
+    assert tokenIndex.pool_token_address(native) == tokenIndex.WRAPPED_NATIVE[137]
+    assert tokenIndex.is_token0("WETH", {"symbol": "WETH", "address": WETH}, {"symbol": "USDT0", "address": USDT0})
+    assert not tokenIndex.is_token0("USDT", {"symbol": "WETH", "address": WETH}, {"symbol": "USDT0", "address": USDT0})
+
+
+def test_load_index_round_trips_a_versioned_json_snapshot(tmp_path, monkeypatch):
+    token_list = tmp_path / "tokens.json"
+    token_list.write_text(json.dumps(TOKEN_LIST))
+    snapshot_dir = tmp_path / "snapshot"
+
+    built = tokenIndex.load_index(str(token_list), str(snapshot_dir))
+    saved = json.loads((snapshot_dir / "tokens.json").read_text())
+    assert saved["stamp"][0] == tokenIndex.TOKEN_INDEX_FORMAT
+
+    monkeypatch.setattr(tokenIndex.TokenIndex, "from_token_list", None)  # a rebuild would fail
+    loaded = tokenIndex.load_index(str(token_list), str(snapshot_dir))
+    assert loaded.tokens == built.tokens
+    assert loaded.symbols == built.symbols
+    assert loaded.lookup("USDC").address == USDC
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda saved: {**saved, "stamp": [0] + saved["stamp"][1:]},  # older format
+    lambda saved: {**saved, "tokens": []},  # symbols point at missing tokens
+    lambda saved: "not an index",
+])
+def test_load_index_rebuilds_a_stale_or_invalid_snapshot(tmp_path, corrupt):
+    token_list = tmp_path / "tokens.json"
+    token_list.write_text(json.dumps(TOKEN_LIST))
+    snapshot = tmp_path / "tokens.json.d" / "tokens.json"
+    tokenIndex.load_index(str(token_list), str(snapshot.parent))
+    snapshot.write_text(json.dumps(corrupt(json.loads(snapshot.read_text()))))
+
+    index = tokenIndex.load_index(str(token_list), str(snapshot.parent))
+    assert index.lookup("WETH").address == WETH
+    assert json.loads(snapshot.read_text())["tokens"]
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+import pytest
+
+import swapFetcher
+import watchlist
+from conftest import FakeTokenApi, raw_swaps
+
+POOL = "0x4ccd010148379ea531d6c587cfdd60180196f9b1"
+
+
+def test_ticks_fetch_only_the_delta(monkeypatch, swap_store_dir):
+    now = int(time.time())
+    api = FakeTokenApi(raw_swaps(2000, seed=5, end=now - 60, span=int(swapFetcher.SWAP_LOOKBACK_HOURS * 3600) - 120))
+    monkeypatch.setattr(swapFetcher, "fetch_swaps_raw", api.fetch_swaps_raw)
+    pools = watchlist.Watchlist([("matic", POOL)])
+
+    async def ticks():
+        first = await pools.refresh("matic", POOL)
+        requests = [api.requests]
+        for _ in range(3):
+            await pools.refresh("matic", POOL)
+            requests.append(api.requests)
+        return first, requests
+
+    first, requests = asyncio.run(ticks())
+    assert requests[0] > 1
+    assert [b - a for a, b in zip(requests, requests[1:])] == [1, 1, 1]
+    assert first.last_timestamp == api.swaps[-1]["timestamp"]
+    assert first.features["last_price"] == pytest.approx(first.data[-1]["price0"])
+    assert pools.fresh("matic", POOL) is not None
@@ -0,0 +1,352 @@
+import asyncio
+import json
+import os
+import re
+from typing import NamedTuple, Optional
+
+import swapFetcher
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+TOKEN_LIST_PATH = os.getenv("TOKEN_LIST_PATH", os.path.join(_HERE, "..", "backend", "1inch-tokens.json"))
+TOKEN_INDEX_DIR = os.getenv("TOKEN_INDEX_DIR", os.path.join(_HERE, ".tokenindex"))
+# Part of the snapshot stamp: bump it when from_token_list or the snapshot layout changes
+TOKEN_INDEX_FORMAT = 1
+
+NETWORK_CHAIN_IDS = {
+    "mainnet": 1,
+    "optimism": 10,
+    "bsc": 56,
+    "matic": 137,
+    "base": 8453,
+    "arbitrum-one": 42161,
+    "avalanche": 43114,
+}
+
+NATIVE_ADDRESS = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
+# Pools hold the wrapped token, never the native one
+WRAPPED_NATIVE = {
+    137: "0x0d500b1d8e8ef31e21c99d1db9a6444d3adf1270",  # WPOL
+}
+
+# Names users type for a token whose listed symbol differs
+SYMBOL_ALIASES = {
+    "ETH": "WETH",
+    "MATIC": "POL",
+    "USDTO": "USDT0",
+}
+
+# Pools known up front, so the common pairs never need a token-api lookup
+KNOWN_POOLS = {
+    # WETH / USDT0
+    ("matic", "0x7ceb23fd6bc0add59e62ac25578270cff1b9f619", "0xc2132d05d31c914a87c6611c10748aeb04b58e8f"): "0x4ccd010148379ea531d6c587cfdd60180196f9b1",
+}
+
+# How a symbol key was derived from a token list entry, best first
+RANK_SYMBOL, RANK_DISPLAYED, RANK_GROUP = 0, 1, 2
+
+_WORD = re.compile(r"[$\w.+]+")
+
+
+class Token(NamedTuple):
+    address: str
+    symbol: str
+    name: str
+    decimals: int
+    chainId: int
+
+
+class TokenNotFound(LookupError):
+    """No token in the list matches the symbol or address."""
+
+
+class AmbiguousToken(LookupError):
+    """Several tokens match a symbol equally well."""
+
+    def __init__(self, symbol: str, candidates: list):
+        super().__init__(f"{symbol} matches {len(candidates)} tokens: {', '.join(t.address for t in candidates)}")
+        self.symbol = symbol
+        self.candidates = candidates
+
+
+class PoolNotFound(LookupError):
+    """The token-api knows no pool for the pair."""
+
+
+class TokenIndex:
+    """
+    Symbol and address lookup over the 1inch token list.
+
+    Every entry is reachable by address and by its upper-cased symbol, displayed symbol
+    and GROUP tag. Candidates for a symbol are ranked once at build time: how the key
+    was derived, then verified tokens first, then the number of listing providers.
+    """
+
+    def __init__(self, tokens: dict, symbols: dict):
+        self.tokens = tokens  # address -> Token
+        self.symbols = symbols  # (chainId, SYMBOL) -> ((rank, address), ...) best first
+
+    @classmethod
+    def from_token_list(cls, entries: dict) -> "TokenIndex":
+        tokens = {}
+        ranked = {}
+        for entry in entries.values():
+            token = Token(
+                address=entry["address"].lower(),
+                symbol=entry["symbol"],
+                name=entry.get("name", ""),
+                decimals=int(entry["decimals"]),
+                chainId=int(entry["chainId"]),
+            )
+            tokens[token.address] = token
+
+            tags = entry.get("tags", [])
+            keys = {token.symbol.upper(): RANK_SYMBOL}
+            displayed = entry.get("displayedSymbol")
+            if displayed:
+                keys.setdefault(displayed.upper(), RANK_DISPLAYED)
+            for tag in tags:
+                if tag.startswith("GROUP:"):
+                    keys.setdefault(tag[len("GROUP:"):].upper(), RANK_GROUP)
+
+            order = ("RISK:unverified" in tags, -len(entry.get("providers", [])), token.address)
+            for key, rank in keys.items():
+                ranked.setdefault((token.chainId, key), []).append(((rank,) + order, token.address))
+
+        symbols = {
+            key: tuple((sort_key[0], address) for sort_key, address in sorted(candidates))
+            for key, candidates in ranked.items()
+        }
+        return cls(tokens, symbols)
+
+    def to_json(self) -> dict:
+        return {
+            "tokens": [list(token) for token in self.tokens.values()],
+            "symbols": [
+                [chainId, key, [list(candidate) for candidate in candidates]]
+                for (chainId, key), candidates in self.symbols.items()
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "TokenIndex":
+        tokens = {}
+        for address, symbol, name, decimals, chainId in data["tokens"]:
+            tokens[address] = Token(address, symbol, name, int(decimals), int(chainId))
+        symbols = {}
+        for chainId, key, candidates in data["symbols"]:
+            ranked = tuple((int(rank), address) for rank, address in candidates)
+            if any(address not in tokens for _, address in ranked):
+                raise ValueError(f"snapshot ranks {key} to a token it does not hold")
+            symbols[(int(chainId), key)] = ranked
+        return cls(tokens, symbols)
+
+    def candidates(self, symbol: str, chainId: int = 137) -> list:
+        """Tokens a symbol may refer to, best match first."""
+        key = symbol.strip().upper()
+        key = SYMBOL_ALIASES.get(key, key)
+        return [self.tokens[address] for _, address in self.symbols.get((chainId, key), ())]
+
+    def lookup(self, symbolOrAddress: str, chainId: int = 137, strict: bool = False) -> Token:
+        """
+        Resolves a symbol (any case) or an address to its token.
+        A symbol shared by several equally ranked tokens resolves to the best ranked
+        one, or raises AmbiguousToken when strict.
+        """
+        value = symbolOrAddress.strip()
+        if value.startswith("0x") and len(value) == 42:
+            token = self.tokens.get(value.lower())
+            if token is None or token.chainId != chainId:
+                raise TokenNotFound(value)
+            return token
+
+        key = value.upper()
+        key = SYMBOL_ALIASES.get(key, key)
+        candidates = self.symbols.get((chainId, key))
+        if not candidates:
+            raise TokenNotFound(value)
+        if strict:
+            best = [address for rank, address in candidates if rank == candidates[0][0]]
+            if len(best) > 1:
+                raise AmbiguousToken(value, [self.tokens[address] for address in best])
+        return self.tokens[candidates[0][1]]
+
+    def tokens_in_text(self, text: str, chainId: int = 137) -> list:
+        """
+        Tokens named in free text, in order of first mention.
+        Only words written in upper case or in the token's own spelling count, so
+        ordinary words that happen to be symbols ("that", "get") are not picked up.
+        """
+        found = []
+        for word in _WORD.findall(text):
+            word = word.rstrip(".")
+            try:
+                token = self.lookup(word, chainId)
+            except TokenNotFound:
+                continue
+            if (word.isupper() or word == token.symbol or word.startswith("0x")) and token not in found:
+                found.append(token)
+        return found
+
+
+def _source_stamp(path: str) -> list:
+    stat = os.stat(path)
+    return [TOKEN_INDEX_FORMAT, os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def load_index(path: str = TOKEN_LIST_PATH, snapshot_dir: str = TOKEN_INDEX_DIR) -> TokenIndex:
+    """
+    Loads the index from its JSON snapshot, or builds it from the token list and
+    writes the snapshot. The snapshot is rebuilt whenever the token list or
+    TOKEN_INDEX_FORMAT changes, or when it does not parse.
+    """
+    stamp = _source_stamp(path)
+    snapshot = os.path.join(snapshot_dir, "tokens.json")
+    try:
+        with open(snapshot) as f:
+            saved = json.load(f)
+        if saved["stamp"] == stamp:
+            return TokenIndex.from_json(saved)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    with open(path) as f:
+        index = TokenIndex.from_token_list(json.load(f))
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        tmp = f"{snapshot}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"stamp": stamp, **index.to_json()}, f, separators=(",", ":"))
+        os.replace(tmp, snapshot)
+    except OSError:
+        pass  # a read-only checkout still gets the index, just without the snapshot
+    return index
+
+
+_index: Optional[TokenIndex] = None
+
+
+def get_index() -> TokenIndex:
+    """The shared token index, loaded on first use."""
+    global _index
+    if _index is None:
+        _index = load_index()
+    return _index
+
+
+def chain_id(network: str) -> int:
+    try:
+        return NETWORK_CHAIN_IDS[network]
+    except KeyError:
+        raise ValueError(f"unknown network: {network}") from None
+
+
+def resolve_token(symbolOrAddress: str, network: str = "matic", strict: bool = False) -> Token:
+    """Resolves a symbol or address on a token-api network, see `TokenIndex.lookup`."""
+    return get_index().lookup(symbolOrAddress, chain_id(network), strict)
+
+
+def tokens_in_text(text: str, network: str = "matic") -> list:
+    return get_index().tokens_in_text(text, chain_id(network))
+
+
+def pool_token_address(token: Token) -> str:
+    """The address a pool holds for the token: the wrapped token for the native one."""
+    if token.address == NATIVE_ADDRESS:
+        return WRAPPED_NATIVE.get(token.chainId, token.address)
+    return token.address
+
+
+def is_token0(symbolOrAddress: str, token0: dict, token1: dict, network: str = "matic") -> bool:
+    """Whether a token given by symbol or address is the pool's token0 (else token1), by address when the token list knows it."""
+    try:
+        address = pool_token_address(resolve_token(symbolOrAddress, network))
+    except (LookupError, ValueError):
+        address = None
+    if address is not None and address in (token0["address"].lower(), token1["address"].lower()):
+        return address == token0["address"].lower()
+    if symbolOrAddress.upper() in (token0["symbol"].upper(), token1["symbol"].upper()):
+        return symbolOrAddress.upper() == token0["symbol"].upper()
+    raise ValueError(f"{symbolOrAddress} is neither {token0['symbol']} nor {token1['symbol']}")
+
+
+def pair_key(network: str, tokenA: Token, tokenB: Token) -> tuple:
+    """Pools are unordered pairs: both swap directions share a key."""
+    a, b = sorted((pool_token_address(tokenA), pool_token_address(tokenB)))
+    return (network, a, b)
+
+
+_pools: Optional[dict] = None  # (network, token, token) -> pool address
+_pool_locks = {}  # (network, token, token) -> asyncio.Lock
+
+
+def _pools_path() -> str:
+    return os.path.join(TOKEN_INDEX_DIR, "pools.json")
+
+
+def get_pools() -> dict:
+    """Known pools plus every pool found by an earlier lookup, loaded on first use."""
+    global _pools
+    if _pools is None:
+        _pools = dict(KNOWN_POOLS)
+        try:
+            with open(_pools_path()) as f:
+                for network, a, b, pool in json.load(f):
+                    _pools.setdefault((network, a, b), pool)
+        except (OSError, ValueError):
+            pass
+    return _pools
+
+
+def _save_pools():
+    pools = get_pools()
+    try:
+        os.makedirs(TOKEN_INDEX_DIR, exist_ok=True)
+        tmp = f"{_pools_path()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump([[*key, pool] for key, pool in sorted(pools.items())], f, indent=2)
+        os.replace(tmp, _pools_path())
+    except OSError:
+        pass
+
+
+def cached_pool(tokenA: Token, tokenB: Token, network: str = "matic") -> Optional[str]:
+    """The pool of a pair if it is already known; never does a lookup."""
+    return get_pools().get(pair_key(network, tokenA, tokenB))
+
+
+def _address(value) -> str:
+    # The token-api gives tokens either as an address or as {"address": ...}
+    if isinstance(value, dict):
+        value = value.get("address", "")
+    return str(value or "").lower()
+
+
+async def find_pool(tokenA: Token, tokenB: Token, network: str = "matic", protocol: Optional[str] = None) -> str:
+    """Asks the token-api for a pool trading both tokens; the first one listed wins."""
+    a, b = pair_key(network, tokenA, tokenB)[1:]
+    raw = await swapFetcher.fetch_pools_raw(a, network=network, protocol=protocol)
+    for pool in raw.get("data", []):
+        if {_address(pool.get("token0")), _address(pool.get("token1"))} == {a, b}:
+            return _address(pool.get("pool") or pool.get("address"))
+    raise PoolNotFound(f"no pool for {tokenA.symbol}/{tokenB.symbol} on {network}")
+
+
+async def resolve_pool(tokenA: str, tokenB: str, network: str = "matic", protocol: Optional[str] = None) -> str:
+    """
+    The pool address of two tokens given by symbol or address.
+    Each pair is looked up at most once: found pools are kept in memory and in
+    TOKEN_INDEX_DIR, and concurrent requests for a new pair share one lookup.
+    """
+    first = resolve_token(tokenA, network)
+    second = resolve_token(tokenB, network)
+    key = pair_key(network, first, second)
+    pools = get_pools()
+    if key in pools:
+        return pools[key]
+
+    lock = _pool_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        if key not in pools:
+            pools[key] = await find_pool(first, second, network, protocol)
+            _save_pools()
+    return pools[key]
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+import candles
+import metrics
+import rollingIndicators
+import swapFetcher
+import swapStore
+import tokenIndex
+
+# "network:pool" entries, comma separated; defaults to the pools known up front
+WATCHLIST = os.getenv("WATCHLIST", ",".join(f"{network}:{pool}" for (network, _, _), pool in tokenIndex.KNOWN_POOLS.items()))
+WATCHLIST_INTERVAL = float(os.getenv("WATCHLIST_INTERVAL", "10"))
+# Warm data older than this is not served; requests fall back to a regular fetch
+WATCHLIST_MAX_AGE = float(os.getenv("WATCHLIST_MAX_AGE", "30"))
+
+
+def parse_watchlist(spec: str) -> list:
+    """(network, pool) pairs of a "network:pool,..." spec; a bare pool address means matic."""
+    pairs = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        network, _, pool = entry.rpartition(":")
+        pairs.append((network or "matic", pool.lower()))
+    return list(dict.fromkeys(pairs))
+
+
+class WarmPool:
+    """What a handler would otherwise fetch for a pool, as of `refreshed_at` (time.monotonic)."""
+
+    __slots__ = ("data", "features", "last_timestamp", "refreshed_at")
+
+    def __init__(self, data, features: Optional[dict], last_timestamp: Optional[int], refreshed_at: float):
+        self.data = data  # reduced records, or {"token0", "token1", "candles"} in candle mode
+        self.features = features  # indicator summary of the records, None in candle mode
+        self.last_timestamp = last_timestamp
+        self.refreshed_at = refreshed_at
+
+
+class Watchlist:
+    """
+    Keeps the reduced swaps and indicator features of a fixed set of pools in memory.
+
+    `refresh_all` is meant for a uAgents interval: each tick syncs only the swaps newer
+    than the pool's store (see `swapStore.sync`, which backfills a store that starts
+    after the window once) and rebuilds the window from the store.
+    Handlers call `fresh` and fall back to their own fetch when it returns None.
+    """
+
+    def __init__(self, pools: list, interval_minutes: int = 5, resolutions: Optional[tuple] = None, protocol: Optional[str] = None, max_age: float = WATCHLIST_MAX_AGE):
+        self.pools = pools
+        self.interval_minutes = interval_minutes
+        self.resolutions = resolutions  # build candles instead of records when set
+        self.protocol = protocol
+        self.max_age = max_age
+        self._warm = {}  # (network, pool) -> WarmPool
+
+    def fresh(self, network: str, poolAddress: str) -> Optional[WarmPool]:
+        warm = self._warm.get((network, poolAddress.lower()))
+        if warm is None or time.monotonic() - warm.refreshed_at > self.max_age:
+            metrics.watchlist_lookups.inc(1, "miss")
+            return None
+        metrics.watchlist_lookups.inc(1, "hit")
+        return warm
+
+    async def refresh(self, network: str, poolAddress: str) -> WarmPool:
+        startTime = swapFetcher.default_start_time()
+        store = await swapStore.sync(poolAddress, network=network, startTime=startTime, protocol=self.protocol)
+        if self.resolutions:
+            data = {
+                "token0": store.meta["token0"],
+                "token1": store.meta["token1"],
+                "candles": candles.build_candles(store.window(startTime, 9999999999), self.resolutions),
+            }
+        else:
+            data = store.records(startTime, 9999999999, self.interval_minutes)
+
+        # Only the records new since the last tick go through the pool's indicator state
+        features = None if self.resolutions else rollingIndicators.window_summary(network, poolAddress, data)
+        warm = WarmPool(data, features, store.meta["last_timestamp"], time.monotonic())
+        self._warm[(network, poolAddress.lower())] = warm
+        return warm
+
+    async def refresh_all(self) -> dict:
+        """Refreshes every pool concurrently; returns (network, pool) -> WarmPool or the exception."""
+        results = await asyncio.gather(*[self.refresh(network, pool) for network, pool in self.pools], return_exceptions=True)
+        return dict(zip(self.pools, results))